@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Row storage benchmark: memory and scan time of the compact tuple rows kept
+by Table vs. the dict rows Table kept before (BaselineTable below is that
+Table, trimmed to insert and select).
+
+Usage: python3 benchmarks/bench_rows.py [row_count]
+"""
+
+import sys
+import os
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.storage import Table
+
+ORDER_COLUMNS = [
+    {'name': 'id', 'type': 'int'},
+    {'name': 'customer_id', 'type': 'int'},
+    {'name': 'product_id', 'type': 'int'},
+    {'name': 'quantity', 'type': 'int'},
+    {'name': 'total_price', 'type': 'float'},
+    {'name': 'status', 'type': 'varchar'},
+]
+STATUSES = ['pending', 'processing', 'shipped', 'delivered']
+
+
+def make_order(i):
+    return {
+        'id': i,
+        'customer_id': i % 1000,
+        'product_id': i % 50,
+        'quantity': i % 5 + 1,
+        'total_price': (i % 500) * 1.5,
+        'status': STATUSES[i % 4],
+    }
+
+
+class BaselineTable:
+    """Table as it was with dict rows: each row is a dict copied on insert
+    and again for every select result"""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.rows = []
+
+    def insert(self, data):
+        for col_def in self.columns:
+            col_name = col_def['name']
+            if col_name in data:
+                if col_def['type'] == 'int':
+                    data[col_name] = int(data[col_name])
+                elif col_def['type'] == 'float':
+                    data[col_name] = float(data[col_name])
+                elif col_def['type'] == 'varchar':
+                    data[col_name] = str(data[col_name])
+        self.rows.append(data.copy())
+
+    def select(self, conditions=None):
+        results = []
+        for row in self.rows:
+            if conditions and not self._row_matches(row, conditions):
+                continue
+            results.append(row.copy())
+        return results
+
+    def _row_matches(self, row, conditions):
+        for key, value in conditions.items():
+            if key not in row or row[key] != value:
+                return False
+        return True
+
+
+def best_time(run, rounds=5):
+    """Fastest of several runs of run(), in seconds"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure(build):
+    """Return (result, bytes allocated) for build()"""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    def build_baseline():
+        table = BaselineTable(ORDER_COLUMNS)
+        for i in range(count):
+            table.insert(make_order(i))
+        return table
+    baseline, baseline_bytes = measure(build_baseline)
+
+    def build_table():
+        table = Table('orders', ORDER_COLUMNS, primary_key='id')
+        for i in range(count):
+            table.insert(make_order(i))
+        return table
+    table, table_bytes = measure(build_table)
+
+    # Filter only: how fast a scan can evaluate status = 'shipped'
+    dict_rows = baseline.rows
+    baseline_filter = best_time(lambda: sum(1 for row in dict_rows if row['status'] == 'shipped'))
+    pos = table.position('status')
+    table_filter = best_time(lambda: sum(1 for row in table.rows if row[pos] == 'shipped'))
+
+    # Full select, including building result dicts at the API boundary
+    conditions = {'status': 'shipped'}
+    assert baseline.select(conditions) == table.select(conditions=conditions)
+    baseline_select = best_time(lambda: baseline.select(conditions))
+    table_select = best_time(lambda: table.select(conditions=conditions))
+
+    print(f"{count} order rows, select ... WHERE status = 'shipped'")
+    print(f"{'Table':<18}{'memory (MB)':>13}{'bytes/row':>11}{'filter (ms)':>13}{'select (ms)':>13}")
+    for name, size, filter_time, select_time in [
+        ('baseline (dicts)', baseline_bytes, baseline_filter, baseline_select),
+        ('tuples', table_bytes, table_filter, table_select),
+    ]:
+        print(f"{name:<18}{size / 1e6:>13.1f}{size / count:>11.0f}"
+              f"{filter_time * 1000:>13.1f}{select_time * 1000:>13.1f}")
+    print(f"memory: {baseline_bytes / table_bytes:.1f}x less, "
+          f"select: {baseline_select / table_select:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+from typing import Any, Callable, Dict, Optional, Set
+
+# Aggregate functions accumulate one group at a time: add() is called with
+# the argument value of every row in the group and result() gives the final
+# value. As in SQL, NULL arguments are ignored and every function but COUNT
+# returns NULL for a group without non-NULL values.
+
+class Count:
+    __slots__ = ('count',)
+    
+    def __init__(self):
+        self.count = 0
+    
+    def add(self, value: Any):
+        if value is not None:
+            self.count += 1
+    
+    def result(self) -> int:
+        return self.count
+
+class CountRows(Count):
+    """COUNT(*): every row counts, NULL or not"""
+    
+    __slots__ = ()
+    
+    def add(self, value: Any):
+        self.count += 1
+
+class Sum:
+    __slots__ = ('total',)
+    
+    name = 'SUM'
+    
+    def __init__(self):
+        self.total = None
+    
+    def add(self, value: Any):
+        if value is None:
+            return
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"{self.name} requires numeric values, got {value!r}")
+        self.total = value if self.total is None else self.total + value
+    
+    def result(self) -> Any:
+        return self.total
+
+class Avg(Sum):
+    __slots__ = ('count',)
+    
+    name = 'AVG'
+    
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+    
+    def add(self, value: Any):
+        if value is not None:
+            super().add(value)
+            self.count += 1
+    
+    def result(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+class Min:
+    __slots__ = ('value',)
+    
+    name = 'MIN'
+    
+    def __init__(self):
+        self.value = None
+    
+    def add(self, value: Any):
+        if value is None:
+            return
+        try:
+            if self.value is None or self._better(value, self.value):
+                self.value = value
+        except TypeError:
+            raise ValueError(f"{self.name} cannot compare {value!r} with {self.value!r}")
+    
+    def _better(self, value: Any, current: Any) -> bool:
+        return value < current
+    
+    def result(self) -> Any:
+        return self.value
+
+class Max(Min):
+    __slots__ = ()
+    
+    name = 'MAX'
+    
+    def _better(self, value: Any, current: Any) -> bool:
+        return value > current
+
+class Distinct:
+    """Feeds each distinct non-NULL value to the wrapped aggregate once"""
+    
+    __slots__ = ('inner', 'seen')
+    
+    def __init__(self, inner: Any):
+        self.inner = inner
+        self.seen: Set[Any] = set()
+    
+    def add(self, value: Any):
+        if value is not None and value not in self.seen:
+            self.seen.add(value)
+            self.inner.add(value)
+    
+    def result(self) -> Any:
+        return self.inner.result()
+
+# Aggregate functions by their SQL name
+AGGREGATES: Dict[str, type] = {
+    'COUNT': Count,
+    'SUM': Sum,
+    'AVG': Avg,
+    'MIN': Min,
+    'MAX': Max,
+}
+
+
+def accumulator_factory(func: str, star: bool = False, distinct: bool = False) -> Callable[[], Any]:
+    """A callable creating a fresh accumulator for func(arg), func(*) or func(DISTINCT arg)"""
+    func = func.upper()
+    if func not in AGGREGATES:
+        raise ValueError(f"Unknown aggregate function '{func}'")
+    if star:
+        if func != 'COUNT':
+            raise ValueError(f"{func}(*) is not supported")
+        return CountRows
+    cls = AGGREGATES[func]
+    if distinct:
+        return lambda: Distinct(cls())
+    return cls
@@ -0,0 +1,132 @@
+import csv
+import json
+import os
+from itertools import islice
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# COPY reads files as a stream of rows that Table.insert_many() consumes a
+# batch at a time, so the file never has to fit in memory as a whole.
+# Exports likewise write result rows as the plan produces them.
+
+COPY_FORMATS = ('csv', 'jsonl')
+COPY_OPTIONS = ('format', 'header', 'delimiter')
+
+# Result rows per chunk of a streamed NDJSON response
+NDJSON_CHUNK_ROWS = 1000
+
+
+def parse_boolean(text: str) -> bool:
+    """A BOOLEAN column value written as text"""
+    value = text.strip().lower()
+    if value in ('true', 't', 'yes', 'y', '1'):
+        return True
+    if value in ('false', 'f', 'no', 'n', '0'):
+        return False
+    raise ValueError(f"Invalid boolean {text!r}")
+
+
+# Conversions of CSV text to column types; other types keep the text
+TEXT_CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    'int': int,
+    'float': float,
+    'boolean': parse_boolean,
+}
+
+
+def copy_options(path: str, options: Dict[str, Any]) -> Tuple[str, bool, str]:
+    """(format, header, delimiter) of a COPY statement.
+    
+    The format defaults to jsonl for .jsonl and .ndjson files and to csv
+    otherwise.
+    """
+    for name in options:
+        if name not in COPY_OPTIONS:
+            raise ValueError(f"Unknown COPY option '{name}'")
+    default = 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+    fmt = str(options.get('format', default)).lower()
+    if fmt not in COPY_FORMATS:
+        raise ValueError(f"Unknown COPY format '{fmt}'; use {' or '.join(COPY_FORMATS)}")
+    header = options.get('header', False)
+    if isinstance(header, str):
+        header = parse_boolean(header)
+    delimiter = str(options.get('delimiter', ','))
+    if len(delimiter) != 1:
+        raise ValueError(f"COPY delimiter must be a single character, got {delimiter!r}")
+    return fmt, bool(header), delimiter
+
+
+def read_csv(f: IO[str], delimiter: str = ',', header: bool = False) -> Tuple[Optional[List[str]], Iterator[List]]:
+    """(header column names, rows) of a CSV file; empty fields are NULL and
+    blank lines are skipped"""
+    reader = csv.reader(f, delimiter=delimiter)
+    names = None
+    if header:
+        names = [name.strip() for name in next(reader, [])]
+    return names, ([value or None for value in row] for row in reader if row)
+
+
+def read_jsonl(f: IO[str], column_names: Sequence[str]) -> Iterator[Tuple]:
+    """Rows of a file with one JSON object per line, in column_names order.
+    
+    Keys missing from an object are NULL; blank lines are skipped.
+    """
+    known = set(column_names)
+    for line_no, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Invalid JSON on line {line_no}") from None
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {line_no} is not a JSON object")
+        if not known.issuperset(record):
+            unknown = next(key for key in record if key not in known)
+            raise ValueError(f"Unknown column '{unknown}' on line {line_no}")
+        yield tuple(record.get(name) for name in column_names)
+
+
+def write_rows(path: str, fmt: str, names: List[str], rows: Iterable[Dict],
+               header: bool = False, delimiter: str = ',') -> int:
+    """Write result rows to a CSV or JSON lines file; return the row count.
+    
+    The rows go to a temporary file that replaces path once complete, so a
+    failed export leaves no partial file behind.
+    """
+    tmp_path = path + '.tmp'
+    try:
+        f = open(tmp_path, 'w', newline='', encoding='utf-8')
+    except OSError as e:
+        raise ValueError(f"Cannot write '{path}': {e.strerror}")
+    try:
+        with f:
+            if fmt == 'jsonl':
+                count = 0
+                for chunk in ndjson_chunks(rows):
+                    f.write(chunk)
+                    # JSON text escapes newlines, so each line is a row
+                    count += chunk.count('\n')
+            else:
+                writer = csv.writer(f, delimiter=delimiter)
+                if header:
+                    writer.writerow(names)
+                count = 0
+                for count, row in enumerate(rows, 1):
+                    # NULLs are written as empty fields
+                    writer.writerow(row.values())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return count
+
+
+def ndjson_chunks(rows: Iterable[Dict], chunk_rows: int = NDJSON_CHUNK_ROWS) -> Iterator[str]:
+    """Result rows as newline-delimited JSON, chunk_rows lines at a time"""
+    rows = iter(rows)
+    dumps = json.dumps
+    while True:
+        chunk = [dumps(row, default=str) for row in islice(rows, chunk_rows)]
+        if not chunk:
+            return
+        yield '\n'.join(chunk) + '\n'
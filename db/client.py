@@ -0,0 +1,258 @@
+import queue
+import socket
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from . import protocol
+from .protocol import ProtocolError, Reader
+
+# Prepared statements kept per connection before the least recently used
+# is closed
+STATEMENT_CACHE_SIZE = 128
+
+
+class Connection:
+    """A connection to the database server (see server.py).
+    
+    Statements run with parameters are prepared on the server the first
+    time and then only sent as a statement id and values. Not safe to
+    share between threads; use a ConnectionPool for that.
+    """
+    
+    def __init__(self, host: str = '127.0.0.1', port: int = protocol.DEFAULT_PORT,
+                 timeout: Optional[float] = None):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile('rb')
+        # Server statement ids by SQL text, least recently used first
+        self.statements: Dict[str, int] = OrderedDict()
+        self.in_transaction = False
+        # False once closed, which happens when it breaks or a reply is
+        # abandoned part way
+        self.usable = True
+    
+    def execute(self, sql: str, params: Any = None) -> Union[List[Dict], str]:
+        """Run a statement: the rows of a SELECT, or the message of another
+        statement. params fill ? placeholders (a sequence) or :name ones (a
+        mapping)."""
+        rows = self._results(sql, params)
+        result = list(rows)
+        return rows.status if rows.status is not None else result
+    
+    def stream(self, sql: str, params: Any = None) -> Iterator[Dict]:
+        """Run a SELECT, yielding its rows as they arrive. The connection
+        cannot run anything else until they have all been read."""
+        rows = self._results(sql, params)
+        yield from rows
+        if rows.status is not None:
+            raise ValueError("Only SELECT queries can be streamed")
+    
+    def executemany(self, sql: str, seq_of_params: Iterable) -> str:
+        """Run a statement once per parameter set, sending them all in one
+        request"""
+        statement_id = self._prepare(sql)
+        seq_of_params = list(seq_of_params)
+        payload = (protocol.U32.pack(statement_id) + protocol.U32.pack(len(seq_of_params))
+                   + b''.join([protocol.pack_params(params) for params in seq_of_params]))
+        self._send(protocol.BATCH, payload)
+        return self._reply().status
+    
+    def _results(self, sql: str, params: Any) -> 'Results':
+        if params is None:
+            self._send(protocol.QUERY, protocol.pack_text(sql))
+        else:
+            payload = protocol.U32.pack(self._prepare(sql)) + protocol.pack_params(params)
+            self._send(protocol.EXECUTE, payload)
+        return self._reply()
+    
+    def _prepare(self, sql: str) -> int:
+        """The server id of the statement, preparing it on first use"""
+        statement_id = self.statements.get(sql)
+        if statement_id is not None:
+            self.statements.move_to_end(sql)
+            return statement_id
+        self._send(protocol.PREPARE, protocol.pack_text(sql))
+        statement_id = self._reply().statement_id
+        self.statements[sql] = statement_id
+        if len(self.statements) > STATEMENT_CACHE_SIZE:
+            _, old_id = self.statements.popitem(last=False)
+            self._send(protocol.CLOSE, protocol.U32.pack(old_id))
+        return statement_id
+    
+    def _send(self, message_type: int, payload: bytes):
+        if not self.usable:
+            raise ValueError("Connection is closed")
+        try:
+            self.sock.sendall(protocol.frame(message_type, payload))
+        except OSError:
+            self.close()
+            raise
+    
+    def _reply(self) -> 'Results':
+        """Read up to the first frame of the reply that is not row data"""
+        results = Results(self)
+        results.read_until_rows()
+        return results
+    
+    def _read_frame(self):
+        try:
+            header = self.file.read(protocol.HEADER.size)
+            if len(header) < protocol.HEADER.size:
+                raise ConnectionError("Server closed the connection")
+            length, message_type = protocol.read_header(header)
+            payload = self.file.read(length)
+            if len(payload) < length:
+                raise ConnectionError("Server closed the connection")
+        except (OSError, ProtocolError):
+            self.close()
+            raise
+        return message_type, Reader(payload)
+    
+    def rollback(self):
+        """Roll back the transaction left open, if any"""
+        if self.in_transaction:
+            self.execute('ROLLBACK')
+    
+    def close(self):
+        self.usable = False
+        try:
+            self.file.close()
+            self.sock.close()
+        except OSError:
+            pass
+    
+    def __enter__(self) -> 'Connection':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Results:
+    """The reply to one request, read from the connection as it is
+    iterated: result rows as dicts, then the final frame"""
+    
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.names: List[str] = []
+        # Buffered rows of the current DATA_ROWS frame
+        self.pending: List[tuple] = []
+        self.done = False
+        self.status: Optional[str] = None
+        self.statement_id: Optional[int] = None
+        self.row_count = 0
+    
+    def read_until_rows(self):
+        """Read frames until rows are buffered or the reply ends, raising
+        the error it ends with"""
+        while not self.pending and not self.done:
+            message_type, reader = self.connection._read_frame()
+            if message_type == protocol.ROW_DESCRIPTION:
+                self.names = reader.names()
+            elif message_type == protocol.DATA_ROWS:
+                self.pending = reader.rows()
+                self.pending.reverse()
+            else:
+                self._finish(message_type, reader)
+    
+    def _finish(self, message_type: int, reader: Reader):
+        self.done = True
+        self.connection.in_transaction = reader.u8() == protocol.IN_TRANSACTION
+        if message_type == protocol.COMPLETE:
+            self.row_count = reader.u32()
+        elif message_type == protocol.STATUS:
+            self.status = reader.text()
+        elif message_type == protocol.PREPARED:
+            self.statement_id = reader.u32()
+        elif message_type == protocol.ERROR:
+            raise ValueError(reader.text())
+        else:
+            self.connection.close()
+            raise ProtocolError(f"Unexpected message type {message_type}")
+    
+    def __iter__(self) -> Iterator[Dict]:
+        names = self.names
+        try:
+            while True:
+                if not self.pending:
+                    self.read_until_rows()
+                    if not self.pending:
+                        return
+                    names = self.names
+                yield dict(zip(names, self.pending.pop()))
+        finally:
+            if not self.done:
+                # Abandoned in the middle of the rows, which the server
+                # would go on sending
+                self.connection.close()
+
+
+class ConnectionPool:
+    """Up to size connections to the server, shared between threads.
+    
+    A connection is returned to the pool with any transaction left open
+    rolled back, and dropped if it broke.
+    """
+    
+    def __init__(self, host: str = '127.0.0.1', port: int = protocol.DEFAULT_PORT,
+                 size: int = 10, timeout: Optional[float] = None):
+        if size < 1:
+            raise ValueError(f"Pool size must be at least 1, got {size}")
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle: queue.LifoQueue = queue.LifoQueue()
+        # Free places for new connections
+        self.slots = threading.Semaphore(size)
+        self.closed = False
+    
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[Connection]:
+        """A connection for the block, waiting up to timeout seconds for
+        one to be free"""
+        if self.closed:
+            raise ValueError("Connection pool is closed")
+        if not self.slots.acquire(timeout=timeout):
+            raise ValueError("Timed out waiting for a free connection")
+        try:
+            try:
+                connection = self.idle.get_nowait()
+            except queue.Empty:
+                connection = Connection(self.host, self.port, self.timeout)
+            try:
+                yield connection
+            finally:
+                self._release(connection)
+        finally:
+            self.slots.release()
+    
+    def _release(self, connection: Connection):
+        if connection.usable and connection.in_transaction:
+            try:
+                connection.rollback()
+            except (OSError, ValueError):
+                connection.close()
+        if connection.usable and not self.closed:
+            self.idle.put(connection)
+        else:
+            connection.close()
+    
+    def execute(self, sql: str, params: Any = None) -> Union[List[Dict], str]:
+        """Run one statement on a pooled connection"""
+        with self.connection() as connection:
+            return connection.execute(sql, params)
+    
+    def executemany(self, sql: str, seq_of_params: Iterable) -> str:
+        with self.connection() as connection:
+            return connection.executemany(sql, seq_of_params)
+    
+    def close(self):
+        """Close the idle connections; those in use close when returned"""
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,290 @@
+import operator
+import sys
+from array import array
+from itertools import compress, repeat
+from typing import Any, Callable, Dict, List, Sequence
+
+# Comparison used to build a mask; receives (column value, operand)
+Comparison = Callable[[Any, Any], bool]
+
+# Condition operators evaluated with mask(); any other test goes through
+# test_mask(), which also sees NULLs
+MASK_OPS = frozenset(['=', '!=', '<', '<=', '>', '>=', 'between', 'like'])
+
+
+# A mask holds one byte per row: 1 if the row matches, 0 otherwise.
+# Masks are combined as big integers so the work happens in C.
+
+_NOT = bytes([1]) + bytes(255)
+
+
+def all_mask(length: int) -> bytes:
+    return b'\x01' * length
+
+
+def and_masks(left: bytes, right: bytes) -> bytes:
+    combined = int.from_bytes(left, 'little') & int.from_bytes(right, 'little')
+    return combined.to_bytes(len(left), 'little')
+
+
+def or_masks(left: bytes, right: bytes) -> bytes:
+    combined = int.from_bytes(left, 'little') | int.from_bytes(right, 'little')
+    return combined.to_bytes(len(left), 'little')
+
+
+def not_mask(mask: bytes) -> bytes:
+    return bytes(mask).translate(_NOT)
+
+
+def mask_positions(mask: bytes) -> List[int]:
+    """Row positions whose mask byte is set"""
+    matches = mask.count(1)
+    if matches * 8 > len(mask):
+        return list(compress(range(len(mask)), mask))
+
+    # Sparse masks: jump from match to match with find()
+    positions = []
+    i = mask.find(1)
+    while i != -1:
+        positions.append(i)
+        i = mask.find(1, i + 1)
+    return positions
+
+
+class NumericColumn:
+    """int, float or boolean values packed in a typed array plus a null mask.
+
+    An int column moves its values to a plain list once one does not fit
+    in 64 bits, as row tables take ints of any size.
+    """
+
+    def __init__(self, typecode: str, convert: Callable):
+        self.typecode = typecode
+        self.convert = convert
+        self.values = array(typecode)
+        self.nulls = bytearray()
+        self.null_count = 0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _widen(self, value: Any):
+        """Switch to a list of values after value overflowed the array"""
+        if self.typecode != 'q':
+            raise ValueError(f"Value {value!r} cannot be stored in a columnar column")
+        self.values = list(self.values)
+
+    def _new_values(self, values: Any) -> Any:
+        return list(values) if isinstance(self.values, list) else array(self.typecode, values)
+
+    def _pack(self, value: Any) -> Any:
+        try:
+            return self.convert(value)
+        except (OverflowError, TypeError):
+            raise ValueError(f"Value {value!r} cannot be stored in a columnar column")
+
+    def append(self, value: Any):
+        if value is None:
+            self.values.append(0)
+            self.nulls.append(1)
+            self.null_count += 1
+        else:
+            packed = self._pack(value)
+            try:
+                self.values.append(packed)
+            except OverflowError:
+                self._widen(value)
+                self.values.append(packed)
+            self.nulls.append(0)
+
+    def extend(self, values: Sequence[Any]):
+        """Append many values; if one is rejected none of them are kept"""
+        packed = [0 if value is None else self._pack(value) for value in values]
+        length = len(self.values)
+        try:
+            self.values.extend(packed)
+        except OverflowError:
+            del self.values[length:]
+            self._widen(max(packed, key=abs))
+            self.values.extend(packed)
+        nulls = bytes(value is None for value in values)
+        self.nulls += nulls
+        self.null_count += nulls.count(1)
+
+    def get(self, position: int) -> Any:
+        if self.null_count and self.nulls[position]:
+            return None
+        value = self.values[position]
+        return bool(value) if self.typecode == 'b' else value
+
+    def set(self, position: int, value: Any):
+        packed = 0 if value is None else self._pack(value)
+        try:
+            self.values[position] = packed
+        except OverflowError:
+            self._widen(value)
+            self.values[position] = packed
+        self.null_count += (value is None) - self.nulls[position]
+        self.nulls[position] = value is None
+
+    def take(self, positions: List[int]) -> List[Any]:
+        return [self.get(i) for i in positions]
+
+    def keep(self, mask: bytes):
+        """Drop every position whose mask byte is 0"""
+        self.values = self._new_values(compress(self.values, mask))
+        self.nulls = bytearray(compress(self.nulls, mask))
+        self.null_count = self.nulls.count(1)
+
+    def truncate(self, length: int):
+        del self.values[length:]
+        del self.nulls[length:]
+        self.null_count = self.nulls.count(1)
+
+    def clear(self):
+        self.values = array(self.typecode)
+        self.nulls = bytearray()
+        self.null_count = 0
+
+    def mask(self, compare: Comparison, operand: Any) -> bytes:
+        """Evaluate compare(value, operand) for the whole column at once"""
+        if operand is None:
+            return bytes(len(self.values))
+        try:
+            operand = self.convert(operand)
+        except (ValueError, TypeError, OverflowError):
+            return bytes(len(self.values))
+
+        if self.typecode == 'b':
+            # Booleans are single bytes, so a translate table covers them
+            table = bytes(bool(compare(bool(v), operand)) for v in range(256))
+            result = self.values.tobytes().translate(table)
+        else:
+            result = bytes(map(compare, self.values, repeat(operand)))
+        if self.null_count:
+            # NULL never satisfies a comparison
+            result = and_masks(result, not_mask(self.nulls))
+        return result
+
+    def test_mask(self, test: Callable[[Any], bool]) -> bytes:
+        """Evaluate a value test, which also receives NULLs, for the whole column"""
+        if self.typecode == 'b':
+            table = bytes(bool(test(bool(v))) for v in range(256))
+            result = self.values.tobytes().translate(table)
+        else:
+            result = bytes(map(test, self.values))
+        if self.null_count:
+            if test(None):
+                result = or_masks(result, self.nulls)
+            else:
+                result = and_masks(result, not_mask(self.nulls))
+        return result
+
+    def memory_usage(self) -> int:
+        if isinstance(self.values, list):
+            return (sys.getsizeof(self.values) + sum(sys.getsizeof(v) for v in self.values)
+                    + sys.getsizeof(self.nulls))
+        return (self.values.buffer_info()[1] * self.values.itemsize
+                + sys.getsizeof(self.nulls))
+
+
+class DictionaryColumn:
+    """Values stored once in a dictionary and referenced by integer codes.
+
+    Codes start one byte wide and widen as the dictionary grows. While they
+    are single bytes any predicate becomes a 256-entry translate table.
+    """
+
+    def __init__(self):
+        self.codes = array('B')
+        self.dictionary: List[Any] = []
+        self.lookup: Dict[Any, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _code(self, value: Any) -> int:
+        code = self.lookup.get(value)
+        if code is None:
+            code = len(self.dictionary)
+            self.dictionary.append(value)
+            self.lookup[value] = code
+            if code == 256:
+                self.codes = array('H', self.codes)
+            elif code == 65536:
+                self.codes = array('l', self.codes)
+        return code
+
+    def append(self, value: Any):
+        # Look the code up first: it may widen self.codes
+        code = self._code(value)
+        self.codes.append(code)
+
+    def extend(self, values: Sequence[Any]):
+        # Codes first, as for append()
+        codes = [self._code(value) for value in values]
+        self.codes.extend(codes)
+
+    def get(self, position: int) -> Any:
+        return self.dictionary[self.codes[position]]
+
+    def set(self, position: int, value: Any):
+        code = self._code(value)
+        self.codes[position] = code
+
+    def take(self, positions: List[int]) -> List[Any]:
+        dictionary, codes = self.dictionary, self.codes
+        return [dictionary[codes[i]] for i in positions]
+
+    def keep(self, mask: bytes):
+        self.codes = array(self.codes.typecode, compress(self.codes, mask))
+
+    def truncate(self, length: int):
+        del self.codes[length:]
+
+    def clear(self):
+        self.codes = array('B')
+        self.dictionary = []
+        self.lookup = {}
+
+    def mask(self, compare: Comparison, operand: Any) -> bytes:
+        if operand is None:
+            return bytes(len(self.codes))
+
+        if compare is operator.eq and self.codes.typecode != 'B':
+            # Equality only needs the operand's code, not the values
+            code = self.lookup.get(operand)
+            if code is None:
+                return bytes(len(self.codes))
+            return bytes(map(code.__eq__, self.codes))
+
+        def test(value: Any) -> bool:
+            try:
+                return value is not None and bool(compare(value, operand))
+            except TypeError:
+                return False
+        return self.test_mask(test)
+
+    def test_mask(self, test: Callable[[Any], bool]) -> bytes:
+        """Evaluate a value test once per distinct value, NULL included"""
+        matches = [bool(test(value)) for value in self.dictionary]
+        if self.codes.typecode == 'B':
+            table = bytes(matches) + bytes(256 - len(matches))
+            return self.codes.tobytes().translate(table)
+        return bytes(map(matches.__getitem__, self.codes))
+
+    def memory_usage(self) -> int:
+        return (self.codes.buffer_info()[1] * self.codes.itemsize
+                + sum(sys.getsizeof(v) for v in self.dictionary)
+                + sys.getsizeof(self.lookup))
+
+
+def make_column(col_type: str):
+    """Column vector for a schema type"""
+    if col_type == 'int':
+        return NumericColumn('q', int)
+    if col_type == 'float':
+        return NumericColumn('d', float)
+    if col_type == 'boolean':
+        return NumericColumn('b', bool)
+    return DictionaryColumn()
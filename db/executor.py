@@ -1,21 +1,73 @@
-
-from typing import Dict, List, Any
-from .storage import Storage
+import os
+import threading
+from functools import partial
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Iterator, List, Any, Optional
+from .mvcc import Snapshot
+from .storage import Storage, Transaction, DEFERRED, DURABILITY_MODES
+from .parser import Parser, PreparedStatement
+from .bulk import TEXT_CONVERTERS, copy_options, read_csv, read_jsonl, write_rows
+from .sort import DEFAULT_WORK_MEM
+from .operators import Operator, explain
+from .planner import Planner
 
 class Executor:
     """Execute parsed SQL queries"""
     
-    def __init__(self, storage: Storage):
+    def __init__(self, storage: Storage, durability: Optional[str] = None,
+                 work_mem: int = DEFAULT_WORK_MEM, parser: Optional[Parser] = None,
+                 copy_dir: Optional[str] = None):
         self.storage = storage
+        # Parses the statements given to prepare()
+        self.parser = parser or Parser()
+        # Session durability; None falls back to the database default
+        self.durability = durability
+        # Durability of the executemany() batch running in each thread
+        self._batch = threading.local()
+        # Transaction opened by BEGIN in each thread
+        self._session = threading.local()
+        # Bytes a sort may hold before spilling sorted runs to disk
+        self.work_mem = work_mem
+        # Directory COPY reads and writes files in (default: the working
+        # directory); paths are relative to it and cannot leave it
+        self.copy_dir = os.path.realpath(copy_dir or os.getcwd())
+    
+    def prepare(self, sql: str) -> PreparedStatement:
+        """Parse a statement with ? or :name placeholders once, to be run
+        by execute() or executemany() with parameter values"""
+        return self.parser.prepare(sql)
+    
+    @property
+    def transaction(self) -> Optional[Transaction]:
+        """The transaction this thread opened with BEGIN, if any"""
+        return getattr(self._session, 'transaction', None)
     
-    def execute(self, parsed_query: Dict) -> Any:
-        """Execute a parsed query"""
+    def execute(self, parsed_query: Any, params: Any = None) -> Any:
+        """Execute a parsed query, or a prepared statement with params"""
+        if isinstance(parsed_query, PreparedStatement) and parsed_query.parsed['type'] == 'select':
+            with self.storage.locked(reads=self._query_tables(parsed_query.parsed)), \
+                    self.storage.snapshot(self.transaction) as snapshot:
+                return list(self._prepared_plan(parsed_query, params, snapshot))
+        parsed_query = self._bind(parsed_query, params)
+        if parsed_query['type'] in ('begin', 'commit', 'rollback'):
+            # The transaction holds its own locks until it ends
+            return self._dispatch(parsed_query)
+        if self.transaction is not None:
+            self._lock_in_transaction(parsed_query)
+        with self.storage.locked(**self._statement_locks(parsed_query)):
+            return self._dispatch(parsed_query)
+    
+    def _dispatch(self, parsed_query: Dict) -> Any:
         query_type = parsed_query['type']
         
         if query_type == 'create_table':
             return self._execute_create_table(parsed_query)
         elif query_type == 'insert':
             return self._execute_insert(parsed_query)
+        elif query_type == 'copy':
+            return self._execute_copy(parsed_query)
+        elif query_type == 'copy_to':
+            return self._execute_copy_to(parsed_query)
         elif query_type == 'select':
             return self._execute_select(parsed_query)
         elif query_type == 'update':
@@ -24,41 +76,257 @@ class Executor:
             return self._execute_delete(parsed_query)
         elif query_type == 'drop_table':
             return self._execute_drop_table(parsed_query)
+        elif query_type == 'create_index':
+            return self._execute_create_index(parsed_query)
+        elif query_type == 'drop_index':
+            return self._execute_drop_index(parsed_query)
+        elif query_type == 'vacuum':
+            return self._execute_vacuum(parsed_query)
+        elif query_type == 'set':
+            return self._execute_set(parsed_query)
+        elif query_type == 'explain':
+            return self._execute_explain(parsed_query)
+        elif query_type == 'analyze':
+            return self._execute_analyze(parsed_query)
+        elif query_type == 'begin':
+            return self._execute_begin(parsed_query)
+        elif query_type == 'commit':
+            return self._execute_commit(parsed_query)
+        elif query_type == 'rollback':
+            return self._execute_rollback(parsed_query)
         else:
             raise ValueError(f"Unknown query type: {query_type}")
     
+    def executemany(self, statement: PreparedStatement, seq_of_params: Iterable) -> List[Any]:
+        """Execute a prepared statement once per parameter set.
+        
+        The changes are made durable together after the last execution,
+        rather than committing the log once per row.
+        """
+        results = []
+        self._batch.durability = DEFERRED
+        try:
+            for params in seq_of_params:
+                results.append(self.execute(statement, params))
+        finally:
+            self._batch.durability = None
+            if results:
+                self.storage.commit_log(self.durability)
+        return results
+    
+    def _durability(self) -> Optional[str]:
+        """Durability of a change made by this thread"""
+        return getattr(self._batch, 'durability', None) or self.durability
+    
+    def _query_tables(self, query: Dict) -> List[str]:
+        """Tables a SELECT reads"""
+        return [query['table_name']] + [join['table_name'] for join in query.get('joins') or []]
+    
+    def _statement_locks(self, query: Dict) -> Dict[str, Any]:
+        """The storage.locked() arguments of a statement: the tables it
+        reads and the table it changes, or the whole catalog for schema
+        changes and VACUUM"""
+        query_type = query['type']
+        if query_type == 'select':
+            return {'reads': self._query_tables(query)}
+        if query_type in ('explain', 'copy_to'):
+            return {'reads': self._query_tables(query['query'])}
+        if query_type in ('insert', 'copy', 'update', 'delete'):
+            return {'writes': [query['table_name']]}
+        if query_type == 'analyze':
+            name = query.get('table_name')
+            return {'reads': [name] if name is not None else list(self.storage.tables)}
+        if query_type == 'set':
+            return {}
+        return {'exclusive': True}
+    
+    def _lock_in_transaction(self, query: Dict):
+        """Have the transaction take the write lock of the table a
+        statement changes, giving up after a timeout rather than waiting
+        on another transaction forever"""
+        query_type = query['type']
+        if query_type in ('insert', 'update', 'delete'):
+            self.transaction.lock(query['table_name'])
+        elif query_type not in ('select', 'explain', 'copy_to', 'analyze', 'set'):
+            name = 'COPY FROM' if query_type == 'copy' else query_type.replace('_', ' ').upper()
+            raise ValueError(f"{name} cannot run inside a transaction")
+    
+    def _bind(self, query: Any, params: Any) -> Dict:
+        if isinstance(query, PreparedStatement):
+            return query.bind(params)
+        if query.get('parameters'):
+            raise ValueError("Statement has parameters; run it with prepare() and execute(statement, params)")
+        return query
+    
     def _execute_create_table(self, query: Dict) -> str:
         """Execute CREATE TABLE"""
         self.storage.create_table(
             name=query['table_name'],
             columns=query['columns'],
             primary_key=query.get('primary_key'),
-            unique_keys=query.get('unique_keys', [])
+            unique_keys=query.get('unique_keys', []),
+            layout=query.get('layout', 'row')
         )
         return f"Table '{query['table_name']}' created successfully"
     
     def _execute_insert(self, query: Dict) -> str:
         """Execute INSERT"""
+        columns, rows = query['columns'], query['rows']
+        if columns is None:
+            table = self.storage.tables.get(query['table_name'])
+            names = table.column_names if table is not None else []
+            if len(rows[0]) > len(names):
+                raise ValueError(f"INSERT has more values than table '{query['table_name']}' has columns")
+            columns = names[:len(rows[0])]
+        
+        if len(rows) > 1:
+            count = self.storage.insert_many(query['table_name'], rows, columns,
+                                             durability=self._durability(), txn=self.transaction)
+            return f"{count} row(s) inserted"
+        # Parsed statements are cached and shared, and the insert fills in
+        # generated IDs, so the row is built in a fresh dict
         row_id = self.storage.insert(
             table_name=query['table_name'],
-            data=query['data']
+            data=dict(zip(columns, rows[0])),
+            durability=self._durability(),
+            txn=self.transaction
         )
         return f"Row inserted with ID: {row_id}"
     
+    def _execute_copy(self, query: Dict) -> str:
+        """Execute COPY ... FROM: bulk-load a CSV or JSON lines file"""
+        fmt, header, delimiter = copy_options(query['path'], query['options'])
+        path = self._copy_path(query['path'])
+        table = self.storage.get_table(query['table_name'])
+        columns = query['columns']
+        try:
+            f = open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise ValueError(f"Cannot open '{query['path']}': {e.strerror}")
+        with f:
+            if fmt == 'jsonl':
+                columns = columns or table.column_names
+                count = self.storage.copy_from(table.name, read_jsonl(f, columns), columns)
+            else:
+                names, rows = read_csv(f, delimiter, header)
+                count = self.storage.copy_from(table.name, rows, columns or names, TEXT_CONVERTERS)
+        return f"{count} row(s) copied into '{table.name}'"
+    
+    def _copy_path(self, path: str) -> str:
+        """A COPY file path resolved against copy_dir, which it may not
+        leave (symbolic links included)"""
+        resolved = os.path.realpath(os.path.join(self.copy_dir, path))
+        if os.path.commonpath([resolved, self.copy_dir]) != self.copy_dir:
+            raise ValueError(f"COPY path '{path}' is outside the file directory '{self.copy_dir}'")
+        return resolved
+    
+    def _execute_copy_to(self, query: Dict) -> str:
+        """Execute COPY ... TO: write a query result to a CSV or JSON lines
+        file while the plan produces it"""
+        fmt, header, delimiter = copy_options(query['path'], query['options'])
+        path = self._copy_path(query['path'])
+        with self.storage.snapshot(self.transaction) as snapshot:
+            plan = self.plan_select(query['query'], snapshot)
+            names = list(dict.fromkeys(name for name, _ in plan.outputs))
+            count = write_rows(path, fmt, names, plan, header, delimiter)
+        return f"{count} row(s) copied to '{query['path']}'"
+    
     def _execute_select(self, query: Dict) -> List[Dict]:
         """Execute SELECT"""
-        return self.storage.select(
-            table_name=query['table_name'],
-            columns=query.get('columns'),
-            conditions=query.get('conditions')
-        )
+        with self.storage.snapshot(self.transaction) as snapshot:
+            return list(self.plan_select(query, snapshot))
+    
+    def stream(self, parsed_query: Any, params: Any = None) -> Iterator[Dict]:
+        """Execute a SELECT lazily, yielding result rows as they are produced.
+        
+        The query is planned right away, so errors surface here. The rows
+        hold the tables' read locks, and come from a snapshot taken at the
+        first row, until the iterator is exhausted or closed.
+        """
+        if isinstance(parsed_query, PreparedStatement) and parsed_query.parsed['type'] == 'select':
+            make_plan = partial(self._prepared_plan, parsed_query, params)
+            query = parsed_query.parsed
+        else:
+            query = self._bind(parsed_query, params)
+            if query['type'] != 'select':
+                raise ValueError("Only SELECT queries can be streamed")
+            make_plan = partial(self.plan_select, query)
+        names = self._query_tables(query)
+        with self.storage.locked(reads=names):
+            plan = make_plan()
+            version = self.storage.catalog_version
+        return self._locked_rows(plan, names, version, make_plan, self.transaction)
+    
+    def _locked_rows(self, plan: Operator, names: List[str], version: int,
+                     make_plan: Callable[[Optional[Snapshot]], Operator],
+                     txn: Optional[Transaction]) -> Iterator[Dict]:
+        with self.storage.locked(reads=names), self.storage.snapshot(txn) as snapshot:
+            if self.storage.catalog_version != version:
+                # The schema, indexes or statistics changed since planning
+                plan = make_plan(snapshot)
+            else:
+                # Evicted tables are loaded again in place
+                for name in names:
+                    self.storage.get_table(name)
+                plan = plan.bind((), snapshot)
+            yield from plan
+    
+    def plan_select(self, query: Dict, snapshot: Optional[Snapshot] = None) -> Operator:
+        """Build the operator tree for a SELECT reading through snapshot"""
+        plan = Planner(self.storage, self.work_mem).plan_select(query)
+        for _, node in plan.walk():
+            node.snapshot = snapshot
+        return plan
+    
+    def _prepared_plan(self, statement: PreparedStatement, params: Any,
+                       snapshot: Optional[Snapshot] = None) -> Operator:
+        """The plan of a prepared SELECT with params bound.
+        
+        The plan is built once with the placeholders in it and kept on the
+        statement until a schema, index or statistics change.
+        """
+        values = statement.parameter_values(params)
+        query = statement.parsed
+        # The plan refers to the tables, which must be loaded to be scanned
+        for name in [query['table_name']] + [join['table_name'] for join in query.get('joins') or []]:
+            self.storage.get_table(name)
+        key = (self.storage, self.storage.catalog_version, self.work_mem)
+        cached = statement.plan_cache
+        if cached is None or cached[0] != key:
+            plan = self.plan_select(query)
+            # Planning may have refreshed statistics
+            key = (self.storage, self.storage.catalog_version, self.work_mem)
+            cached = statement.plan_cache = (key, plan)
+        return cached[1].bind(values, snapshot)
+    
+    def _execute_explain(self, query: Dict) -> str:
+        """Execute EXPLAIN [ANALYZE]: show the plan, running it if analyzing"""
+        with self.storage.snapshot(self.transaction) as snapshot:
+            start = perf_counter()
+            plan = self.plan_select(query['query'], snapshot)
+            planning = perf_counter() - start
+            if not query['analyze']:
+                return '\n'.join(explain(plan))
+            
+            for _, node in plan.walk():
+                node.instrumented = True
+            start = perf_counter()
+            for _ in plan:
+                pass
+            execution = perf_counter() - start
+        lines = explain(plan, analyze=True)
+        lines.append(f"Planning time: {planning * 1000:.3f} ms")
+        lines.append(f"Execution time: {execution * 1000:.3f} ms")
+        return '\n'.join(lines)
     
     def _execute_update(self, query: Dict) -> str:
         """Execute UPDATE"""
         affected = self.storage.update(
             table_name=query['table_name'],
             updates=query['updates'],
-            conditions=query.get('conditions')
+            conditions=query.get('conditions'),
+            durability=self._durability(),
+            txn=self.transaction
         )
         return f"{affected} row(s) updated"
     
@@ -66,13 +334,95 @@ class Executor:
         """Execute DELETE"""
         affected = self.storage.delete(
             table_name=query['table_name'],
-            conditions=query.get('conditions')
+            conditions=query.get('conditions'),
+            durability=self._durability(),
+            txn=self.transaction
         )
         return f"{affected} row(s) deleted"
     
+    def _execute_begin(self, query: Dict) -> str:
+        """Execute BEGIN: run the following statements of this thread as
+        one transaction"""
+        if self.transaction is not None:
+            raise ValueError("A transaction is already in progress")
+        self._session.transaction = self.storage.begin()
+        return "Transaction started"
+    
+    def _execute_commit(self, query: Dict) -> str:
+        """Execute COMMIT: log the transaction's changes in one record and
+        make them visible"""
+        txn = self.transaction
+        if txn is None:
+            raise ValueError("No transaction in progress")
+        self._session.transaction = None
+        self.storage.commit(txn, self._durability())
+        return "Transaction committed"
+    
+    def _execute_rollback(self, query: Dict) -> str:
+        """Execute ROLLBACK: undo the transaction's changes"""
+        txn = self.transaction
+        if txn is None:
+            raise ValueError("No transaction in progress")
+        self._session.transaction = None
+        self.storage.rollback(txn)
+        return "Transaction rolled back"
+    
     def _execute_drop_table(self, query: Dict) -> str:
         """Execute DROP TABLE"""
         if self.storage.drop_table(query['table_name']):
             return f"Table '{query['table_name']}' dropped"
         else:
-            return f"Table '{query['table_name']}' not found"
\ No newline at end of file
+            return f"Table '{query['table_name']}' not found"
+    
+    def _execute_create_index(self, query: Dict) -> str:
+        """Execute CREATE INDEX"""
+        index_name = self.storage.create_index(
+            index_name=query.get('index_name'),
+            table_name=query['table_name'],
+            column=query['column'],
+            kind=query.get('using', 'hash')
+        )
+        return f"Index '{index_name}' created on {query['table_name']}({query['column']})"
+    
+    def _execute_drop_index(self, query: Dict) -> str:
+        """Execute DROP INDEX"""
+        if self.storage.drop_index(query['index_name']):
+            return f"Index '{query['index_name']}' dropped"
+        else:
+            return f"Index '{query['index_name']}' not found"
+    
+    def _execute_vacuum(self, query: Dict) -> str:
+        """Execute VACUUM"""
+        reclaimed = self.storage.vacuum(query.get('table_name'))
+        return f"VACUUM reclaimed {reclaimed} slot(s)"
+    
+    def _execute_analyze(self, query: Dict) -> str:
+        """Execute ANALYZE"""
+        tables = self.storage.analyze(query.get('table_name'))
+        return f"ANALYZE gathered statistics for {len(tables)} table(s)"
+    
+    def _execute_set(self, query: Dict) -> str:
+        """Execute SET for session options"""
+        option = query['option']
+        value = str(query['value']).lower()
+        
+        if option == 'durability':
+            if value == 'default':
+                self.durability = None
+                return f"durability reset to {self.storage.durability}"
+            if value not in DURABILITY_MODES:
+                raise ValueError(f"Unknown durability mode '{value}'. "
+                                 f"Expected one of: {', '.join(DURABILITY_MODES)}")
+            self.durability = value
+            return f"durability set to {value}"
+        
+        if option == 'work_mem':
+            if value == 'default':
+                self.work_mem = DEFAULT_WORK_MEM
+            elif isinstance(query['value'], int) and query['value'] > 0:
+                self.work_mem = query['value']
+            else:
+                raise ValueError(f"work_mem must be a positive number of bytes, got {query['value']!r}")
+            return f"work_mem set to {self.work_mem} bytes"
+        
+        raise ValueError(f"Unknown option '{option}'")
@@ -1,11 +1,21 @@
-from typing import Dict, List, Any, Set
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Any, Set, Iterable, Iterator, Tuple, Optional
+
+from .predicates import Predicate, condition_terms, like_prefix
 
 class Index:
-    def __init__(self, column_name: str):
+    """Hash index from a column value to the positions of the rows holding it"""
+    
+    kind = 'hash'
+    
+    def __init__(self, column_name: str, name: Optional[str] = None):
         self.column_name = column_name
+        self.name = name or column_name
         self.index: Dict[Any, Set[int]] = {}
     
     def add(self, value: Any, row_id: int):
+        if value is None:
+            return
         if value not in self.index:
             self.index[value] = set()
         self.index[value].add(row_id)
@@ -17,17 +27,294 @@ class Index:
                 del self.index[value]
     
     def find(self, value: Any) -> Set[int]:
-        return self.index.get(value, set())
+        try:
+            return self.index.get(value, set())
+        except TypeError:
+            # Unhashable operands cannot match any stored value
+            return set()
+    
+    def supports(self, condition: Any) -> bool:
+        """True if search() can answer the condition"""
+        return any(term.op in ('=', 'in') for term in condition_terms(condition))
+    
+    def search(self, condition: Any) -> Optional[Set[int]]:
+        """Candidate row ids for a condition, or None if it can't be answered"""
+        for term in condition_terms(condition):
+            if term.op == '=':
+                return self.find(term.value)
+            if term.op == 'in':
+                return self.find_any(term.value)
+        return None
+    
+    def find_any(self, values: Iterable[Any]) -> Set[int]:
+        """Row ids holding any of the values (an IN list)"""
+        result: Set[int] = set()
+        for value in values:
+            if value is not None:
+                result |= self.find(value)
+        return result
+    
+    def build(self, entries: Iterable[Tuple[int, Any]]):
+        """Replace the contents with (row id, value) pairs"""
+        self.clear()
+        for row_id, value in entries:
+            self.add(value, row_id)
+    
+    def clear(self):
+        self.index = {}
+    
+    def remap(self, mapping: Dict[int, int]):
+        """Renumber row ids after the table was compacted"""
+        self.index = {value: {mapping[row_id] for row_id in row_ids}
+                      for value, row_ids in self.index.items()}
+
+class OrderedIndex(Index):
+    """Sorted index supporting range scans, prefix matches and ordered walks.
+    
+    Values are kept in a sorted list with the row ids in a parallel list;
+    equal values are ordered by row id so walks match a stable sort.
+    """
+    
+    kind = 'btree'
+    
+    def __init__(self, column_name: str, name: Optional[str] = None):
+        super().__init__(column_name, name)
+        self.keys: List[Any] = []
+        self.row_ids: List[int] = []
+        # Rows holding NULL, which sort before every value
+        self.nulls: Set[int] = set()
+    
+    def add(self, value: Any, row_id: int):
+        if value is None:
+            self.nulls.add(row_id)
+            return
+        lo, hi = bisect_left(self.keys, value), bisect_right(self.keys, value)
+        i = bisect_left(self.row_ids, row_id, lo, hi)
+        self.keys.insert(i, value)
+        self.row_ids.insert(i, row_id)
+    
+    def remove(self, value: Any, row_id: int):
+        if value is None:
+            self.nulls.discard(row_id)
+            return
+        lo, hi = bisect_left(self.keys, value), bisect_right(self.keys, value)
+        i = bisect_left(self.row_ids, row_id, lo, hi)
+        if i < hi and self.row_ids[i] == row_id:
+            del self.keys[i]
+            del self.row_ids[i]
+    
+    def find(self, value: Any) -> Set[int]:
+        return set(self.range(value, value))
+    
+    def range(self, low: Any = None, high: Any = None,
+              low_inclusive: bool = True, high_inclusive: bool = True) -> List[int]:
+        """Row ids with low <(=) value <(=) high; None leaves a side open"""
+        start, end = self._bounds(low, high, low_inclusive, high_inclusive)
+        return self.row_ids[start:end]
+    
+    def _bounds(self, low: Any = None, high: Any = None,
+                low_inclusive: bool = True, high_inclusive: bool = True) -> Tuple[int, int]:
+        """Slice of keys holding the values of a range"""
+        try:
+            start = 0
+            if low is not None:
+                start = (bisect_left if low_inclusive else bisect_right)(self.keys, low)
+            end = len(self.keys)
+            if high is not None:
+                end = (bisect_right if high_inclusive else bisect_left)(self.keys, high)
+        except TypeError:
+            # Operand not comparable with the indexed values
+            return 0, 0
+        return start, max(start, end)
+    
+    def prefix(self, prefix: str) -> List[int]:
+        """Row ids of string values starting with prefix"""
+        try:
+            i = bisect_left(self.keys, prefix)
+        except TypeError:
+            return []
+        result = []
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            result.append(self.row_ids[i])
+            i += 1
+        return result
+    
+    def supports(self, condition: Any) -> bool:
+        return any(term.op in ('=', 'in', '<', '<=', '>', '>=', 'between')
+                   or (term.op == 'like' and isinstance(term.value, str)
+                       and like_prefix(term.value) is not None)
+                   for term in condition_terms(condition))
+    
+    def search(self, condition: Any) -> Optional[Set[int]]:
+        # Intersect the ranges of every term the index can answer
+        candidates = None
+        for term in condition_terms(condition):
+            matches = self._search_term(term)
+            if matches is not None:
+                candidates = set(matches) if candidates is None else candidates & set(matches)
+        return candidates
+    
+    def _search_term(self, term: Predicate) -> Optional[List[int]]:
+        bounds = self.term_bounds(term)
+        if bounds is not None:
+            return self.row_ids[bounds[0]:bounds[1]]
+        op, value = term
+        if op == 'in':
+            return sorted(self.find_any(value))
+        if op == 'like' and isinstance(value, str):
+            prefix = like_prefix(value)
+            if prefix is not None:
+                return self.prefix(prefix)
+        return None
+    
+    def term_bounds(self, term: Predicate) -> Optional[Tuple[int, int]]:
+        """Slice of keys matching a comparison term, or None for other terms"""
+        op, value = term
+        if op == '=':
+            return self._bounds(value, value) if value is not None else (0, 0)
+        if op == '<':
+            return self._bounds(high=value, high_inclusive=False)
+        if op == '<=':
+            return self._bounds(high=value)
+        if op == '>':
+            return self._bounds(low=value, low_inclusive=False)
+        if op == '>=':
+            return self._bounds(low=value)
+        if op == 'between':
+            return self._bounds(*value)
+        return None
+    
+    def count(self, condition: Any) -> Optional[int]:
+        """Number of rows matching the comparison terms of a condition,
+        counted without fetching them, or None if it has no such terms"""
+        start, end, found = 0, len(self.keys), False
+        for term in condition_terms(condition):
+            bounds = self.term_bounds(term)
+            if bounds is not None:
+                found = True
+                start, end = max(start, bounds[0]), min(end, bounds[1])
+        return max(end - start, 0) if found else None
+    
+    def ordered(self, descending: bool = False) -> Iterator[int]:
+        """Row ids in value order, NULLs first (last when descending)"""
+        if not descending:
+            yield from sorted(self.nulls)
+            yield from self.row_ids
+            return
+        
+        # Walk runs of equal values backwards, keeping row id order within each
+        end = len(self.keys)
+        while end:
+            start = bisect_left(self.keys, self.keys[end - 1], 0, end)
+            yield from self.row_ids[start:end]
+            end = start
+        yield from sorted(self.nulls)
+    
+    def walk(self, descending: bool = False,
+             after: Optional[Tuple[Any, int]] = None) -> Iterator[Tuple[Any, int]]:
+        """(value, row id) pairs in the order of ordered(), resuming after
+        the pair after (value None for NULLs) if given.
+        
+        Lets a long walk be taken a page at a time while the index changes
+        in between.
+        """
+        keys, row_ids = self.keys, self.row_ids
+        nulls_after = -1
+        if not descending:
+            if after is None or after[0] is None:
+                if after is not None:
+                    nulls_after = after[1]
+                yield from ((None, i) for i in sorted(i for i in self.nulls if i > nulls_after))
+                start = 0
+            else:
+                value, row_id = after
+                lo, hi = bisect_left(keys, value), bisect_right(keys, value)
+                start = bisect_right(row_ids, row_id, lo, hi)
+            for i in range(start, len(keys)):
+                yield keys[i], row_ids[i]
+            return
+        
+        if after is not None and after[0] is None:
+            nulls_after = after[1]
+        else:
+            end = len(keys)
+            if after is not None:
+                # Finish the run of the cursor's value first
+                value, row_id = after
+                lo, hi = bisect_left(keys, value), bisect_right(keys, value)
+                for i in range(bisect_right(row_ids, row_id, lo, hi), hi):
+                    yield keys[i], row_ids[i]
+                end = lo
+            while end:
+                start = bisect_left(keys, keys[end - 1], 0, end)
+                for i in range(start, end):
+                    yield keys[i], row_ids[i]
+                end = start
+        yield from ((None, i) for i in sorted(i for i in self.nulls if i > nulls_after))
+    
+    def build(self, entries: Iterable[Tuple[int, Any]]):
+        self.clear()
+        pairs = []
+        for row_id, value in entries:
+            if value is None:
+                self.nulls.add(row_id)
+            else:
+                pairs.append((value, row_id))
+        pairs.sort()
+        self.keys = [value for value, _ in pairs]
+        self.row_ids = [row_id for _, row_id in pairs]
+    
+    def clear(self):
+        self.keys = []
+        self.row_ids = []
+        self.nulls = set()
+    
+    def remap(self, mapping: Dict[int, int]):
+        # Compaction keeps the relative order of row ids, so no re-sort
+        self.row_ids = [mapping[row_id] for row_id in self.row_ids]
+        self.nulls = {mapping[row_id] for row_id in self.nulls}
+
+# Index implementations by the name used in CREATE INDEX ... USING <kind>
+INDEX_KINDS = {'hash': Index, 'btree': OrderedIndex}
 
 class IndexManager:
+    """Secondary indexes of every table, by table name and index name"""
+    
     def __init__(self):
         self.indexes: Dict[str, Dict[str, Index]] = {}
     
-    def create_index(self, table_name: str, column_name: str):
-        if table_name not in self.indexes:
-            self.indexes[table_name] = {}
-        self.indexes[table_name][column_name] = Index(column_name)
+    def create_index(self, table_name: str, column_name: str,
+                     index_name: Optional[str] = None, kind: str = 'hash') -> Index:
+        index_name = index_name or f"{table_name}_{column_name}_idx"
+        if self.table_of(index_name) is not None:
+            raise ValueError(f"Index '{index_name}' already exists")
+        if kind not in INDEX_KINDS:
+            raise ValueError(f"Unknown index type '{kind}'. Expected one of: {', '.join(INDEX_KINDS)}")
+        index = INDEX_KINDS[kind](column_name, index_name)
+        self.table_indexes(table_name)[index_name] = index
+        return index
+    
+    def drop_index(self, index_name: str) -> Optional[str]:
+        """Remove an index and return the name of its table, if it existed"""
+        table_name = self.table_of(index_name)
+        if table_name is not None:
+            del self.indexes[table_name][index_name]
+        return table_name
+    
+    def drop_table(self, table_name: str):
+        self.indexes.pop(table_name, None)
+    
+    def table_indexes(self, table_name: str) -> Dict[str, Index]:
+        """The (live) index dict of a table, created empty if needed"""
+        return self.indexes.setdefault(table_name, {})
+    
+    def table_of(self, index_name: str) -> Optional[str]:
+        for table_name, indexes in self.indexes.items():
+            if index_name in indexes:
+                return table_name
+        return None
     
     def add_to_index(self, table_name: str, column_name: str, value: Any, row_id: int):
-        if table_name in self.indexes and column_name in self.indexes[table_name]:
-            self.indexes[table_name][column_name].add(value, row_id)
\ No newline at end of file
+        for index in self.indexes.get(table_name, {}).values():
+            if index.column_name == column_name:
+                index.add(value, row_id)
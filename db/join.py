@@ -0,0 +1,98 @@
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+# Joins combine row tuples: each output row is left_row + right_row. A LEFT
+# join pads left rows without a match with NULLs for the right columns.
+# NULL keys never match anything.
+
+JOIN_TYPES = ('INNER', 'LEFT')
+
+
+def hash_join(left: Iterable[Tuple], right: List[Tuple],
+              left_key: int, right_key: int, right_width: int,
+              join_type: str = 'INNER') -> Iterator[Tuple]:
+    """Equi-join by hashing the smaller input and probing with the other.
+
+    The right input is the build side unless the left one is a list with
+    fewer rows. Probing with the left input keeps the left row order.
+    """
+    if isinstance(left, list) and len(left) < len(right):
+        return _hash_join_build_left(left, right, left_key, right_key, right_width, join_type)
+    return _hash_join_build_right(left, right, left_key, right_key, right_width, join_type)
+
+
+def _build(rows: Iterable[Tuple], key: int) -> Dict[Any, List[Tuple]]:
+    table: Dict[Any, List[Tuple]] = {}
+    for row in rows:
+        value = row[key]
+        if value is not None:
+            table.setdefault(value, []).append(row)
+    return table
+
+
+def _hash_join_build_right(left, right, left_key, right_key, right_width, join_type):
+    buckets = _build(right, right_key)
+    padding = (None,) * right_width
+    for left_row in left:
+        value = left_row[left_key]
+        matches = buckets.get(value) if value is not None else None
+        if matches:
+            for right_row in matches:
+                yield left_row + right_row
+        elif join_type == 'LEFT':
+            yield left_row + padding
+
+
+def _hash_join_build_left(left, right, left_key, right_key, right_width, join_type):
+    buckets: Dict[Any, List[int]] = {}
+    for i, row in enumerate(left):
+        if row[left_key] is not None:
+            buckets.setdefault(row[left_key], []).append(i)
+    matched = bytearray(len(left))
+
+    for right_row in right:
+        value = right_row[right_key]
+        if value is None:
+            continue
+        for i in buckets.get(value, ()):
+            matched[i] = 1
+            yield left[i] + right_row
+
+    if join_type == 'LEFT':
+        padding = (None,) * right_width
+        for i, row in enumerate(left):
+            if not matched[i]:
+                yield row + padding
+
+
+def merge_join(left: Iterable[Tuple], right: Iterable[Tuple],
+               left_key: int, right_key: int, right_width: int,
+               join_type: str = 'INNER') -> Iterator[Tuple]:
+    """Equi-join two inputs that are both sorted on their keys (NULLs first).
+
+    Only the run of right rows sharing the current key is held in memory,
+    and the output stays sorted on the key.
+    """
+    padding = (None,) * right_width
+    right = iter(right)
+    right_row = next(right, None)
+    group: List[Tuple] = []
+    group_key: Any = None
+
+    for left_row in left:
+        value = left_row[left_key]
+        if value is not None and (not group or value != group_key):
+            # Skip right rows with smaller (or NULL) keys, then collect the run
+            while right_row is not None and (right_row[right_key] is None
+                                             or right_row[right_key] < value):
+                right_row = next(right, None)
+            group = []
+            while right_row is not None and right_row[right_key] == value:
+                group.append(right_row)
+                right_row = next(right, None)
+            group_key = value
+
+        if value is not None and group:
+            for match in group:
+                yield left_row + match
+        elif join_type == 'LEFT':
+            yield left_row + padding
@@ -0,0 +1,266 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+# Statements lock what they touch: the catalog lock shared, then the lock of
+# each table they use, shared, and the writer lock of each table they
+# change, taken in table name order so two statements cannot deadlock.
+# Readers work from a snapshot of the row versions (see mvcc.py), so they
+# never wait for writers and writers never wait for them. Sharing a table
+# lock only pins the table in memory; taking it exclusively (to unload the
+# table) waits for every statement using it. An open transaction keeps only
+# the table and writer locks of the tables it changed between statements,
+# never the catalog lock. Checkpoints wait for running writers and pass over
+# the tables open transactions hold, and DDL takes the catalog lock
+# exclusively, waiting for running statements but refusing to wait for an
+# open transaction.
+
+
+class ReadWriteLock:
+    """Many readers or one writer.
+    
+    Waiting writers keep new readers out so they are not starved. Locks
+    are reentrant per thread: the writer may also read, and a reader may
+    read again, but a reader cannot upgrade to writing.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        # Read depth by thread id
+        self._readers: Dict[int, int] = {}
+        self._writer: Optional[int] = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+    
+    def acquire_read(self, blocking: bool = True) -> bool:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me and me not in self._readers:
+                while self._writer is not None or self._waiting_writers:
+                    if not blocking:
+                        return False
+                    self._cond.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+            return True
+    
+    def release_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            depth = self._readers.get(me)
+            if depth is None:
+                raise RuntimeError("Read lock released by a thread not holding it")
+            if depth > 1:
+                self._readers[me] = depth - 1
+            else:
+                del self._readers[me]
+                self._cond.notify_all()
+    
+    def acquire_write(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        """Take the lock for writing; False if it was not free, or did not
+        become free within timeout seconds"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return True
+            if (not blocking or timeout == 0) and (self._writer is not None or self._readers):
+                return False
+            if me in self._readers:
+                raise RuntimeError("A read lock cannot be upgraded to a write lock")
+            deadline = None if timeout is None else time.monotonic() + timeout
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        # Readers held off while this writer waited can go on
+                        self._cond.notify_all()
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+            return True
+    
+    def release_write(self):
+        with self._cond:
+            if self._writer != threading.get_ident():
+                raise RuntimeError("Write lock released by a thread not holding it")
+            self._write_depth -= 1
+            if not self._write_depth:
+                self._writer = None
+                self._cond.notify_all()
+    
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+    
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class LockManager:
+    """The catalog lock, the changes lock shared by every writer, and a
+    lock and writer lock per table"""
+    
+    def __init__(self):
+        self.catalog = ReadWriteLock()
+        self.changes = ReadWriteLock()
+        self._tables: Dict[str, ReadWriteLock] = {}
+        self._writers: Dict[str, threading.RLock] = {}
+        self._mutex = threading.Lock()
+        # Statement nesting depth of each thread
+        self._local = threading.local()
+    
+    def table(self, name: str) -> ReadWriteLock:
+        """The lock of a table, created on first use"""
+        lock = self._tables.get(name)
+        if lock is None:
+            with self._mutex:
+                lock = self._tables.setdefault(name, ReadWriteLock())
+        return lock
+    
+    def writer(self, name: str) -> threading.RLock:
+        """The lock serializing the writers of a table"""
+        lock = self._writers.get(name)
+        if lock is None:
+            with self._mutex:
+                lock = self._writers.setdefault(name, threading.RLock())
+        return lock
+    
+    @contextmanager
+    def statement(self, reads: Iterable[str] = (), writes: Iterable[str] = (),
+                  exclusive: bool = False, timeout: Optional[float] = None) -> Iterator[bool]:
+        """Hold the locks of a statement reading and writing the named
+        tables, or the catalog lock alone if exclusive.
+        
+        Yields True for the outermost statement of the thread; statements
+        nested in it only take locks it already holds. With a timeout,
+        waiting longer than that many seconds for a writer lock raises
+        ValueError.
+        """
+        writes = set(writes)
+        names = sorted(set(reads) | writes)
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        held: List[Callable[[], None]] = []
+        try:
+            if exclusive:
+                self.catalog.acquire_write()
+                held.append(self.catalog.release_write)
+            else:
+                self.catalog.acquire_read()
+                held.append(self.catalog.release_read)
+                if writes:
+                    self.changes.acquire_read()
+                    held.append(self.changes.release_read)
+                for name in names:
+                    lock = self.table(name)
+                    lock.acquire_read()
+                    held.append(lock.release_read)
+                for name in sorted(writes):
+                    lock = self.writer(name)
+                    if not lock.acquire(timeout=-1 if timeout is None else timeout):
+                        raise ValueError(f"Timed out waiting to write table '{name}'")
+                    held.append(lock.release)
+            yield depth == 0
+        finally:
+            for release in reversed(held):
+                release()
+            self._local.depth = depth
+    
+    @contextmanager
+    def transaction_table(self, name: str, timeout: Optional[float] = None) -> Iterator[None]:
+        """Pin a table and hold its writer lock, as a transaction does from
+        its first change to the table until it ends.
+        
+        The catalog and changes locks are left to each statement of the
+        transaction, so an idle one holds up neither DDL nor checkpoints.
+        With a timeout, waiting longer than that many seconds for the
+        writer lock raises ValueError.
+        """
+        lock = self.table(name)
+        lock.acquire_read()
+        try:
+            writer = self.writer(name)
+            if not writer.acquire(timeout=-1 if timeout is None else timeout):
+                raise ValueError(f"Timed out waiting to write table '{name}'")
+            try:
+                yield
+            finally:
+                writer.release()
+        finally:
+            lock.release_read()
+    
+    @contextmanager
+    def free_tables(self, names: Iterable[str]) -> Iterator[List[str]]:
+        """Take the writer locks of the named tables that are free, without
+        waiting, and yield those names.
+        
+        Meant for a thread keeping statements out (by holding the catalog
+        lock or quiescing), for which a writer lock still held belongs to
+        an open transaction.
+        """
+        taken: List[threading.RLock] = []
+        free = []
+        try:
+            for name in names:
+                lock = self.writer(name)
+                if lock.acquire(blocking=False):
+                    taken.append(lock)
+                    free.append(name)
+            yield free
+        finally:
+            for lock in reversed(taken):
+                lock.release()
+    
+    @contextmanager
+    def claim_tables(self, names: Iterable[str]) -> Iterator[List[str]]:
+        """Take the writer locks of the tables a schema change touches, and
+        yield their names.
+        
+        Raises ValueError at once if an open transaction holds one, rather
+        than wait for a transaction that may stay open indefinitely.
+        """
+        names = list(names)
+        with self.free_tables(names) as free:
+            for name in names:
+                if name not in free:
+                    raise ValueError(f"Table '{name}' is in use by an open transaction")
+            yield names
+    
+    def held(self) -> bool:
+        """True if the thread is inside a statement"""
+        return getattr(self._local, 'depth', 0) > 0
+    
+    @contextmanager
+    def quiesce(self, timeout: Optional[float] = None) -> Iterator[bool]:
+        """Wait for running writers to finish and hold off new ones.
+        
+        With a timeout, gives up after that many seconds (or at once if 0,
+        or if the catalog is locked) and yields False.
+        """
+        if not self.catalog.acquire_read(blocking=timeout is None):
+            yield False
+            return
+        try:
+            if not self.changes.acquire_write(timeout=timeout):
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                self.changes.release_write()
+        finally:
+            self.catalog.release_read()
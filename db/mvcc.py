@@ -0,0 +1,110 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, FrozenSet, Iterator, NamedTuple, Optional, Set, Tuple
+
+# Every change is made by a transaction with an increasing id (xid). A row
+# change writes a new version instead of overwriting: the version records
+# the xid that created it and, once deleted or superseded, the xid that
+# expired it. Readers take a snapshot of which transactions had committed
+# and only see versions created, and not yet expired, by those.
+#
+# Tables keep (created, expired) pairs in a dict by slot, only for versions
+# some snapshot might still see differently from the latest state. Slots
+# without an entry hold a version every snapshot sees; the collector drops
+# an entry (freezing the version) or reclaims the slot once no snapshot
+# can tell the difference any more.
+
+# xid of changes every snapshot sees at once, e.g. those replayed from the log
+FROZEN = 0
+
+# (xid that created it, xid that expired it or None) of a row version
+Version = Tuple[int, Optional[int]]
+
+# Seconds between runs of the background version collector
+COLLECT_INTERVAL = 1.0
+
+
+def is_current(version: Optional[Version]) -> bool:
+    """True if a row version (None for a frozen one) is the latest one,
+    i.e. what writers see"""
+    return version is None or version[1] is None
+
+
+class Snapshot(NamedTuple):
+    """The transactions whose changes a reader sees: those that had
+    committed when the snapshot was taken"""
+    # Every xid below xmin had finished, and none from xmax on had begun
+    xmin: int
+    xmax: int
+    # xids that were still running
+    active: FrozenSet[int]
+    
+    def sees(self, xid: int) -> bool:
+        """True if the changes of transaction xid are visible"""
+        return xid < self.xmin or (xid < self.xmax and xid not in self.active)
+    
+    def visible(self, version: Optional[Version]) -> bool:
+        """True if a row version (None for a frozen one) is visible"""
+        if version is None:
+            return True
+        created, expired = version
+        return self.sees(created) and (expired is None or not self.sees(expired))
+
+
+class TransactionManager:
+    """Hands out xids and snapshots, and tracks the oldest xid a snapshot
+    may still not see"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_xid = FROZEN + 1
+        self.active: Set[int] = set()
+        # Open snapshots by xmin
+        self.snapshots: Dict[int, int] = {}
+    
+    def begin(self) -> int:
+        """Start a transaction and return its xid"""
+        with self.lock:
+            xid = self.next_xid
+            self.next_xid += 1
+            self.active.add(xid)
+            return xid
+    
+    def end(self, xid: int):
+        """Finish a transaction; snapshots taken from now on see its changes"""
+        with self.lock:
+            self.active.discard(xid)
+    
+    def take_snapshot(self, own: Optional[int] = None) -> Snapshot:
+        """A snapshot of the committed transactions, plus the running
+        transaction own, whose reads see its own changes"""
+        with self.lock:
+            xmin = min(self.active, default=self.next_xid)
+            snapshot = Snapshot(xmin, self.next_xid, frozenset(self.active - {own}))
+            self.snapshots[snapshot.xmin] = self.snapshots.get(snapshot.xmin, 0) + 1
+            return snapshot
+    
+    def release(self, snapshot: Snapshot):
+        with self.lock:
+            count = self.snapshots.pop(snapshot.xmin) - 1
+            if count:
+                self.snapshots[snapshot.xmin] = count
+    
+    @contextmanager
+    def snapshot(self, own: Optional[int] = None) -> Iterator[Snapshot]:
+        """A snapshot that stays registered, holding back the collector,
+        until the block ends"""
+        snapshot = self.take_snapshot(own)
+        try:
+            yield snapshot
+        finally:
+            self.release(snapshot)
+    
+    def has_snapshots(self) -> bool:
+        return bool(self.snapshots)
+    
+    def horizon(self) -> int:
+        """Every snapshot, open or future, sees the xids below this"""
+        with self.lock:
+            return min(min(self.active, default=self.next_xid),
+                       min(self.snapshots, default=self.next_xid))
@@ -0,0 +1,503 @@
+import copy
+from itertools import islice
+from operator import itemgetter
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from .mvcc import Snapshot
+from .storage import Table
+from .join import hash_join, merge_join
+from .predicates import bind_parameters, compile_conditions, format_conditions, has_parameter
+from .sort import order_key, sort_rows
+
+class JoinScope:
+    """Resolves column names against the tables of a join.
+    
+    Joined rows are the concatenation of one row tuple per table, so every
+    column maps to a fixed position in the combined tuple.
+    """
+    
+    def __init__(self, sources: List[Tuple[str, Table]]):
+        self.sources = sources
+        self.offsets = []
+        width = 0
+        for _, table in sources:
+            self.offsets.append(width)
+            width += len(table.column_names)
+        self.width = width
+    
+    def resolve(self, name: str) -> Tuple[int, str]:
+        """(source index, column name) of a possibly qualified column"""
+        if '.' in name:
+            qualifier, column = name.split('.', 1)
+            for i, (alias, table) in enumerate(self.sources):
+                if qualifier in (alias, table.name):
+                    table.position(column)
+                    return i, column
+            raise ValueError(f"Unknown table or alias '{qualifier}'")
+        
+        found = [i for i, (_, table) in enumerate(self.sources) if name in table.positions]
+        if not found:
+            raise ValueError(f"Unknown column '{name}'")
+        if len(found) > 1:
+            raise ValueError(f"Column '{name}' is ambiguous")
+        return found[0], name
+    
+    def position(self, name: str) -> int:
+        """Position of a column in the combined row"""
+        source, column = self.resolve(name)
+        return self.offsets[source] + self.sources[source][1].positions[column]
+    
+    def star(self, qualifier: Optional[str] = None) -> List[Tuple[str, int]]:
+        """(name, position) of every column, or of one table's columns"""
+        columns = []
+        for i, (alias, table) in enumerate(self.sources):
+            if qualifier is None or qualifier in (alias, table.name):
+                columns.extend((name, self.offsets[i] + pos) for pos, name in enumerate(table.column_names))
+        if not columns:
+            raise ValueError(f"Unknown table or alias '{qualifier}'")
+        return columns
+
+class GroupScope:
+    """Resolves names against aggregated rows.
+    
+    An aggregated row holds the GROUP BY values followed by one result per
+    distinct aggregate expression; aggregates are assigned positions as the
+    select list, HAVING and ORDER BY refer to them.
+    """
+    
+    def __init__(self, scope: JoinScope, group_by: List[str], items: List[Tuple[Tuple, str]]):
+        self.scope = scope
+        self.group_positions = [scope.position(name) for name in group_by]
+        self.outputs = {name: expr for expr, name in items}
+        self.aggregates: List[Tuple] = []
+    
+    def position(self, name: str) -> int:
+        """Position of a grouped column"""
+        pos = self.scope.position(name)
+        if pos not in self.group_positions:
+            raise ValueError(f"Column '{name}' must appear in GROUP BY or be used in an aggregate function")
+        return self.group_positions.index(pos)
+    
+    def aggregate_position(self, expr: Tuple) -> int:
+        """Position of an aggregate result, added on first use"""
+        if expr not in self.aggregates:
+            self.aggregates.append(expr)
+        return len(self.group_positions) + self.aggregates.index(expr)
+    
+    def output_position(self, name: str) -> int:
+        """Position of an output column by its name, or of a grouped column"""
+        expr = self.outputs.get(name)
+        if expr is not None and expr[0] == 'aggregate':
+            return self.aggregate_position(expr)
+        if expr is not None and expr[0] == 'column':
+            return self.position(expr[1])
+        return self.position(name)
+    
+    def star(self, qualifier: Optional[str] = None) -> List[Tuple[str, int]]:
+        raise ValueError("SELECT * cannot be combined with GROUP BY or aggregate functions")
+
+# Query plans are trees of operators. Iterating an operator pulls rows from
+# its children on demand (Volcano style), so a LIMIT stops the scans below
+# it early and only Sort and the build side of a join hold rows in memory.
+# Rows are tuples laid out as described by a JoinScope until Project turns
+# them into dicts.
+
+class Operator:
+    """A plan node; iterating it yields rows.
+    
+    The planner fills in estimated_rows and cost (which includes the cost
+    of the children). With instrumentation on, actual_rows and elapsed
+    (seconds spent producing rows, children included) are recorded.
+    """
+    # Attributes that can hold the placeholders of a prepared statement
+    parameter_fields: Tuple[str, ...] = ()
+    # Row versions the table scans read; None reads the latest ones
+    snapshot: Optional[Snapshot] = None
+    
+    def __init__(self, *children: 'Operator'):
+        self.children = list(children)
+        self.estimated_rows: Optional[float] = None
+        self.cost: Optional[float] = None
+        self.detail = ''
+        self.instrumented = False
+        self.actual_rows = 0
+        self.elapsed = 0.0
+    
+    def __iter__(self) -> Iterator:
+        if self.instrumented:
+            return self._instrumented_rows()
+        return self.rows()
+    
+    def rows(self) -> Iterator:
+        raise NotImplementedError
+    
+    def _instrumented_rows(self) -> Iterator:
+        start = perf_counter()
+        rows = self.rows()
+        self.elapsed += perf_counter() - start
+        while True:
+            start = perf_counter()
+            try:
+                row = next(rows)
+            except StopIteration:
+                self.elapsed += perf_counter() - start
+                return
+            self.elapsed += perf_counter() - start
+            self.actual_rows += 1
+            yield row
+    
+    def describe(self) -> str:
+        """One-line description of the node for EXPLAIN"""
+        return f"{type(self).__name__} {self.detail}".rstrip()
+    
+    def bind(self, values: Any, snapshot: Optional[Snapshot] = None) -> 'Operator':
+        """A copy of the plan with placeholder values filled in, reading
+        through snapshot, so the plan of a prepared statement is built once
+        and run with many values"""
+        node = copy.copy(self)
+        node.children = [child.bind(values, snapshot) for child in self.children]
+        for name in self.parameter_fields:
+            setattr(node, name, bind_parameters(getattr(self, name), values))
+        node.snapshot = snapshot
+        return node
+    
+    def walk(self) -> Iterator[Tuple[int, 'Operator']]:
+        """(depth, node) for this node and its descendants, parents first"""
+        stack = [(0, self)]
+        while stack:
+            depth, node = stack.pop()
+            yield depth, node
+            stack.extend((depth + 1, child) for child in reversed(node.children))
+
+class SeqScan(Operator):
+    """Every row of a table that satisfies the conditions"""
+    parameter_fields = ('conditions',)
+    
+    def __init__(self, table: Table, conditions: Optional[Dict] = None):
+        super().__init__()
+        self.table = table
+        self.conditions = conditions or None
+    
+    def rows(self) -> Iterator[Tuple]:
+        return (row for _, row in self.table.filter_scan(self.conditions, self.snapshot))
+    
+    def describe(self) -> str:
+        text = f"SeqScan on {self.table.name}"
+        if self.conditions:
+            text += f" filter: {format_conditions(self.conditions)}"
+        return text
+
+class IndexLookup(Operator):
+    """Rows found through a key map or secondary index"""
+    parameter_fields = ('conditions',)
+    
+    def __init__(self, table: Table, conditions: Dict):
+        super().__init__()
+        self.table = table
+        self.conditions = conditions
+    
+    def rows(self) -> Iterator[Tuple]:
+        positions = self.table.lookup_positions(self.conditions, self.snapshot)
+        return (self.table.row(i) for i in positions)
+    
+    def describe(self) -> str:
+        return f"IndexLookup on {self.table.name} {self.detail} cond: {format_conditions(self.conditions)}"
+
+class IndexOrderScan(Operator):
+    """Rows in the order of a btree index, filtered by the conditions"""
+    parameter_fields = ('conditions',)
+    
+    def __init__(self, table: Table, column: str, descending: bool = False,
+                 conditions: Optional[Dict] = None):
+        super().__init__()
+        self.table = table
+        self.column = column
+        self.descending = descending
+        self.conditions = conditions or None
+    
+    def rows(self) -> Iterator[Tuple]:
+        walk = self.table.ordered_scan(self.column, self.descending, self.conditions, self.snapshot)
+        return (row for _, row in walk)
+    
+    def describe(self) -> str:
+        text = f"IndexOrderScan on {self.table.name} using {self.table.index_on(self.column, 'btree').name}"
+        if self.descending:
+            text += " DESC"
+        if self.conditions:
+            text += f" filter: {format_conditions(self.conditions)}"
+        return text
+
+class Filter(Operator):
+    """Rows satisfying a conditions dict, checked by a compiled row test.
+    
+    position maps a condition key to the row position it tests.
+    """
+    parameter_fields = ('conditions',)
+    
+    def __init__(self, child: Operator, conditions: Dict, position: Callable[[Any], int]):
+        super().__init__(child)
+        self.conditions = conditions
+        self.position = position
+        # Placeholders are only compiled once their values are bound
+        self.test = None if has_parameter(conditions) else compile_conditions(conditions, position)
+    
+    def bind(self, values: Any, snapshot: Optional[Snapshot] = None) -> 'Operator':
+        node = super().bind(values, snapshot)
+        node.test = compile_conditions(node.conditions, node.position)
+        return node
+    
+    def rows(self) -> Iterator[Tuple]:
+        return filter(self.test, self.children[0])
+
+class HashJoin(Operator):
+    """Equi-join that hashes one input and streams the other through it.
+    
+    The right input is hashed unless build_left is set, in which case the
+    left rows are collected and hashed and the output loses their order.
+    """
+    
+    def __init__(self, left: Operator, right: Operator, left_pos: int, right_pos: int,
+                 right_width: int, join_type: str = 'INNER', build_left: bool = False):
+        super().__init__(left, right)
+        self.left_pos = left_pos
+        self.right_pos = right_pos
+        self.right_width = right_width
+        self.join_type = join_type
+        self.build_left = build_left
+    
+    def rows(self) -> Iterator[Tuple]:
+        left, right = self.children
+        right_rows = list(right)
+        left_rows = list(left) if self.build_left else iter(left)
+        return hash_join(left_rows, right_rows, self.left_pos, self.right_pos,
+                         self.right_width, self.join_type)
+    
+    def describe(self) -> str:
+        side = 'left' if self.build_left else 'right'
+        return f"HashJoin {self.join_type} {self.detail} (build {side})"
+
+class MergeJoin(Operator):
+    """Equi-join of two inputs that are both sorted on the join key"""
+    
+    def __init__(self, left: Operator, right: Operator, left_pos: int, right_pos: int,
+                 right_width: int, join_type: str = 'INNER'):
+        super().__init__(left, right)
+        self.left_pos = left_pos
+        self.right_pos = right_pos
+        self.right_width = right_width
+        self.join_type = join_type
+    
+    def rows(self) -> Iterator[Tuple]:
+        left, right = self.children
+        return merge_join(iter(left), iter(right), self.left_pos, self.right_pos,
+                          self.right_width, self.join_type)
+    
+    def describe(self) -> str:
+        return f"MergeJoin {self.join_type} {self.detail}"
+
+class IndexJoin(Operator):
+    """Nested loop join probing a key map or index of the right table.
+    
+    Every left row looks up its matches by the join column, so the right
+    table is never scanned and the left row order is kept. conditions are
+    further tests on the right table's columns.
+    """
+    parameter_fields = ('conditions',)
+    
+    def __init__(self, left: Operator, table: Table, column: str, left_pos: int,
+                 conditions: Optional[Dict] = None, join_type: str = 'INNER'):
+        super().__init__(left)
+        self.table = table
+        self.column = column
+        self.left_pos = left_pos
+        self.conditions = conditions or None
+        self.join_type = join_type
+    
+    def rows(self) -> Iterator[Tuple]:
+        table, column, left_pos = self.table, self.column, self.left_pos
+        matches = compile_conditions(self.conditions, table.position)
+        padding = (None,) * len(table.column_names)
+        for left_row in self.children[0]:
+            value = left_row[left_pos]
+            matched = False
+            if value is not None:
+                for right_row in table.probe(column, value, self.snapshot):
+                    if matches(right_row):
+                        matched = True
+                        yield left_row + right_row
+            if not matched and self.join_type == 'LEFT':
+                yield left_row + padding
+    
+    def describe(self) -> str:
+        text = f"IndexJoin {self.join_type} {self.detail} probing {self.table.name}"
+        if self.conditions:
+            text += f" filter: {format_conditions(self.conditions)}"
+        return text
+
+class Reorder(Operator):
+    """Rearranges the values of each row, e.g. back to the query's table order
+    after the planner joined the tables in a different order"""
+    
+    def __init__(self, child: Operator, positions: List[int]):
+        super().__init__(child)
+        self.positions = positions
+    
+    def rows(self) -> Iterator[Tuple]:
+        positions = self.positions
+        if len(positions) == 1:
+            return ((row[positions[0]],) for row in self.children[0])
+        getter = itemgetter(*positions)
+        return (getter(row) for row in self.children[0])
+
+class Aggregate(Operator):
+    """Base for operators computing one row per group of input rows.
+    
+    Output rows are the group values followed by the aggregate results.
+    aggregates holds (accumulator factory, argument function) pairs, the
+    argument function being None for COUNT(*).
+    """
+    
+    def __init__(self, child: Operator, group_positions: List[int],
+                 aggregates: List[Tuple[Callable, Optional[Callable]]]):
+        super().__init__(child)
+        self.group_positions = group_positions
+        self.aggregates = aggregates
+    
+    def _key_function(self) -> Callable[[Tuple], Tuple]:
+        positions = self.group_positions
+        if len(positions) == 1:
+            pos = positions[0]
+            return lambda row: (row[pos],)
+        if positions:
+            return itemgetter(*positions)
+        return lambda row: ()
+    
+    def _start(self) -> List:
+        return [factory() for factory, _ in self.aggregates]
+    
+    def _accumulate(self, accumulators: List, row: Tuple):
+        for accumulator, (_, argument) in zip(accumulators, self.aggregates):
+            accumulator.add(argument(row) if argument is not None else None)
+    
+    def _finish(self, key: Tuple, accumulators: List) -> Tuple:
+        return key + tuple(accumulator.result() for accumulator in accumulators)
+
+class HashAggregate(Aggregate):
+    """Groups rows in a hash table during a single pass over the input.
+    
+    Groups come out in order of first appearance. Without GROUP BY columns
+    there is exactly one group, even for empty input.
+    """
+    
+    def rows(self) -> Iterator[Tuple]:
+        key_of = self._key_function()
+        groups: Dict[Tuple, List] = {}
+        if not self.group_positions:
+            groups[()] = self._start()
+        for row in self.children[0]:
+            key = key_of(row)
+            accumulators = groups.get(key)
+            if accumulators is None:
+                accumulators = groups[key] = self._start()
+            self._accumulate(accumulators, row)
+        return (self._finish(key, accumulators) for key, accumulators in groups.items())
+
+class StreamAggregate(Aggregate):
+    """Aggregates input sorted on the group columns.
+    
+    Only the current group is held in memory and each group is emitted as
+    soon as the next one starts, so the output streams in input order.
+    """
+    
+    def rows(self) -> Iterator[Tuple]:
+        key_of = self._key_function()
+        key = accumulators = None
+        for row in self.children[0]:
+            row_key = key_of(row)
+            if accumulators is None or row_key != key:
+                if accumulators is not None:
+                    yield self._finish(key, accumulators)
+                key, accumulators = row_key, self._start()
+            self._accumulate(accumulators, row)
+        if accumulators is not None:
+            yield self._finish(key, accumulators)
+        elif not self.group_positions:
+            yield self._finish((), self._start())
+
+class Sort(Operator):
+    """Rows ordered on (position, descending) keys, NULLs first going up.
+    
+    With a limit only the first rows are kept, in a bounded heap; otherwise
+    sorted runs spill to temp files once they exceed memory_budget bytes.
+    """
+    parameter_fields = ('limit',)
+    
+    def __init__(self, child: Operator, keys: List[Tuple[int, bool]],
+                 limit: Optional[int] = None, memory_budget: Optional[int] = None):
+        super().__init__(child)
+        self.keys = keys
+        self.limit = limit
+        self.memory_budget = memory_budget
+    
+    def rows(self) -> Iterator[Tuple]:
+        key, descending = order_key(self.keys)
+        return sort_rows(self.children[0], key, descending, self.limit, self.memory_budget)
+    
+    def describe(self) -> str:
+        text = f"Sort {self.detail}"
+        if self.limit is not None:
+            text += f" (top {self.limit})"
+        return text
+
+class Limit(Operator):
+    """The first count rows; stops pulling from the child after that"""
+    parameter_fields = ('count',)
+    
+    def __init__(self, child: Operator, count: int):
+        super().__init__(child)
+        self.count = count
+    
+    def rows(self) -> Iterator:
+        return islice(self.children[0], self.count)
+    
+    def describe(self) -> str:
+        return f"Limit {self.count}"
+
+class Project(Operator):
+    """Result dicts built from (output name, value function) pairs"""
+    
+    def __init__(self, child: Operator, outputs: List[Tuple[str, Callable]]):
+        super().__init__(child)
+        self.outputs = outputs
+    
+    def rows(self) -> Iterator[Dict]:
+        outputs = self.outputs
+        return ({name: value(row) for name, value in outputs} for row in self.children[0])
+    
+    def describe(self) -> str:
+        return f"Project {', '.join(name for name, _ in self.outputs)}"
+
+
+class Distinct(Operator):
+    """The first of each set of equal result dicts, in input order"""
+    
+    def rows(self) -> Iterator[Dict]:
+        seen = set()
+        for row in self.children[0]:
+            values = tuple(row.values())
+            if values not in seen:
+                seen.add(values)
+                yield row
+
+
+def explain(plan: Operator, analyze: bool = False) -> List[str]:
+    """Indented plan lines with estimates, and actual rows and time if analyzed"""
+    lines = []
+    for depth, node in plan.walk():
+        text = node.describe()
+        if node.cost is not None:
+            text += f"  (cost={node.cost:.1f} rows={node.estimated_rows:.0f})"
+        if analyze:
+            text += f"  (actual rows={node.actual_rows} time={node.elapsed * 1000:.3f} ms)"
+        lines.append(('  ' * depth + '-> ' if depth else '') + text)
+    return lines
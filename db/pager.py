@@ -0,0 +1,392 @@
+import os
+import pickle
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Iterator
+
+PAGE_SIZE = 4096
+
+# A record id locates a record inside a heap file: (page number, slot number)
+RecordId = Tuple[int, int]
+
+class Page:
+    """Fixed-size slotted page.
+
+    The slot directory grows forward from the header while record bytes are
+    packed backward from the end of the page.
+    """
+
+    HEADER = struct.Struct('>HH')  # slot count, start of the record area
+    SLOT = struct.Struct('>HH')    # record offset, record length (0 = empty)
+
+    def __init__(self, data: Optional[bytes] = None):
+        if data is None:
+            self.data = bytearray(PAGE_SIZE)
+            self.HEADER.pack_into(self.data, 0, 0, PAGE_SIZE)
+        else:
+            self.data = bytearray(data)
+
+    def _header(self) -> Tuple[int, int]:
+        return self.HEADER.unpack_from(self.data, 0)
+
+    def _slot(self, slot: int) -> Tuple[int, int]:
+        return self.SLOT.unpack_from(self.data, self.HEADER.size + slot * self.SLOT.size)
+
+    def _set_slot(self, slot: int, offset: int, length: int):
+        self.SLOT.pack_into(self.data, self.HEADER.size + slot * self.SLOT.size, offset, length)
+
+    def free_space(self) -> int:
+        """Contiguous bytes between the slot directory and the record area"""
+        count, free_end = self._header()
+        return free_end - (self.HEADER.size + count * self.SLOT.size)
+
+    def insert(self, record: bytes) -> Optional[int]:
+        """Store a record and return its slot, or None if the page is full"""
+        count, _ = self._header()
+        # Reuse an empty slot before growing the directory
+        slot = next((i for i in range(count) if self._slot(i)[1] == 0), count)
+        needed = len(record) + (self.SLOT.size if slot == count else 0)
+
+        if self.free_space() < needed:
+            self.compact()
+            if self.free_space() < needed:
+                return None
+
+        count, free_end = self._header()
+        free_end -= len(record)
+        self.data[free_end:free_end + len(record)] = record
+        self._set_slot(slot, free_end, len(record))
+        self.HEADER.pack_into(self.data, 0, max(count, slot + 1), free_end)
+        return slot
+
+    def append(self, record: bytes) -> Optional[int]:
+        """Store a record in a new slot, or return None if it does not fit.
+
+        Unlike insert() this neither reuses empty slots nor compacts, which
+        is all a fresh page being filled by a bulk load needs.
+        """
+        count, free_end = self._header()
+        if free_end - (self.HEADER.size + (count + 1) * self.SLOT.size) < len(record):
+            return None
+        free_end -= len(record)
+        self.data[free_end:free_end + len(record)] = record
+        self._set_slot(count, free_end, len(record))
+        self.HEADER.pack_into(self.data, 0, count + 1, free_end)
+        return count
+
+    def read(self, slot: int) -> bytes:
+        offset, length = self._slot(slot)
+        if length == 0:
+            raise KeyError(f"Slot {slot} is empty")
+        return bytes(self.data[offset:offset + length])
+
+    def update(self, slot: int, record: bytes) -> bool:
+        """Replace a record in place; False if it no longer fits on this page"""
+        offset, length = self._slot(slot)
+        if len(record) <= length:
+            self.data[offset:offset + len(record)] = record
+            self._set_slot(slot, offset, len(record))
+            return True
+
+        count, _ = self._header()
+        live = sum(self._slot(i)[1] for i in range(count) if i != slot)
+        if self.HEADER.size + count * self.SLOT.size + live + len(record) > PAGE_SIZE:
+            return False
+
+        self._set_slot(slot, 0, 0)
+        self.compact()
+        count, free_end = self._header()
+        free_end -= len(record)
+        self.data[free_end:free_end + len(record)] = record
+        self._set_slot(slot, free_end, len(record))
+        self.HEADER.pack_into(self.data, 0, count, free_end)
+        return True
+
+    def delete(self, slot: int):
+        self._set_slot(slot, 0, 0)
+
+    def records(self) -> Iterator[Tuple[int, bytes]]:
+        """Yield (slot, record) for every live record"""
+        count, _ = self._header()
+        for slot in range(count):
+            offset, length = self._slot(slot)
+            if length:
+                yield slot, bytes(self.data[offset:offset + length])
+
+    def compact(self):
+        """Close the gaps left by deleted and shrunk records"""
+        count, _ = self._header()
+        live = [(slot, self.read(slot)) for slot in range(count) if self._slot(slot)[1]]
+        free_end = PAGE_SIZE
+        for slot, record in live:
+            free_end -= len(record)
+            self.data[free_end:free_end + len(record)] = record
+            self._set_slot(slot, free_end, len(record))
+        self.HEADER.pack_into(self.data, 0, count, free_end)
+
+# Largest record that fits on an otherwise empty page
+MAX_RECORD_SIZE = PAGE_SIZE - Page.HEADER.size - Page.SLOT.size
+
+class HeapFile:
+    """Unordered records stored in the slotted pages of a single file"""
+
+    def __init__(self, path: str, pool: 'BufferPool'):
+        self.path = path
+        self.pool = pool
+        # Unbuffered so page reads always see the latest bytes on disk
+        self.file = open(path, 'r+b' if os.path.exists(path) else 'w+b', buffering=0)
+        self.page_count = os.path.getsize(path) // PAGE_SIZE
+        # Pages that had records removed and may have room for new ones
+        self.pages_with_space = set()
+
+    def read_page(self, page_no: int) -> bytes:
+        self.file.seek(page_no * PAGE_SIZE)
+        return self.file.read(PAGE_SIZE)
+
+    def write_page(self, page_no: int, data: bytes):
+        self.file.seek(page_no * PAGE_SIZE)
+        self.file.write(data)
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def insert(self, record: bytes) -> RecordId:
+        """Store a record and return its record id"""
+        if len(record) > MAX_RECORD_SIZE:
+            raise ValueError(f"Row too large ({len(record)} bytes, page limit is {MAX_RECORD_SIZE})")
+
+        candidates = []
+        if self.pages_with_space:
+            candidates.append(next(iter(self.pages_with_space)))
+        if self.page_count:
+            candidates.append(self.page_count - 1)
+
+        for page_no in candidates:
+            with self.pool.lock:
+                slot = self.pool.fetch(self, page_no).insert(record)
+                if slot is not None:
+                    self.pool.mark_dirty(self, page_no)
+                    return (page_no, slot)
+            self.pages_with_space.discard(page_no)
+
+        page_no = self.page_count
+        self.page_count += 1
+        slot = self.pool.new_page(self, page_no).insert(record)
+        return (page_no, slot)
+
+    def append(self, records: List[bytes]) -> List[RecordId]:
+        """Store records on new pages at the end of the file, filling one
+        page after another; all the records are checked before any is
+        written"""
+        for record in records:
+            if len(record) > MAX_RECORD_SIZE:
+                raise ValueError(f"Row too large ({len(record)} bytes, page limit is {MAX_RECORD_SIZE})")
+
+        rids = []
+        page, page_no = None, None
+        for record in records:
+            slot = page.append(record) if page is not None else None
+            if slot is None:
+                page_no = self.page_count
+                self.page_count += 1
+                page = self.pool.new_page(self, page_no)
+                slot = page.append(record)
+            rids.append((page_no, slot))
+        return rids
+
+    def read(self, rid: RecordId) -> bytes:
+        page_no, slot = rid
+        return self.pool.fetch(self, page_no).read(slot)
+
+    def update(self, rid: RecordId, record: bytes) -> RecordId:
+        """Rewrite a record, moving it to another page if it outgrew its own"""
+        page_no, slot = rid
+        with self.pool.lock:
+            if len(record) <= MAX_RECORD_SIZE and self.pool.fetch(self, page_no).update(slot, record):
+                self.pool.mark_dirty(self, page_no)
+                return rid
+
+        new_rid = self.insert(record)
+        self.delete(rid)
+        return new_rid
+
+    def delete(self, rid: RecordId):
+        page_no, slot = rid
+        with self.pool.lock:
+            self.pool.fetch(self, page_no).delete(slot)
+            self.pool.mark_dirty(self, page_no)
+        self.pages_with_space.add(page_no)
+
+    def scan(self) -> Iterator[Tuple[RecordId, bytes]]:
+        """Yield (record id, record) for every record in page order"""
+        for page_no in range(self.page_count):
+            for slot, record in self.pool.fetch(self, page_no).records():
+                yield (page_no, slot), record
+
+class BufferPool:
+    """LRU cache of heap pages with dirty-page tracking.
+
+    Dirty pages stay resident until the next checkpoint writes them out
+    (no-steal), so only clean pages are ever evicted and capacity does not
+    bound the pool: a COPY FROM or a long transaction keeps every page it
+    dirties in memory until it ends. Heap files change a
+    page while holding the pool lock, so it cannot be evicted or copied
+    between being fetched and being marked dirty.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.frames: 'OrderedDict[Tuple[HeapFile, int], Page]' = OrderedDict()
+        self.dirty = set()
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.page_writes = 0
+
+    def fetch(self, heap: HeapFile, page_no: int) -> Page:
+        """Return a page, reading it from disk on a miss"""
+        key = (heap, page_no)
+        with self.lock:
+            page = self.frames.get(key)
+            if page is not None:
+                self.hits += 1
+                self.frames.move_to_end(key)
+                return page
+
+            self.misses += 1
+            page = Page(heap.read_page(page_no))
+            self._admit(key, page)
+            return page
+
+    def new_page(self, heap: HeapFile, page_no: int) -> Page:
+        """Allocate an empty page that only exists in memory until flushed"""
+        key = (heap, page_no)
+        with self.lock:
+            page = Page()
+            self._admit(key, page)
+            self.dirty.add(key)
+            return page
+
+    def mark_dirty(self, heap: HeapFile, page_no: int):
+        with self.lock:
+            self.dirty.add((heap, page_no))
+
+    def _admit(self, key: Tuple[HeapFile, int], page: Page):
+        self.frames[key] = page
+        if len(self.frames) <= self.capacity:
+            return
+        # Nothing to evict while every other page is dirty
+        if len(self.frames) - len(self.dirty) - (key not in self.dirty) <= 0:
+            return
+
+        for victim in list(self.frames):
+            if victim not in self.dirty and victim != key:
+                del self.frames[victim]
+                self.evictions += 1
+                if len(self.frames) <= self.capacity:
+                    break
+
+    def needs_flush(self) -> bool:
+        """True when dirty pages crowd out the clean ones"""
+        return len(self.dirty) >= self.capacity * 3 // 4
+
+    def dirty_pages(self, heaps: Optional[List[HeapFile]] = None) -> List[Tuple[HeapFile, int, bytes]]:
+        """Snapshot dirty pages, optionally only those of the given heaps"""
+        with self.lock:
+            return [(heap, page_no, bytes(self.frames[(heap, page_no)].data))
+                    for heap, page_no in sorted(self.dirty, key=lambda k: (k[0].path, k[1]))
+                    if heaps is None or heap in heaps]
+
+    def mark_clean(self, pages: List[Tuple[HeapFile, int, bytes]]):
+        with self.lock:
+            for heap, page_no, _ in pages:
+                self.dirty.discard((heap, page_no))
+            self.page_writes += len(pages)
+
+    def discard(self, heap: HeapFile):
+        """Forget every cached page of a heap file"""
+        with self.lock:
+            for key in [k for k in self.frames if k[0] is heap]:
+                del self.frames[key]
+                self.dirty.discard(key)
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'capacity': self.capacity,
+                'resident': len(self.frames),
+                'dirty': len(self.dirty),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'page_writes': self.page_writes,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+class CheckpointJournal:
+    """Double-write journal that makes a multi-file checkpoint atomic.
+
+    Page images and replacement file contents are first made durable in the
+    journal; only then are they written in place. A crash mid-checkpoint is
+    repaired on startup by re-applying a complete journal.
+    """
+
+    HEADER = struct.Struct('>II')
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def commit(self, pages: List[Tuple[str, int, bytes]], files: Dict[str, bytes]):
+        """Durably record the changes, apply them, then discard the journal.
+
+        The journal is built in memory, so a checkpoint needs about twice
+        the size of the pages it writes.
+        """
+        payload = pickle.dumps((pages, files), protocol=pickle.HIGHEST_PROTOCOL)
+        with open(self.path, 'wb') as f:
+            f.write(self.HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._apply(pages, files)
+        os.remove(self.path)
+
+    def recover(self):
+        """Finish an interrupted checkpoint, or drop an incomplete journal"""
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'rb') as f:
+            header = f.read(self.HEADER.size)
+            payload = f.read()
+        if len(header) == self.HEADER.size:
+            length, crc = self.HEADER.unpack(header)
+            if len(payload) == length and zlib.crc32(payload) == crc:
+                self._apply(*pickle.loads(payload))
+        os.remove(self.path)
+
+    def _apply(self, pages: List[Tuple[str, int, bytes]], files: Dict[str, bytes]):
+        by_file: Dict[str, List[Tuple[int, bytes]]] = {}
+        for path, page_no, data in pages:
+            by_file.setdefault(path, []).append((page_no, data))
+
+        for path, file_pages in by_file.items():
+            with open(path, 'r+b' if os.path.exists(path) else 'w+b', buffering=0) as f:
+                for page_no, data in file_pages:
+                    f.seek(page_no * PAGE_SIZE)
+                    f.write(data)
+                os.fsync(f.fileno())
+
+        for path, content in files.items():
+            tmp_file = path + '.tmp'
+            with open(tmp_file, 'wb') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, path)
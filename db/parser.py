@@ -1,8 +1,116 @@
-import re
-from typing import Dict, List, Any
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .aggregates import AGGREGATES
+from .predicates import (COMPARISONS, Or, Parameter, Predicate, bind_parameters, equality_values,
+                         format_condition, has_parameter)
+from .tokenizer import Token, tokenize
+
+# Parsed statements kept by a Parser, most recently used last
+DEFAULT_CACHE_SIZE = 256
+
+# Column type names mapped to the internal types
+TYPE_MAP = {
+    'INT': 'int',
+    'INTEGER': 'int',
+    'VARCHAR': 'varchar',
+    'TEXT': 'varchar',
+    'FLOAT': 'float',
+    'REAL': 'float',
+    'DOUBLE': 'float',
+    'DECIMAL': 'float',
+    'NUMERIC': 'float',
+    'BOOLEAN': 'boolean',
+    'TIMESTAMP': 'timestamp'
+}
+
+# Words that follow a table reference instead of naming its alias
+CLAUSE_KEYWORDS = {'where', 'group', 'having', 'order', 'limit', 'join', 'inner',
+                   'left', 'right', 'full', 'cross', 'outer', 'on'}
+
+# Words that are never a bare value in a condition
+CONDITION_KEYWORDS = {'and', 'or', 'not', 'between', 'like', 'in', 'is'}
+
+# Words that are never a bare column name or alias in a select list
+RESERVED_WORDS = {'select', 'distinct', 'from', 'where', 'group', 'having', 'order', 'by',
+                  'limit', 'as', 'and', 'or', 'not', 'join', 'on'}
+
+# Unquoted words that stand for a value
+LITERAL_WORDS = {'null': None, 'true': True, 'false': False}
+
+class PreparedStatement:
+    """A statement parsed once and executed with different parameters.
+    
+    Placeholders stand for values only, so binding substitutes them in a
+    copy of the parsed statement; parts without placeholders are shared.
+    """
+    
+    def __init__(self, sql: str, parsed: Dict[str, Any]):
+        self.sql = sql
+        self.parsed = parsed
+        # Parameter positions or names, in order of first appearance
+        self.parameters: List[Any] = parsed.get('parameters', [])
+        self.bound_keys = [key for key, value in parsed.items()
+                           if key != 'parameters' and has_parameter(value)]
+        # (validity key, operator tree) of the generic plan the executor
+        # keeps for a SELECT
+        self.plan_cache: Optional[Tuple[Any, Any]] = None
+    
+    def bind(self, params: Any = None) -> Dict[str, Any]:
+        """The parsed statement with the parameter values filled in.
+        
+        params is a sequence for ? placeholders and a mapping for :name ones.
+        """
+        values = self.parameter_values(params)
+        parsed = {key: value for key, value in self.parsed.items() if key != 'parameters'}
+        for key in self.bound_keys:
+            parsed[key] = bind_parameters(self.parsed[key], values)
+        return parsed
+    
+    def parameter_values(self, params: Any) -> Any:
+        """Check params against the placeholders; the result is indexed by
+        placeholder key"""
+        if not self.parameters:
+            if params:
+                raise ValueError("Statement has no parameters to bind")
+            return {}
+        if isinstance(self.parameters[0], int):
+            if params is None or isinstance(params, (str, dict)):
+                raise ValueError(f"Statement expects {len(self.parameters)} positional parameter(s)")
+            params = list(params)
+            if len(params) != len(self.parameters):
+                raise ValueError(f"Statement expects {len(self.parameters)} parameter(s), got {len(params)}")
+        else:
+            if not isinstance(params, dict):
+                raise ValueError("Statement with :name parameters expects a mapping of values")
+            for name in self.parameters:
+                if name not in params:
+                    raise ValueError(f"Missing value for parameter :{name}")
+        limit = self.parsed.get('limit')
+        if isinstance(limit, Parameter):
+            count = params[limit.key]
+            if not isinstance(count, int) or isinstance(count, bool) or count < 0:
+                raise ValueError(f"LIMIT must be a non-negative integer, got {count!r}")
+        return params
+    
+    def __repr__(self) -> str:
+        return f"PreparedStatement({self.sql!r})"
 
 class Parser:
-    """Simple SQL parser for educational purposes"""
+    """SQL parser with an LRU cache of parsed statements.
+    
+    A statement seen before is returned from the cache without being
+    tokenized again. The dicts returned are shared between callers and
+    must be treated as read-only.
+    """
+    
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache: 'OrderedDict[str, Dict]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
     
     def parse(self, query: str) -> Dict[str, Any]:
         """Parse SQL query into structured format"""
@@ -12,243 +120,487 @@ class Parser:
         if not query:
             raise ValueError("Empty query")
         
-        # Remove multiple spaces and newlines
-        query = re.sub(r'\s+', ' ', query)
-        
-        if query.lower().startswith('create table'):
-            return self._parse_create_table(query)
-        elif query.lower().startswith('insert into'):
-            return self._parse_insert(query)
-        elif query.lower().startswith('select'):
-            return self._parse_select(query)
-        elif query.lower().startswith('update'):
-            return self._parse_update_fixed(query)  # Use fixed version
-        elif query.lower().startswith('delete from'):
-            return self._parse_delete(query)
-        elif query.lower().startswith('drop table'):
-            return self._parse_drop_table(query)
+        with self.lock:
+            parsed = self.cache.get(query)
+            if parsed is not None:
+                self.hits += 1
+                self.cache.move_to_end(query)
+                return parsed
+            self.misses += 1
+        
+        parsed = StatementParser(query).parse()
+        if self.cache_size > 0:
+            with self.lock:
+                self.cache[query] = parsed
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return parsed
+    
+    def prepare(self, query: str) -> PreparedStatement:
+        """Parse a statement with ? or :name placeholders for later execution"""
+        return PreparedStatement(query.strip(), self.parse(query))
+
+
+class StatementParser:
+    """Recursive-descent parser for one statement.
+    
+    The statement is tokenized once and each grammar rule is a method that
+    consumes tokens from the current position.
+    """
+    
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.tokens = tokenize(sql)
+        # Repeat the end token so looking ahead never runs off the list
+        self.tokens.extend(self.tokens[-1:] * 2)
+        self.pos = 0
+        # Statement kind named in syntax errors
+        self.statement = 'SQL'
+        # Keys of the placeholders seen so far
+        self.parameters: List[Any] = []
+    
+    def parse(self) -> Dict[str, Any]:
+        """Parse the whole statement; a trailing semicolon is allowed"""
+        method = self.STATEMENTS.get(self.peek().value) if self.peek().kind == 'word' else None
+        if method is None:
+            raise ValueError(f"Unsupported query: {' '.join(self.sql.split())}")
+        parsed = method(self)
+        self.accept_symbol(';')
+        if self.peek().kind != 'end':
+            raise self.error('the end of the statement')
+        if self.parameters:
+            parsed['parameters'] = list(dict.fromkeys(self.parameters))
+        return parsed
+    
+    # Token helpers
+    
+    def peek(self, offset: int = 0) -> Token:
+        return self.tokens[self.pos + offset]
+    
+    def advance(self) -> Token:
+        token = self.tokens[self.pos]
+        if token.kind != 'end':
+            self.pos += 1
+        return token
+    
+    def at(self, word: str, offset: int = 0) -> bool:
+        token = self.tokens[self.pos + offset]
+        return token.value == word and token.kind == 'word'
+    
+    def at_symbol(self, symbol: str, offset: int = 0) -> bool:
+        token = self.tokens[self.pos + offset]
+        return token.value == symbol and token.kind == 'symbol'
+    
+    def accept(self, word: str) -> bool:
+        token = self.tokens[self.pos]
+        if token.value == word and token.kind == 'word':
+            self.pos += 1
+            return True
+        return False
+    
+    def accept_symbol(self, symbol: str) -> bool:
+        token = self.tokens[self.pos]
+        if token.value == symbol and token.kind == 'symbol':
+            self.pos += 1
+            return True
+        return False
+    
+    def expect(self, *words: str):
+        for word in words:
+            if not self.accept(word):
+                raise self.error(word.upper())
+    
+    def expect_symbol(self, symbol: str):
+        if not self.accept_symbol(symbol):
+            raise self.error(f"'{symbol}'")
+    
+    def identifier(self, what: str = 'a name') -> str:
+        token = self.tokens[self.pos]
+        if token.kind != 'word':
+            raise self.error(what)
+        self.pos += 1
+        return token.text
+    
+    def error(self, expected: str) -> ValueError:
+        token = self.peek()
+        if token.kind == 'end':
+            near = 'at the end'
         else:
-            raise ValueError(f"Unsupported query: {query}")
+            near = 'near ' + repr(' '.join(self.sql[token.start:token.start + 30].split()))
+        return ValueError(f"Invalid {self.statement} syntax: expected {expected} {near}")
     
-    def _parse_create_table(self, query: str) -> Dict:
-        """Parse CREATE TABLE statement"""
-        pattern = r'create table (\w+)\s*\((.*)\)'
-        match = re.match(pattern, query, re.IGNORECASE | re.DOTALL)
-        
-        if not match:
-            raise ValueError("Invalid CREATE TABLE syntax")
-        
-        table_name = match.group(1)
-        columns_str = match.group(2).strip()
+    def _source(self, start: int) -> str:
+        """Statement text from token start up to the current token, with
+        whitespace runs collapsed"""
+        return ' '.join(self.sql[self.tokens[start].start:self.tokens[self.pos - 1].end].split())
+    
+    def _skip_item(self):
+        """Skip tokens up to the next ',', ')' or ';' outside parentheses"""
+        depth = 0
+        while self.peek().kind != 'end':
+            token = self.peek()
+            if token.kind == 'symbol':
+                if depth == 0 and token.value in (',', ')', ';'):
+                    return
+                if token.value == '(':
+                    depth += 1
+                elif token.value == ')':
+                    depth -= 1
+            self.advance()
+    
+    # Statements
+    
+    def _parse_create(self) -> Dict:
+        if self.at('table', 1):
+            return self._parse_create_table()
+        if self.at('index', 1):
+            return self._parse_create_index()
+        raise ValueError(f"Unsupported query: {' '.join(self.sql.split())}")
+    
+    def _parse_drop(self) -> Dict:
+        if self.at('table', 1):
+            return self._parse_drop_table()
+        if self.at('index', 1):
+            return self._parse_drop_index()
+        raise ValueError(f"Unsupported query: {' '.join(self.sql.split())}")
+    
+    def _parse_create_table(self) -> Dict:
+        """Parse CREATE TABLE name (column type [modifiers], ...) [WITH (options)]"""
+        self.statement = 'CREATE TABLE'
+        self.expect('create', 'table')
+        table_name = self.identifier('a table name')
+        self.expect_symbol('(')
         
-        # Parse columns
         columns = []
         primary_key = None
         unique_keys = []
-        
-        # Split by comma, handling parentheses
-        column_defs = self._split_sql_list(columns_str)
-        
-        for col_def in column_defs:
-            col_def = col_def.strip()
-            if col_def.upper().startswith('PRIMARY KEY'):
-                # Extract primary key
-                pk_match = re.search(r'primary key\s*\((\w+)\)', col_def, re.IGNORECASE)
-                if pk_match:
-                    primary_key = pk_match.group(1)
-            elif col_def.upper().startswith('UNIQUE'):
-                # Extract unique constraint
-                unique_match = re.search(r'unique\s*\((\w+)\)', col_def, re.IGNORECASE)
-                if unique_match:
-                    unique_keys.append(unique_match.group(1))
+        while True:
+            if self.at('primary') and self.at('key', 1):
+                self.expect('primary', 'key')
+                self.expect_symbol('(')
+                primary_key = self.identifier('a column name')
+                self.expect_symbol(')')
+            elif self.at('unique') and self.at_symbol('(', 1):
+                self.expect('unique')
+                self.expect_symbol('(')
+                unique_keys.append(self.identifier('a column name'))
+                self.expect_symbol(')')
+            elif self.at('constraint') or self.at('foreign') or self.at('check'):
+                # Other table constraints are not enforced
+                self._skip_item()
             else:
-                # Regular column definition
-                col_parts = col_def.split()
-                if len(col_parts) >= 2:
-                    col_name = col_parts[0]
-                    col_type = col_parts[1].upper()
-                    
-                    # Map to internal types
-                    type_map = {
-                        'INT': 'int',
-                        'INTEGER': 'int',
-                        'VARCHAR': 'varchar',
-                        'TEXT': 'varchar',
-                        'FLOAT': 'float',
-                        'BOOLEAN': 'boolean',
-                        'TIMESTAMP': 'timestamp'
-                    }
-                    
-                    internal_type = type_map.get(col_type, 'varchar')
-                    columns.append({
-                        'name': col_name,
-                        'type': internal_type
-                    })
-        
+                col_name = self.identifier('a column name')
+                # VARCHAR(100) and DECIMAL(10,2) map on the base type name
+                col_type = self.identifier('a column type').upper()
+                
+                # Inline constraints: id INT PRIMARY KEY, email TEXT UNIQUE
+                start = self.pos
+                self._skip_item()
+                modifiers = [token.value for token in self.tokens[start:self.pos] if token.kind == 'word']
+                if any(word == 'primary' and after == 'key' for word, after in zip(modifiers, modifiers[1:])):
+                    primary_key = col_name
+                elif 'unique' in modifiers:
+                    unique_keys.append(col_name)
+                
+                columns.append({
+                    'name': col_name,
+                    'type': TYPE_MAP.get(col_type, 'varchar')
+                })
+            if not self.accept_symbol(','):
+                break
+        self.expect_symbol(')')
+        
+        # Trailing table options: CREATE TABLE t (...) WITH (storage = column)
+        options = self._parse_options() if self.accept('with') else {}
         return {
             'type': 'create_table',
             'table_name': table_name,
             'columns': columns,
             'primary_key': primary_key,
-            'unique_keys': unique_keys
+            'unique_keys': unique_keys,
+            'layout': str(options.get('storage', 'row')).lower()
         }
     
-    def _parse_insert(self, query: str) -> Dict:
-        """Parse INSERT INTO statement"""
-        pattern = r'insert into (\w+)\s*(?:\(([^)]+)\))?\s*values\s*\(([^)]+)\)'
-        match = re.match(pattern, query, re.IGNORECASE)
-        
-        if not match:
-            raise ValueError("Invalid INSERT syntax")
-        
-        table_name = match.group(1)
-        columns_str = match.group(2)
-        values_str = match.group(3)
-        
-        # Parse columns
-        columns = []
-        if columns_str:
-            columns = [col.strip() for col in columns_str.split(',')]
-        
-        # Parse values
-        values = self._parse_values(values_str)
-        
-        # Create data dictionary
-        data = {}
-        if columns:
-            for i, col in enumerate(columns):
-                if i < len(values):
-                    data[col] = values[i]
-        else:
-            # If no columns specified, use positional values
-            for i, value in enumerate(values):
-                data[f'col_{i}'] = value
-        
+    def _parse_insert(self) -> Dict:
+        """Parse INSERT INTO name [(columns)] VALUES (values) [, (values) ...]"""
+        self.statement = 'INSERT'
+        self.expect('insert', 'into')
+        table_name = self.identifier('a table name')
+        columns = self._column_list() if self.at_symbol('(') else None
+        
+        self.expect('values')
+        rows = [self._value_list()]
+        while self.accept_symbol(','):
+            rows.append(self._value_list())
+        width = len(columns) if columns else len(rows[0])
+        for values in rows:
+            if len(values) != width:
+                if columns:
+                    raise ValueError(f"INSERT has {len(columns)} column(s) but a VALUES list "
+                                     f"with {len(values)} value(s)")
+                raise ValueError("All VALUES lists of an INSERT must have the same number of values")
+        
+        # Without a column list the values are matched to the table's
+        # columns by position when the statement is executed
         return {
             'type': 'insert',
             'table_name': table_name,
-            'data': data
+            'columns': columns,
+            'rows': rows
         }
     
-    def _parse_select(self, query: str) -> Dict:
-        """Parse SELECT statement"""
-        # Simplified SELECT parser
-        pattern = r'select (.+?) from (\w+)(?: where (.+))?'
-        match = re.match(pattern, query, re.IGNORECASE)
-        
-        if not match:
-            raise ValueError("Invalid SELECT syntax")
-        
-        columns_str = match.group(1).strip()
-        table_name = match.group(2).strip()
-        where_clause = match.group(3) if match.group(3) else None
-        
-        # Parse columns
-        columns = []
-        if columns_str == '*':
-            columns = None
-        else:
-            columns = [col.strip() for col in columns_str.split(',')]
-        
-        # Parse WHERE conditions
-        conditions = {}
-        if where_clause:
-            # Simple equality conditions
-            conditions_pattern = r'(\w+)\s*=\s*(?:(\w+)|"([^"]+)"|\'([^\']+)\')'
-            conditions_matches = re.findall(conditions_pattern, where_clause)
-            
-            for match in conditions_matches:
-                col_name = match[0]
-                # Get value from any of the capturing groups
-                value = next((v for v in match[1:] if v), None)
-                if value:
-                    # Try to convert to number if possible
-                    try:
-                        if '.' in value:
-                            value = float(value)
-                        else:
-                            value = int(value)
-                    except ValueError:
-                        # Remove quotes if present
-                        value = value.strip("'\"")
-                    conditions[col_name] = value
-        
+    def _parse_copy(self) -> Dict:
+        """Parse COPY name [(columns)] FROM | TO 'file' [WITH (options)] or
+        COPY (SELECT ...) TO 'file' [WITH (options)]"""
+        self.statement = 'COPY'
+        self.expect('copy')
+        if self.accept_symbol('('):
+            query = self._parse_select()
+            self.statement = 'COPY'
+            self.expect_symbol(')')
+            self.expect('to')
+            return self._copy_to(query)
+        
+        table_name = self.identifier('a table name')
+        columns = self._column_list() if self.at_symbol('(') else None
+        if self.accept('to'):
+            return self._copy_to({
+                'type': 'select',
+                'table_name': table_name,
+                'columns': columns,
+                'conditions': None,
+                'order_by': None,
+                'limit': None
+            })
+        if not self.accept('from'):
+            raise self.error('FROM or TO')
+        path = self._file_name()
+        options = self._parse_options() if self.accept('with') else {}
         return {
-            'type': 'select',
+            'type': 'copy',
             'table_name': table_name,
             'columns': columns,
-            'conditions': conditions if conditions else None
+            'path': path,
+            'options': options
         }
     
-    def _parse_update_fixed(self, query: str) -> Dict:
-        """Parse UPDATE statement - FIXED VERSION"""
-        # Updated pattern to handle WHERE clause properly
-        pattern = r'update (\w+) set (.+?)(?:\s+where\s+(.+))?$'
-        match = re.match(pattern, query, re.IGNORECASE)
-        
-        if not match:
-            raise ValueError("Invalid UPDATE syntax")
+    def _copy_to(self, query: Dict) -> Dict:
+        path = self._file_name()
+        options = self._parse_options() if self.accept('with') else {}
+        return {
+            'type': 'copy_to',
+            'query': query,
+            'path': path,
+            'options': options
+        }
+    
+    def _file_name(self) -> str:
+        token = self.peek()
+        if token.kind != 'string':
+            raise self.error('a quoted file name')
+        self.advance()
+        return token.value
+    
+    def _column_list(self) -> List[str]:
+        """Parse a parenthesized list of column names"""
+        self.expect_symbol('(')
+        columns = [self.identifier('a column name')]
+        while self.accept_symbol(','):
+            columns.append(self.identifier('a column name'))
+        self.expect_symbol(')')
+        return columns
+    
+    def _value_list(self) -> List[Any]:
+        """Parse a parenthesized VALUES list"""
+        self.expect_symbol('(')
+        values = [self._raw_value()]
+        while self.accept_symbol(','):
+            values.append(self._raw_value())
+        self.expect_symbol(')')
+        return values
+    
+    def _parse_select(self) -> Dict:
+        """Parse SELECT [DISTINCT] items FROM table [joins] [WHERE] [GROUP BY]
+        [HAVING] [ORDER BY] [LIMIT]"""
+        self.statement = 'SELECT'
+        self.expect('select')
+        distinct = self.accept('distinct')
+        items = [self._parse_select_item()]
+        while self.accept_symbol(','):
+            items.append(self._parse_select_item())
+        
+        self.expect('from')
+        table_name = self.identifier('a table name')
+        alias = self._parse_alias()
+        joins = []
+        while self.at('join') or self.at('inner') or self.at('left'):
+            joins.append(self._parse_join())
+        
+        conditions = self._parse_where(self._where_operand) if self.accept('where') else {}
+        
+        group_by = []
+        if self.accept('group'):
+            self.expect('by')
+            group_by.append(self._column_ref())
+            while self.accept_symbol(','):
+                group_by.append(self._column_ref())
+        having = self._parse_having() if self.accept('having') else None
+        
+        order_by = None
+        if self.accept('order'):
+            self.expect('by')
+            order_by = [self._parse_order_key()]
+            while self.accept_symbol(','):
+                order_by.append(self._parse_order_key())
+        
+        limit = None
+        if self.accept('limit'):
+            limit = self._parameter()
+            if limit is None:
+                if self.peek().kind != 'number' or not self.peek().text.isdigit():
+                    raise self.error('a row count')
+                limit = int(self.advance().text)
+        
+        star = len(items) == 1 and items[0][1] == ('star', None)
+        parsed = {
+            'type': 'select',
+            'table_name': table_name,
+            'columns': None if star else [text for text, _, _, _ in items],
+            'conditions': conditions if conditions else None,
+            'order_by': order_by,
+            'limit': limit
+        }
         
-        table_name = match.group(1)
-        set_clause = match.group(2)
-        where_clause = match.group(3) if match.group(3) else None
+        # Joins, aliases, computed columns, grouping and DISTINCT are
+        # described separately
+        if distinct:
+            parsed['distinct'] = True
+        if alias:
+            parsed['alias'] = alias
+        if joins:
+            parsed['joins'] = joins
+        if not star and not all(plain for _, _, _, plain in items):
+            parsed['select_items'] = [(expr, name) for _, expr, name, _ in items]
+        if group_by:
+            parsed['group_by'] = group_by
+        if having:
+            parsed['having'] = having
+        return parsed
+    
+    def _parse_select_item(self) -> Tuple[str, Tuple, str, bool]:
+        """Parse one select list entry into (source text, expression, output
+        name, whether it is a bare column name).
+        
+        Expressions are ('column', name), ('literal', value), ('star', alias),
+        ('aggregate', function, argument, distinct) with argument None for
+        COUNT(*), or ('concat', [expressions]) for the || operator.
+        """
+        start = self.pos
+        parts = [self._parse_operand()]
+        while self.accept_symbol('||'):
+            parts.append(self._parse_operand())
+        expr = parts[0] if len(parts) == 1 else ('concat', parts)
+        expr_text = self._source(start)
+        
+        alias = None
+        if self.accept('as'):
+            alias = self.identifier('an alias')
+        elif self.peek().kind == 'word' and self.peek().value not in RESERVED_WORDS:
+            alias = self.advance().text
+        
+        if alias:
+            name = alias
+        elif expr[0] == 'column':
+            # o.id comes out as id
+            name = expr[1].split('.')[-1]
+        else:
+            name = expr_text
+        plain = alias is None and expr[0] == 'column' and '.' not in expr[1]
+        return self._source(start), expr, name, plain
+    
+    def _parse_operand(self) -> Tuple:
+        """Parse a column reference, *, t.*, a literal or an aggregate call"""
+        token = self.peek()
+        if self.at_symbol('?') or self.at_symbol(':'):
+            raise ValueError("Parameters can only stand for values, not for select list items")
+        if self.accept_symbol('*'):
+            return ('star', None)
+        if token.kind == 'word' and token.value.upper() in AGGREGATES and self.at_symbol('(', 1):
+            return self._parse_aggregate()
+        if token.kind == 'word' and token.value in RESERVED_WORDS:
+            raise self.error('a column name or value')
+        if token.kind == 'word' and token.value not in LITERAL_WORDS:
+            self.advance()
+            if self.accept_symbol('.'):
+                if self.accept_symbol('*'):
+                    return ('star', token.text)
+                return ('column', f"{token.text}.{self.identifier('a column name')}")
+            return ('column', token.text)
+        return ('literal', self._literal())
+    
+    def _parse_order_key(self) -> Tuple[str, str]:
+        """Parse one ORDER BY key: column [ASC | DESC]"""
+        column = self._column_ref()
+        if self.accept('desc'):
+            return column, 'DESC'
+        self.accept('asc')
+        return column, 'ASC'
+    
+    def _parse_aggregate(self) -> Tuple:
+        """Parse COUNT(*), SUM(price) or COUNT(DISTINCT customer_id)"""
+        func = self.advance().value.upper()
+        self.expect_symbol('(')
+        distinct = self.accept('distinct')
+        arg = None if self.accept_symbol('*') else ('column', self._column_ref())
+        self.expect_symbol(')')
+        return ('aggregate', func, arg, distinct)
+    
+    def _parse_alias(self) -> Optional[str]:
+        """Parse an optional [AS] alias after a table name"""
+        if self.accept('as'):
+            return self.identifier('an alias')
+        if self.peek().kind == 'word' and self.peek().value not in CLAUSE_KEYWORDS:
+            return self.advance().text
+        return None
+    
+    def _parse_join(self) -> Dict:
+        """Parse [INNER | LEFT [OUTER]] JOIN t [alias] ON a = b"""
+        kind = 'INNER'
+        if self.accept('left'):
+            kind = 'LEFT'
+            self.accept('outer')
+        else:
+            self.accept('inner')
+        self.expect('join')
+        table_name = self.identifier('a table name')
+        alias = self._parse_alias()
+        self.expect('on')
+        left = self._column_ref()
+        self.expect_symbol('=')
+        right = self._column_ref()
+        return {
+            'join_type': kind,
+            'table_name': table_name,
+            'alias': alias,
+            'on': (left, right)
+        }
+    
+    def _parse_update(self) -> Dict:
+        """Parse UPDATE name SET column = value, ... [WHERE]"""
+        self.statement = 'UPDATE'
+        self.expect('update')
+        table_name = self.identifier('a table name')
+        self.expect('set')
         
-        # Parse SET clause
         updates = {}
-        set_items = [item.strip() for item in set_clause.split(',')]
-        for item in set_items:
-            if '=' in item:
-                col, value = item.split('=', 1)
-                col = col.strip()
-                value = value.strip()
-                
-                # Remove quotes if present
-                if (value.startswith("'") and value.endswith("'")) or \
-                   (value.startswith('"') and value.endswith('"')):
-                    value = value[1:-1]
-                
-                # Try to convert to number
-                try:
-                    if '.' in value:
-                        value = float(value)
-                    else:
-                        value = int(value)
-                except ValueError:
-                    pass
-                
-                updates[col] = value
-        
-        # Parse WHERE conditions - SIMPLIFIED AND FIXED
-        conditions = {}
-        if where_clause:
-            # Handle simple equality conditions
-            # Remove any trailing semicolon
-            where_clause = where_clause.rstrip(';')
-            
-            # Try to split on AND for multiple conditions
-            where_parts = [p.strip() for p in where_clause.split(' and ')]
-            for part in where_parts:
-                if '=' in part:
-                    col, value = part.split('=', 1)
-                    col = col.strip()
-                    value = value.strip()
-                    
-                    # Remove quotes if present
-                    if (value.startswith("'") and value.endswith("'")) or \
-                       (value.startswith('"') and value.endswith('"')):
-                        value = value[1:-1]
-                    
-                    # Try to convert to number
-                    try:
-                        if '.' in value:
-                            value = float(value)
-                        else:
-                            value = int(value)
-                    except ValueError:
-                        pass
-                    
-                    conditions[col] = value
-        
+        while True:
+            column = self.identifier('a column name')
+            self.expect_symbol('=')
+            updates[column] = self._condition_value()
+            if not self.accept_symbol(','):
+                break
+        
+        conditions = self._parse_where(self._where_operand) if self.accept('where') else {}
         return {
             'type': 'update',
             'table_name': table_name,
@@ -256,142 +608,403 @@ class Parser:
             'conditions': conditions if conditions else None
         }
     
-    # Keep the old _parse_update for reference but rename it
-    def _parse_update(self, query: str) -> Dict:
-        """OLD VERSION - Keeping for reference"""
-        return self._parse_update_fixed(query)  # Just call the fixed version
-    
-    def _parse_delete(self, query: str) -> Dict:
-        """Parse DELETE statement"""
-        pattern = r'delete from (\w+)(?: where (.+))?'
-        match = re.match(pattern, query, re.IGNORECASE)
-        
-        if not match:
-            raise ValueError("Invalid DELETE syntax")
-        
-        table_name = match.group(1)
-        where_clause = match.group(2) if match.group(2) else None
-        
-        conditions = {}
-        if where_clause:
-            # Simple equality condition
-            where_match = re.search(r'(\w+)\s*=\s*(.+)$', where_clause.strip())
-            if where_match:
-                col_name = where_match.group(1).strip()
-                value = where_match.group(2).strip()
-                
-                # Remove quotes if present
-                if (value.startswith("'") and value.endswith("'")) or \
-                   (value.startswith('"') and value.endswith('"')):
-                    value = value[1:-1]
-                
-                # Try to convert to number
-                try:
-                    if '.' in value:
-                        value = float(value)
-                    else:
-                        value = int(value)
-                except ValueError:
-                    pass
-                
-                conditions[col_name] = value
-        
+    def _parse_delete(self) -> Dict:
+        """Parse DELETE FROM name [WHERE]"""
+        self.statement = 'DELETE'
+        self.expect('delete', 'from')
+        table_name = self.identifier('a table name')
+        conditions = self._parse_where(self._where_operand) if self.accept('where') else {}
         return {
             'type': 'delete',
             'table_name': table_name,
             'conditions': conditions if conditions else None
         }
     
-    def _parse_drop_table(self, query: str) -> Dict:
-        """Parse DROP TABLE statement"""
-        pattern = r'drop table (\w+)'
-        match = re.match(pattern, query, re.IGNORECASE)
-        
-        if not match:
-            raise ValueError("Invalid DROP TABLE syntax")
-        
+    def _parse_drop_table(self) -> Dict:
+        """Parse DROP TABLE [IF EXISTS] name; dropping a missing table is
+        not an error either way"""
+        self.statement = 'DROP TABLE'
+        self.expect('drop', 'table')
+        if self.accept('if'):
+            self.expect('exists')
         return {
             'type': 'drop_table',
-            'table_name': match.group(1)
+            'table_name': self.identifier('a table name')
         }
     
-    def _parse_values(self, values_str: str) -> List[Any]:
-        """Parse VALUES clause into list of values"""
-        values = []
-        current = ''
-        in_quotes = False
-        quote_char = None
-        
-        for char in values_str:
-            if char in ("'", '"') and not in_quotes:
-                in_quotes = True
-                quote_char = char
-                current += char
-            elif char == quote_char and in_quotes:
-                in_quotes = False
-                current += char
-            elif char == ',' and not in_quotes:
-                values.append(self._parse_value(current.strip()))
-                current = ''
-            else:
-                current += char
-        
-        if current:
-            values.append(self._parse_value(current.strip()))
-        
-        return values
+    def _parse_create_index(self) -> Dict:
+        """Parse CREATE INDEX [name] ON table [USING kind] (column) [USING kind]"""
+        self.statement = 'CREATE INDEX'
+        self.expect('create', 'index')
+        index_name = None if self.at('on') else self.identifier('an index name')
+        self.expect('on')
+        table_name = self.identifier('a table name')
+        using = self.identifier('an index type') if self.accept('using') else None
+        self.expect_symbol('(')
+        column = self.identifier('a column name')
+        self.expect_symbol(')')
+        if using is None and self.accept('using'):
+            using = self.identifier('an index type')
+        return {
+            'type': 'create_index',
+            'index_name': index_name,
+            'table_name': table_name,
+            'column': column,
+            'using': (using or 'hash').lower()
+        }
     
-    def _parse_value(self, value_str: str) -> Any:
-        """Parse a single SQL value"""
-        if value_str.startswith("'") and value_str.endswith("'"):
-            return value_str[1:-1]
-        elif value_str.startswith('"') and value_str.endswith('"'):
-            return value_str[1:-1]
-        elif value_str.lower() == 'null':
-            return None
-        elif value_str.lower() == 'true':
-            return True
-        elif value_str.lower() == 'false':
-            return False
+    def _parse_drop_index(self) -> Dict:
+        """Parse DROP INDEX statement"""
+        self.statement = 'DROP INDEX'
+        self.expect('drop', 'index')
+        return {
+            'type': 'drop_index',
+            'index_name': self.identifier('an index name')
+        }
+    
+    def _parse_vacuum(self) -> Dict:
+        """Parse VACUUM [table] statement"""
+        self.statement = 'VACUUM'
+        self.expect('vacuum')
+        return {
+            'type': 'vacuum',
+            'table_name': self.advance().text if self.peek().kind == 'word' else None
+        }
+    
+    def _parse_analyze(self) -> Dict:
+        """Parse ANALYZE [table] statement"""
+        self.statement = 'ANALYZE'
+        self.expect('analyze')
+        return {
+            'type': 'analyze',
+            'table_name': self.advance().text if self.peek().kind == 'word' else None
+        }
+    
+    def _parse_explain(self) -> Dict:
+        """Parse EXPLAIN [ANALYZE] SELECT ..."""
+        self.statement = 'EXPLAIN'
+        self.expect('explain')
+        analyze = self.accept('analyze')
+        if not self.at('select'):
+            raise ValueError("EXPLAIN supports SELECT queries only")
+        return {
+            'type': 'explain',
+            'analyze': analyze,
+            'query': self._parse_select()
+        }
+    
+    def _parse_set(self) -> Dict:
+        """Parse SET option = value session statement"""
+        self.statement = 'SET'
+        self.expect('set')
+        option = self.identifier('an option name').lower()
+        if not self.accept_symbol('=') and not self.accept('to'):
+            raise self.error("'=' or TO")
+        return {
+            'type': 'set',
+            'option': option,
+            'value': self._raw_value()
+        }
+    
+    def _parse_begin(self) -> Dict:
+        """Parse BEGIN [TRANSACTION | WORK] or START TRANSACTION"""
+        self.statement = 'BEGIN'
+        if self.accept('start'):
+            self.expect('transaction')
         else:
-            # Try to parse as number
-            try:
-                if '.' in value_str:
-                    return float(value_str)
-                else:
-                    return int(value_str)
-            except ValueError:
-                return value_str
-    
-    def _split_sql_list(self, text: str) -> List[str]:
-        """Split SQL list by comma, handling nested parentheses and quotes"""
-        result = []
-        current = ''
-        depth = 0
-        in_quotes = False
-        quote_char = None
+            self.expect('begin')
+            if not self.accept('transaction'):
+                self.accept('work')
+        return {'type': 'begin'}
+    
+    def _parse_finish(self) -> Dict:
+        """Parse COMMIT, END or ROLLBACK [TRANSACTION | WORK]"""
+        word = self.advance().value
+        self.statement = word.upper()
+        if not self.accept('transaction'):
+            self.accept('work')
+        return {'type': 'rollback' if word == 'rollback' else 'commit'}
+    
+    STATEMENTS: Dict[str, Callable[['StatementParser'], Dict]] = {
+        'create': _parse_create,
+        'insert': _parse_insert,
+        'copy': _parse_copy,
+        'select': _parse_select,
+        'update': _parse_update,
+        'delete': _parse_delete,
+        'drop': _parse_drop,
+        'set': _parse_set,
+        'vacuum': _parse_vacuum,
+        'analyze': _parse_analyze,
+        'explain': _parse_explain,
+        'begin': _parse_begin,
+        'start': _parse_begin,
+        'commit': _parse_finish,
+        'end': _parse_finish,
+        'rollback': _parse_finish,
+    }
+    
+    # Conditions
+    
+    def _parse_where(self, operand: Callable[[], Tuple[str, Any]]) -> Dict[Any, Any]:
+        """Parse a WHERE clause into a conditions dict {column: condition}.
+        
+        Comparisons, [NOT] BETWEEN, [NOT] LIKE, [NOT] IN and IS [NOT] NULL
+        can be combined with AND, OR, NOT and parentheses. NOT is pushed
+        down to the single-column tests. Top-level AND-ed tests map their
+        column to the plain value for equality, else to a Predicate, and
+        several tests on one column are collected in a list. ORs of
+        equalities on one column become IN; other ORs are kept as an Or
+        of conditions dicts. operand parses the left hand side of a test
+        into its (text, dict key).
+        """
+        return self._condition_dict(self._parse_or(operand))
+    
+    def _parse_having(self) -> Dict[Tuple, Any]:
+        """Parse HAVING conditions into a conditions dict.
         
-        for char in text:
-            if char in ("'", '"') and not in_quotes:
-                in_quotes = True
-                quote_char = char
-                current += char
-            elif char == quote_char and in_quotes:
-                in_quotes = False
-                current += char
-            elif char == '(' and not in_quotes:
-                depth += 1
-                current += char
-            elif char == ')' and not in_quotes:
-                depth -= 1
-                current += char
-            elif char == ',' and not in_quotes and depth == 0:
-                result.append(current.strip())
-                current = ''
+        The keys are the expressions tested: aggregate calls, output names
+        or grouped columns. Conditions take the same form as in WHERE.
+        """
+        return self._parse_where(self._having_operand)
+    
+    def _where_operand(self) -> Tuple[str, str]:
+        column = self._column_ref()
+        return column, column
+    
+    def _having_operand(self) -> Tuple[str, Tuple]:
+        start = self.pos
+        expr = self._parse_operand()
+        return self._source(start), expr
+    
+    def _column_ref(self) -> str:
+        """Parse a column name, optionally qualified: o.id"""
+        name = self.identifier('a column name')
+        if self.accept_symbol('.'):
+            name = f"{name}.{self.identifier('a column name')}"
+        return name
+    
+    def _parse_or(self, operand: Callable[[], Tuple[str, Any]]) -> Tuple:
+        terms = [self._parse_and(operand)]
+        while self.accept('or'):
+            terms.append(self._parse_and(operand))
+        return terms[0] if len(terms) == 1 else ('or', terms)
+    
+    def _parse_and(self, operand: Callable[[], Tuple[str, Any]]) -> Tuple:
+        terms = [self._parse_not(operand)]
+        while self.accept('and'):
+            terms.append(self._parse_not(operand))
+        return terms[0] if len(terms) == 1 else ('and', terms)
+    
+    def _parse_not(self, operand: Callable[[], Tuple[str, Any]]) -> Tuple:
+        if self.accept('not'):
+            return self._negate(self._parse_not(operand))
+        if self.accept_symbol('('):
+            node = self._parse_or(operand)
+            self.expect_symbol(')')
+            return node
+        return self._parse_test(operand)
+    
+    def _parse_test(self, operand: Callable[[], Tuple[str, Any]]) -> Tuple:
+        """Parse one test into ('test', text, key, Predicate)"""
+        text, key = operand()
+        token = self.peek()
+        if token.kind == 'symbol' and (token.value in COMPARISONS or token.value == '<>'):
+            self.advance()
+            op = '!=' if token.value == '<>' else token.value
+            value = self._condition_value()
+            if value is None and op in ('=', '!='):
+                # Both layouts agree on x = NULL as IS NULL
+                op = 'is null' if op == '=' else 'is not null'
+            return ('test', text, key, Predicate(op, value))
+        if self.accept('is'):
+            negated = self.accept('not')
+            self.expect('null')
+            return ('test', text, key, Predicate('is not null' if negated else 'is null', None))
+        
+        negated = self.accept('not')
+        if self.accept('between'):
+            low = self._condition_value()
+            self.expect('and')
+            predicate = Predicate('between', (low, self._condition_value()))
+        elif self.accept('like'):
+            if self.peek().kind == 'string':
+                predicate = Predicate('like', self.advance().value)
             else:
-                current += char
-        
-        if current:
-            result.append(current.strip())
-        
-        return result
+                pattern = self._condition_value()
+                predicate = Predicate('like', pattern if isinstance(pattern, Parameter) else str(pattern))
+        elif self.accept('in'):
+            self.expect_symbol('(')
+            values = [self._condition_value()]
+            while self.accept_symbol(','):
+                values.append(self._condition_value())
+            self.expect_symbol(')')
+            predicate = Predicate('in', tuple(values))
+        else:
+            raise self.error('a comparison')
+        return ('test', text, key, predicate.negate() if negated else predicate)
+    
+    def _negate(self, node: Tuple) -> Tuple:
+        """NOT of a condition tree, pushed down to its tests"""
+        if node[0] == 'test':
+            return node[:3] + (node[3].negate(),)
+        return ('or' if node[0] == 'and' else 'and', [self._negate(term) for term in node[1]])
+    
+    def _condition_dict(self, node: Tuple) -> Dict[Any, Any]:
+        """Turn a condition tree into a conditions dict"""
+        if node[0] == 'test':
+            _, _, key, predicate = node
+            return {key: _condition_value(predicate)}
+        
+        if node[0] == 'and':
+            conditions: Dict[Any, Any] = {}
+            for term in node[1]:
+                for column, condition in self._condition_dict(term).items():
+                    if column in conditions and not isinstance(condition, Or):
+                        existing = conditions[column]
+                        conditions[column] = ((existing if isinstance(existing, list) else [existing])
+                                              + (condition if isinstance(condition, list) else [condition]))
+                    else:
+                        conditions[column] = condition
+            return conditions
+        
+        branches = []
+        for term in node[1]:
+            branch = self._condition_dict(term)
+            # (a OR b) OR c is a single disjunction
+            if len(branch) == 1 and isinstance(next(iter(branch.values())), Or):
+                branches.extend(next(iter(branch.values())).terms)
+            else:
+                branches.append(branch)
+        
+        # x = 1 OR x = 2 OR x IN (3, 4) is x IN (1, 2, 3, 4)
+        columns = {column for branch in branches for column in branch}
+        if len(columns) == 1 and all(len(branch) == 1 for branch in branches):
+            values = [equality_values(condition) for branch in branches for condition in branch.values()]
+            if all(v is not None for v in values):
+                return {columns.pop(): Predicate('in', tuple(dict.fromkeys(v for vs in values for v in vs)))}
+        # The Or is keyed by its SQL text
+        return {self._condition_text(node): Or(tuple(branches))}
+    
+    def _condition_text(self, node: Tuple) -> str:
+        if node[0] == 'test':
+            _, text, _, predicate = node
+            return format_condition(text, _condition_value(predicate))
+        text = f" {node[0].upper()} ".join(self._condition_text(term) for term in node[1])
+        return f"({text})" if node[0] == 'or' else text
+    
+    # Values
+    
+    def _parameter(self) -> Optional[Parameter]:
+        """Parse a ? or :name placeholder, if one comes next"""
+        if self.at_symbol('?'):
+            key = sum(1 for key in self.parameters if isinstance(key, int))
+        elif self.at_symbol(':') and self.peek(1).kind == 'word':
+            self.advance()
+            key = self.peek().text
+        else:
+            return None
+        if self.parameters and isinstance(key, int) != isinstance(self.parameters[0], int):
+            raise ValueError("Cannot mix ? and :name parameters in one statement")
+        self.advance()
+        self.parameters.append(key)
+        return Parameter(key)
+    
+    def _literal(self) -> Any:
+        """Parse a string, a number (optionally negative), NULL, TRUE, FALSE
+        or a placeholder"""
+        token = self.peek()
+        if token.kind == 'string':
+            self.advance()
+            return token.value
+        if token.kind == 'word' and token.value in LITERAL_WORDS:
+            self.advance()
+            return LITERAL_WORDS[token.value]
+        parameter = self._parameter()
+        if parameter is not None:
+            return parameter
+        negative = self.accept_symbol('-')
+        if self.peek().kind != 'number':
+            raise self.error('a value')
+        number = _parse_number(self.advance().text)
+        return -number if negative else number
+    
+    def _condition_value(self) -> Any:
+        """Parse a value compared in a condition or assigned by SET; numeric
+        strings compare as numbers.
+        
+        A bare word is refused rather than taken as text: in a = b it reads
+        as a column, and conditions cannot compare two columns.
+        """
+        token = self.peek()
+        if token.kind == 'string':
+            self.advance()
+            return _number_or_text(token.value)
+        if token.kind == 'word' and token.value not in LITERAL_WORDS:
+            if token.value in CONDITION_KEYWORDS:
+                raise self.error('a value')
+            raise self.error(f"a value, not the bare name {token.text} (quote text as '{token.text}')")
+        return self._literal()
+    
+    def _raw_value(self) -> Any:
+        """Parse a value in a VALUES, SET or WITH list.
+        
+        Unquoted values run to the next ',' or ')', so dates such as
+        2024-01-15 and words such as CURRENT_TIMESTAMP are kept as text.
+        """
+        token, after = self.peek(), self.peek(1)
+        if token.kind == 'string' and (after.kind == 'end' or after.value in (',', ')', ';')):
+            self.advance()
+            return token.value
+        parameter = self._parameter()
+        if parameter is not None:
+            return parameter
+        start = self.pos
+        self._skip_item()
+        if self.pos == start:
+            raise self.error('a value')
+        text = self._source(start)
+        if text.lower() in LITERAL_WORDS:
+            return LITERAL_WORDS[text.lower()]
+        return _number_or_text(text)
+    
+    def _parse_options(self) -> Dict[str, Any]:
+        """Parse a WITH (name = value, ...) option list"""
+        self.expect_symbol('(')
+        options = {}
+        while not self.at_symbol(')'):
+            name = self.identifier('an option name').lower()
+            # Allow the "=" to be omitted: WITH (FORMAT csv), and the value
+            # of a flag: WITH (HEADER)
+            self.accept_symbol('=')
+            options[name] = True if self.at_symbol(',') or self.at_symbol(')') else self._raw_value()
+            if not self.accept_symbol(','):
+                break
+        self.expect_symbol(')')
+        return options
+
+
+def _parse_number(text: str) -> Any:
+    if '.' in text or 'e' in text or 'E' in text:
+        return float(text)
+    return int(text)
+
+
+def _number_or_text(text: str) -> Any:
+    """A number for numeric text, else the text itself"""
+    try:
+        return _parse_number(text)
+    except ValueError:
+        return text
+
+
+def _condition_value(predicate: Predicate) -> Any:
+    """The conditions dict value for a test: the plain value for equality.
+    
+    Equality with a placeholder stays a Predicate until the value is bound,
+    since a NULL value turns it into IS NULL.
+    """
+    if predicate.op == '=' and not isinstance(predicate.value, Parameter):
+        return predicate.value
+    return predicate
+
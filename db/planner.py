@@ -0,0 +1,538 @@
+import math
+from operator import itemgetter
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from .storage import Storage, Table
+from .statistics import TableStats
+from .join import JOIN_TYPES
+from .predicates import (Or, Parameter, Predicate, condition_columns, condition_terms, equality_values,
+                         format_conditions, has_parameter, rename_columns)
+from .aggregates import accumulator_factory
+from .sort import DEFAULT_WORK_MEM
+from .operators import (JoinScope, GroupScope, Operator, SeqScan, IndexLookup, IndexOrderScan,
+                        Filter, HashJoin, MergeJoin, IndexJoin, Reorder, HashAggregate,
+                        StreamAggregate, Sort, Limit, Project, Distinct)
+
+# Cost units: reading and testing one row in a sequential scan costs 1.
+# Costs only need to rank alternatives, so they are rough.
+SEQ_ROW_COST = 1.0
+# Column tables filter whole vectors at once
+COLUMN_ROW_COST = 0.25
+# One key map or index probe, and fetching a row by its position
+INDEX_PROBE_COST = 4.0
+INDEX_ROW_COST = 2.0
+HASH_BUILD_COST = 1.5
+HASH_PROBE_COST = 1.0
+MERGE_ROW_COST = 0.5
+# Evaluating a filter, projection or aggregate step for one row
+CPU_ROW_COST = 0.1
+SORT_COMPARE_COST = 0.05
+
+# Selectivity guesses for conditions nothing better is known about
+DEFAULT_EQ_SELECTIVITY = 0.005
+DEFAULT_RANGE_SELECTIVITY = 1 / 3
+DEFAULT_LIKE_SELECTIVITY = 0.1
+
+class Statistics:
+    """Row count and selectivity estimates for one table.
+    
+    Key maps and hash indexes give exact distinct counts, and btree indexes
+    count the rows in a range without fetching them. Other conditions are
+    estimated from the ANALYZE statistics when there are any, and anything
+    else falls back to fixed guesses.
+    """
+    
+    def __init__(self, table: Table, table_stats: Optional[TableStats] = None):
+        self.table = table
+        self.rows = len(table)
+        self.columns = table_stats.columns if table_stats is not None else {}
+    
+    def distinct(self, column: str) -> Optional[int]:
+        """Number of distinct non-NULL values, if known"""
+        if column in self.table.key_maps:
+            return max(self.rows, 1)
+        index = self.table.index_on(column, 'hash')
+        if index is not None:
+            return max(len(index.index), 1)
+        if column in self.columns:
+            return max(round(self.columns[column].n_distinct), 1)
+        return None
+    
+    def selectivity(self, conditions: Optional[Dict]) -> float:
+        """Estimated fraction of rows satisfying all conditions"""
+        result = 1.0
+        for column, value in (conditions or {}).items():
+            if isinstance(value, Or):
+                result *= or_selectivity([self.selectivity(branch) for branch in value.terms])
+            else:
+                result *= self.column_selectivity(column, value)
+        return result
+    
+    def column_selectivity(self, column: str, value: Any) -> float:
+        terms = condition_terms(value)
+        btree = self.table.index_on(column, 'btree')
+        result = 1.0
+        if btree is not None and self.rows and not has_parameter(terms):
+            count = btree.count(terms)
+            if count is not None:
+                # The index answered the comparisons; guess only the rest
+                result = count / self.rows
+                terms = [term for term in terms if btree.term_bounds(term) is None]
+        for term in terms:
+            result *= self._term_selectivity(column, term)
+        return result
+    
+    def _term_selectivity(self, column: str, term: Predicate) -> float:
+        column_stats = self.columns.get(column)
+        # Placeholders of a prepared statement fall back to the default guesses
+        if column_stats is not None and not has_parameter(term.value):
+            if term.op in ('=', '!='):
+                equal = column_stats.equal_fraction(term.value)
+                return equal if term.op == '=' else max(1 - column_stats.null_frac - equal, 0.0)
+            if term.op == 'in':
+                return min(sum(column_stats.equal_fraction(v) for v in set(term.value)), 1.0)
+            if term.op in ('is null', 'is not null'):
+                null_frac = column_stats.null_frac
+                return null_frac if term.op == 'is null' else 1 - null_frac
+            fraction = column_stats.test_fraction(term.test())
+            if fraction is not None:
+                return fraction
+        if term.op in ('=', '!='):
+            distinct = self.distinct(column)
+            equal = 1 / distinct if distinct else DEFAULT_EQ_SELECTIVITY
+            return equal if term.op == '=' else 1 - equal
+        if term.op == 'in':
+            return min(len(set(term.value)) * self._term_selectivity(column, Predicate('=', None)), 1.0)
+        if term.op in ('not between', 'not like', 'not in', 'is not null'):
+            return 1 - self._term_selectivity(column, term.negate())
+        if term.op == 'is null':
+            return DEFAULT_EQ_SELECTIVITY
+        if term.op == 'between':
+            return DEFAULT_RANGE_SELECTIVITY / 2
+        if term.op == 'like':
+            return DEFAULT_LIKE_SELECTIVITY
+        return DEFAULT_RANGE_SELECTIVITY
+
+
+def or_selectivity(selectivities: List[float]) -> float:
+    """Selectivity of a disjunction of independent conditions"""
+    missed = 1.0
+    for selectivity in selectivities:
+        missed *= 1 - selectivity
+    return 1 - missed
+
+class Planner:
+    """Builds operator trees for SELECT queries.
+    
+    Access paths (sequential scan, index lookup or index walk), join order
+    and join algorithms (hash, sort-merge or index nested loop) are chosen
+    by comparing estimated costs.
+    """
+    
+    def __init__(self, storage: Storage, work_mem: int = DEFAULT_WORK_MEM):
+        self.storage = storage
+        self.work_mem = work_mem
+    
+    def plan_select(self, query: Dict) -> Operator:
+        """Build the operator tree for a SELECT"""
+        joins = query.get('joins') or []
+        sources = [(query.get('alias') or query['table_name'], self.storage.get_table(query['table_name']))]
+        for join in joins:
+            if join['join_type'] not in JOIN_TYPES:
+                raise ValueError(f"Unsupported join type '{join['join_type']}'")
+            sources.append((join['alias'] or join['table_name'], self.storage.get_table(join['table_name'])))
+        scope = JoinScope(sources)
+        stats = [Statistics(table, self.storage.table_statistics(table.name)) for _, table in sources]
+        
+        # Conditions on the first table or an inner-joined table filter that
+        # table before the join (using its indexes); conditions on the right
+        # side of a LEFT join must see the NULL-padded rows, so they wait.
+        # So do ORs spanning several tables.
+        pushed: List[Dict] = [{} for _ in sources]
+        residual: Dict[str, Any] = {}
+        for name, value in (query.get('conditions') or {}).items():
+            source_ids = {scope.resolve(column)[0] for column in condition_columns({name: value})}
+            source = source_ids.pop()
+            if source_ids or not (source == 0 or joins[source - 1]['join_type'] == 'INNER'):
+                residual[name] = value
+            elif isinstance(value, Or):
+                pushed[source].update(rename_columns({name: value}, lambda column: scope.resolve(column)[1]))
+            else:
+                column = scope.resolve(name)[1]
+                if column in pushed[source]:
+                    value = condition_terms(pushed[source][column]) + condition_terms(value)
+                pushed[source][column] = value
+        
+        # Join edges: (source, column) pairs compared by each ON clause
+        edges = []
+        for i, join in enumerate(joins, start=1):
+            a, b = scope.resolve(join['on'][0]), scope.resolve(join['on'][1])
+            if b[0] == i and a[0] < i:
+                edges.append((a, b))
+            elif a[0] == i and b[0] < i:
+                edges.append((b, a))
+            else:
+                raise ValueError(f"JOIN condition {join['on'][0]} = {join['on'][1]} must compare "
+                                 f"'{join['table_name']}' with an earlier table")
+        
+        order_by = query.get('order_by') or []
+        descending = bool(order_by) and order_by[0][1].upper() == 'DESC'
+        limit = query.get('limit')
+        distinct = query.get('distinct', False)
+        # A LIMIT placeholder is only known when the plan runs, and with
+        # DISTINCT it counts distinct rows, so cannot cut the input short
+        row_limit = None if isinstance(limit, Parameter) or distinct else limit
+        sort_limit = None if distinct else limit
+        items = self._select_items(query)
+        group_by = query.get('group_by') or []
+        grouped = bool(group_by or query.get('having')) or any(self._has_aggregate(expr) for expr, _ in items)
+        
+        # Grouped queries sort, filter and project the aggregated rows, and
+        # walking the input in GROUP BY order lets groups stream out
+        if grouped:
+            group_scope = GroupScope(scope, group_by, items)
+            outputs = self._projection(group_scope, items)
+            having = query.get('having')
+            # Resolved up front: HAVING aggregates missing from the select list
+            # are added to the ones the Aggregate computes
+            having_positions = {expr: self._having_position(group_scope, expr)
+                                for expr in condition_columns(having or {})}
+            order_positions = [group_scope.output_position(column) for column, _ in order_by]
+            walk_pos = group_scope.group_positions[0] if len(group_by) == 1 else None
+        else:
+            outputs = self._projection(scope, items)
+            order_positions = [scope.position(column) for column, _ in order_by]
+        
+        # A single ORDER BY column can come from the order of the input
+        order_pos = order_positions[0] if len(order_positions) == 1 else None
+        if grouped:
+            walk_descending = descending and order_pos == 0
+        else:
+            walk_pos, walk_descending = order_pos, descending
+        
+        # Walking a btree index of the first table on the ORDER BY (or single
+        # GROUP BY) column avoids a sort, and as long as every join keeps the
+        # left row order a LIMIT then stops the whole pipeline early
+        first = sources[0][1]
+        walk = None
+        if (walk_pos is not None and walk_pos < len(first.column_names)
+                and first.index_on(first.column_names[walk_pos], 'btree') is not None):
+            walk = (first.column_names[walk_pos], walk_descending)
+        # Rows the consumer will pull when nothing between the scan and the
+        # LIMIT needs to see every row
+        streamed = row_limit if not grouped and not residual else None
+        
+        join_types = ['INNER'] + [join['join_type'] for join in joins]
+        candidates = []
+        if walk is not None:
+            plan = self._join_plan(list(range(len(sources))), sources, join_types, pushed, edges, stats,
+                                   walk, streamed)
+            saved = self._sort_cost(plan.estimated_rows, row_limit) if order_by and (not grouped or order_pos == 0) else 0
+            if grouped:
+                saved += plan.estimated_rows * (HASH_BUILD_COST - CPU_ROW_COST)
+            candidates.append((plan.cost - saved, plan, True))
+        orders = [list(range(len(sources)))]
+        if len(sources) > 1 and all(join['join_type'] == 'INNER' for join in joins):
+            greedy = self._join_order(sources, pushed, edges, stats)
+            if greedy != orders[0]:
+                orders.append(greedy)
+        for order in orders:
+            plan = self._join_plan(order, sources, join_types, pushed, edges, stats, None, None)
+            candidates.append((plan.cost, plan, False))
+        _, plan, walk_order = min(candidates, key=lambda candidate: candidate[0])
+        
+        if residual:
+            selectivity = self._residual_selectivity(residual, scope, stats)
+            plan = self._estimate(Filter(plan, residual, scope.position),
+                                  plan.estimated_rows * selectivity, plan.estimated_rows * CPU_ROW_COST)
+            plan.detail = format_conditions(residual)
+        presorted = walk_order
+        if grouped:
+            aggregates = [(accumulator_factory(func, arg is None, distinct),
+                           self._compile_expression(scope, arg) if arg is not None else None)
+                          for _, func, arg, distinct in group_scope.aggregates]
+            groups = self._group_estimate(plan.estimated_rows, group_scope, sources, stats)
+            if walk_order:
+                node = StreamAggregate(plan, group_scope.group_positions, aggregates)
+                row_cost = CPU_ROW_COST
+            else:
+                node = HashAggregate(plan, group_scope.group_positions, aggregates)
+                row_cost = HASH_BUILD_COST
+            plan = self._estimate(node, groups, plan.estimated_rows * row_cost)
+            plan.detail = f"group by {', '.join(group_by)}" if group_by else ''
+            if having:
+                node = Filter(plan, having, having_positions.__getitem__)
+                plan = self._estimate(node, plan.estimated_rows * DEFAULT_RANGE_SELECTIVITY,
+                                      plan.estimated_rows * CPU_ROW_COST)
+                plan.detail = 'having'
+            # Streamed groups are in order of the (single) group column
+            presorted = walk_order and order_pos == 0
+        if order_by and not presorted:
+            rows = plan.estimated_rows
+            keys = [(pos, direction.upper() == 'DESC') for pos, (_, direction) in zip(order_positions, order_by)]
+            plan = self._estimate(Sort(plan, keys, sort_limit, self.work_mem),
+                                  min(rows, row_limit) if row_limit is not None else rows,
+                                  self._sort_cost(rows, row_limit))
+            plan.detail = 'on ' + ', '.join(f"{column} DESC" if direction.upper() == 'DESC' else column
+                                            for column, direction in order_by)
+        if limit is not None and not distinct:
+            rows = plan.estimated_rows
+            plan = self._estimate(Limit(plan, limit), min(rows, row_limit) if row_limit is not None else rows, 0)
+        plan = self._estimate(Project(plan, outputs), plan.estimated_rows,
+                              plan.estimated_rows * CPU_ROW_COST)
+        if distinct:
+            plan = self._estimate(Distinct(plan), plan.estimated_rows, plan.estimated_rows * HASH_BUILD_COST)
+            if limit is not None:
+                rows = plan.estimated_rows
+                plan = self._estimate(Limit(plan, limit), rows if isinstance(limit, Parameter) else min(rows, limit), 0)
+        return plan
+    
+    def _estimate(self, node: Operator, rows: float, cost: float) -> Operator:
+        """Record a node's estimated output rows and its cost plus its inputs'"""
+        node.estimated_rows = rows
+        node.cost = cost + sum(c.cost for c in node.children)
+        return node
+    
+    def _residual_selectivity(self, conditions: Dict, scope: JoinScope, stats: List[Statistics]) -> float:
+        """Estimated fraction of joined rows passing conditions on qualified columns"""
+        result = 1.0
+        for name, value in conditions.items():
+            if isinstance(value, Or):
+                result *= or_selectivity([self._residual_selectivity(branch, scope, stats)
+                                          for branch in value.terms])
+            else:
+                source, column = scope.resolve(name)
+                result *= stats[source].column_selectivity(column, value)
+        return result
+    
+    def _sort_cost(self, rows: float, limit: Optional[int]) -> float:
+        kept = min(rows, limit) if limit is not None else rows
+        return rows * math.log2(max(kept, 2)) * SORT_COMPARE_COST
+    
+    def _join_order(self, sources: List[Tuple[str, Table]], pushed: List[Dict],
+                    edges: List[Tuple], stats: List[Statistics]) -> List[int]:
+        """Greedy inner join order: start from the smallest filtered table and
+        keep adding the connected table giving the smallest intermediate result"""
+        sizes = [stat.rows * stat.selectivity(conditions) for stat, conditions in zip(stats, pushed)]
+        order = [min(range(len(sources)), key=lambda i: sizes[i])]
+        rows = sizes[order[0]]
+        while len(order) < len(sources):
+            best = None
+            for left, right in edges:
+                for (a, a_column), (b, b_column) in ((left, right), (right, left)):
+                    if a in order and b not in order:
+                        out = self._join_rows(rows, sizes[b], stats[a], a_column, stats[b], b_column, 'INNER')
+                        if best is None or out < best[0]:
+                            best = (out, b)
+            rows, nxt = best
+            order.append(nxt)
+        return order
+    
+    def _join_rows(self, left_rows: float, right_rows: float, left_stats: Statistics, left_column: str,
+                   right_stats: Statistics, right_column: str, join_type: str) -> float:
+        """Estimated output of an equi-join.
+        
+        Each key value is assumed to match on the side with more distinct
+        values; with no distinct counts the larger table decides.
+        """
+        known = [d for d in (left_stats.distinct(left_column), right_stats.distinct(right_column)) if d]
+        distinct = max(known) if known else max(left_stats.rows, right_stats.rows, 1)
+        rows = left_rows * right_rows / distinct
+        return max(rows, left_rows) if join_type == 'LEFT' else rows
+    
+    def _join_plan(self, order: List[int], sources: List[Tuple[str, Table]], join_types: List[str],
+                   pushed: List[Dict], edges: List[Tuple], stats: List[Statistics],
+                   walk: Optional[Tuple[str, bool]], streamed: Optional[int]) -> Operator:
+        """Left-deep join of the sources in the given order, each join using
+        its cheapest algorithm; rows come out in the query's table order.
+        Only inner joins are reordered, so join_types[source] (INNER for the
+        first table) is the join of a source wherever it ends up.
+        
+        With walk, the first table is read in the order of that column's
+        btree index and every join keeps the left row order.
+        """
+        physical = JoinScope([sources[i] for i in order])
+        first_source = order[0]
+        first = sources[first_source][1]
+        first_stats = stats[first_source]
+        filtered = first_stats.rows * first_stats.selectivity(pushed[first_source])
+        # Rows actually pulled from the first table when a LIMIT stops early
+        pulled = filtered if streamed is None else min(filtered, streamed)
+        
+        ordered_on = None
+        if walk is not None:
+            fraction = pulled / filtered if filtered else 1
+            plan = self._estimate(IndexOrderScan(first, walk[0], walk[1], pushed[first_source]),
+                                  filtered, first_stats.rows * INDEX_ROW_COST * fraction)
+        else:
+            plan = self._access_path(first, pushed[first_source], first_stats)
+        rows = pulled
+        
+        for step, source in enumerate(order[1:], start=1):
+            (left_source, left_column), (_, right_column) = next(
+                (a, b) if b[0] == source else (b, a) for a, b in edges
+                if (a[0] == source and b[0] in order[:step]) or (b[0] == source and a[0] in order[:step]))
+            join_type = join_types[source]
+            table = sources[source][1]
+            right_stats = stats[source]
+            left_pos = physical.offsets[order.index(left_source)] + sources[left_source][1].positions[left_column]
+            right_pos = table.positions[right_column]
+            width = len(table.column_names)
+            right_rows = right_stats.rows * right_stats.selectivity(pushed[source])
+            out = self._join_rows(rows, right_rows, stats[left_source], left_column,
+                                  right_stats, right_column, join_type)
+            
+            options = []
+            right = self._access_path(table, pushed[source], right_stats)
+            options.append((plan.cost + right.cost + right_rows * HASH_BUILD_COST + rows * HASH_PROBE_COST,
+                            lambda right=right: HashJoin(plan, right, left_pos, right_pos, width, join_type)))
+            if walk is None:
+                options.append((plan.cost + right.cost + rows * HASH_BUILD_COST + right_rows * HASH_PROBE_COST,
+                                lambda right=right: HashJoin(plan, right, left_pos, right_pos, width,
+                                                             join_type, build_left=True)))
+            if right_column in table.key_maps or table.index_on(right_column) is not None:
+                per_probe = right_stats.rows / (right_stats.distinct(right_column) or right_stats.rows or 1)
+                options.append((plan.cost + rows * (INDEX_PROBE_COST + per_probe * INDEX_ROW_COST),
+                                lambda: IndexJoin(plan, table, right_column, left_pos, pushed[source], join_type)))
+            if walk is None and self._can_merge(first, left_pos, table, right_column):
+                right_ordered = self._estimate(IndexOrderScan(table, right_column, False, pushed[source]),
+                                               right_rows, right_stats.rows * INDEX_ROW_COST)
+                left_plan = plan
+                if ordered_on != left_pos:
+                    # Only the first join can switch the first table to key order
+                    left_plan = None
+                    if step == 1:
+                        left_plan = self._estimate(IndexOrderScan(first, first.column_names[left_pos], False,
+                                                                  pushed[first_source]),
+                                                   filtered, first_stats.rows * INDEX_ROW_COST)
+                if left_plan is not None:
+                    options.append((left_plan.cost + right_ordered.cost + (rows + right_rows) * MERGE_ROW_COST,
+                                    lambda left_plan=left_plan: MergeJoin(left_plan, right_ordered, left_pos,
+                                                                          right_pos, width, join_type)))
+            
+            cost, make = min(options, key=lambda option: option[0])
+            node = make()
+            node.estimated_rows = out
+            node.cost = cost
+            node.detail = f"on {sources[left_source][0]}.{left_column} = {sources[source][0]}.{right_column}"
+            if isinstance(node, MergeJoin):
+                ordered_on = left_pos
+            elif isinstance(node, HashJoin) and node.build_left:
+                ordered_on = None
+            plan = node
+            rows = out
+        
+        if order != sorted(order):
+            # Put the columns back in the query's table order
+            positions = []
+            for source in range(len(sources)):
+                offset = physical.offsets[order.index(source)]
+                positions.extend(range(offset, offset + len(sources[source][1].column_names)))
+            plan = self._estimate(Reorder(plan, positions), plan.estimated_rows,
+                                  plan.estimated_rows * CPU_ROW_COST)
+        return plan
+    
+    def _access_path(self, table: Table, conditions: Dict, stats: Statistics) -> Operator:
+        """Cheapest of a sequential scan and a key map or index lookup"""
+        rows = stats.rows * stats.selectivity(conditions)
+        row_cost = COLUMN_ROW_COST if table.layout == 'column' else SEQ_ROW_COST
+        scan = self._estimate(SeqScan(table, conditions), rows, stats.rows * row_cost)
+        column = self._lookup_column(table, conditions)
+        if column is None:
+            return scan
+        candidates = stats.rows * stats.column_selectivity(column, conditions[column])
+        lookup = self._estimate(IndexLookup(table, conditions), rows,
+                                INDEX_PROBE_COST + candidates * INDEX_ROW_COST)
+        if column in table.key_maps:
+            lookup.detail = f"using {'primary key' if column == table.primary_key else 'unique key'} {column}"
+        else:
+            lookup.detail = f"using {table.index_on(column).name}"
+        return lookup if lookup.cost < scan.cost else scan
+    
+    def _lookup_column(self, table: Table, conditions: Dict) -> Optional[str]:
+        """The column Table.lookup_positions() would use for the conditions"""
+        for column, value in conditions.items():
+            if column in table.key_maps and equality_values(value) is not None:
+                return column
+        for column, value in conditions.items():
+            if any(index.column_name == column and index.supports(value) for index in table.indexes.values()):
+                return column
+        return None
+    
+    def _group_estimate(self, rows: float, scope: GroupScope, sources: List, stats: List[Statistics]) -> float:
+        """Estimated number of groups"""
+        if not scope.group_positions:
+            return 1
+        groups = 1.0
+        for pos in scope.group_positions:
+            source = max(i for i, offset in enumerate(scope.scope.offsets) if offset <= pos)
+            column = sources[source][1].column_names[pos - scope.scope.offsets[source]]
+            distinct = stats[source].distinct(column)
+            groups *= distinct if distinct else max(rows / 10, 1)
+        return max(min(groups, rows), 1)
+    
+    def _can_merge(self, first: Table, left_pos: int, right: Table, right_column: str) -> bool:
+        """True if a join key can use a sort-merge join.
+        
+        The left key must be a column of the first table, both key columns
+        need a btree index, and their types must match.
+        """
+        if left_pos >= len(first.column_names):
+            return False
+        left_column = first.column_names[left_pos]
+        return (first.index_on(left_column, 'btree') is not None
+                and right.index_on(right_column, 'btree') is not None
+                and first.columns[left_pos]['type'] == right.columns[right.positions[right_column]]['type'])
+    
+    def _select_items(self, query: Dict) -> List[Tuple[Tuple, str]]:
+        """(expression, output name) for each entry of the select list"""
+        items = query.get('select_items')
+        if items is None:
+            names = query.get('columns')
+            items = [(('column', name), name) for name in names] if names else [(('star', None), '*')]
+        return items
+    
+    def _has_aggregate(self, expr: Tuple) -> bool:
+        if expr[0] == 'aggregate':
+            return True
+        if expr[0] == 'concat':
+            return any(self._has_aggregate(part) for part in expr[1])
+        return False
+    
+    def _having_position(self, scope: GroupScope, expr: Tuple) -> int:
+        """Position tested by a HAVING condition on an aggregate or name"""
+        if expr[0] == 'aggregate':
+            return scope.aggregate_position(expr)
+        if expr[0] == 'column':
+            return scope.output_position(expr[1])
+        raise ValueError("HAVING conditions must compare an aggregate, output name or grouped column")
+    
+    def _projection(self, scope: JoinScope, items: List[Tuple[Tuple, str]]) -> List[Tuple[str, Callable]]:
+        """(output name, value function) for each output column"""
+        outputs = []
+        for expr, name in items:
+            if expr[0] == 'star':
+                outputs.extend((column, itemgetter(pos)) for column, pos in scope.star(expr[1]))
+            else:
+                outputs.append((name, self._compile_expression(scope, expr)))
+        return outputs
+    
+    def _compile_expression(self, scope: JoinScope, expr: Tuple) -> Callable:
+        kind = expr[0]
+        if kind == 'column':
+            return itemgetter(scope.position(expr[1]))
+        if kind == 'aggregate':
+            return itemgetter(scope.aggregate_position(expr))
+        if kind == 'literal':
+            value = expr[1]
+            return lambda row: value
+        if kind == 'concat':
+            parts = [self._compile_expression(scope, part) for part in expr[1]]
+            
+            def concat(row):
+                values = [part(row) for part in parts]
+                # NULL || anything is NULL
+                if any(value is None for value in values):
+                    return None
+                return ''.join(str(value) for value in values)
+            return concat
+        raise ValueError(f"Unsupported expression: {kind}")
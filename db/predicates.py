@@ -0,0 +1,396 @@
+import operator
+import re
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# Comparison operators allowed in WHERE clauses
+COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+# The operator testing the opposite of each operator; NOT is pushed down
+# to single-column terms with these. As in SQL, NULL satisfies neither
+# side of a comparison.
+NEGATED_OPS: Dict[str, str] = {
+    '=': '!=',
+    '!=': '=',
+    '<': '>=',
+    '<=': '>',
+    '>': '<=',
+    '>=': '<',
+    'between': 'not between',
+    'not between': 'between',
+    'like': 'not like',
+    'not like': 'like',
+    'in': 'not in',
+    'not in': 'in',
+    'is null': 'is not null',
+    'is not null': 'is null',
+}
+
+
+class Predicate(NamedTuple):
+    """A WHERE condition on one column other than plain equality.
+    
+    op is a comparison operator, '[not] between' (value is a (low, high)
+    pair), '[not] like' (value is the pattern), '[not] in' (value is a
+    tuple of values) or 'is [not] null' (value is None).
+    """
+    op: str
+    value: Any
+    
+    def comparisons(self) -> List[Tuple[Callable[[Any, Any], bool], Any]]:
+        """(compare, operand) pairs that must all hold for a non-NULL value"""
+        op = self.op
+        if op == 'between':
+            low, high = self.value
+            return [(operator.ge, low), (operator.le, high)]
+        if op == 'not between':
+            return [(_outside, self.value)]
+        if op == 'like':
+            return [(_like_match, like_regex(self.value))]
+        if op == 'not like':
+            return [(_not_like_match, like_regex(self.value))]
+        if op == 'in':
+            return [(_contains, frozenset(v for v in self.value if v is not None))]
+        if op == 'not in':
+            if any(v is None for v in self.value):
+                # x NOT IN (..., NULL) is never true
+                return [(_never, None)]
+            return [(_not_contains, frozenset(self.value))]
+        if op == 'is null':
+            return [(_never, None)]
+        if op == 'is not null':
+            return []
+        return [(COMPARISONS[op], self.value)]
+    
+    def test(self) -> Callable[[Any], bool]:
+        """Value test; incomparable values never match, and NULLs only IS NULL"""
+        checks = self.comparisons()
+        null_matches = self.op == 'is null'
+        
+        def matches(value: Any) -> bool:
+            if value is None:
+                return null_matches
+            try:
+                return all(compare(value, operand) for compare, operand in checks)
+            except TypeError:
+                return False
+        return matches
+    
+    def negate(self) -> 'Predicate':
+        """The predicate matching the non-NULL values this one rejects"""
+        return Predicate(NEGATED_OPS[self.op], self.value)
+
+
+class Parameter(NamedTuple):
+    """A placeholder for a value bound when a prepared statement runs.
+    
+    key is the position of a ? placeholder or the name of a :name one.
+    """
+    key: Any
+    
+    def __repr__(self) -> str:
+        return '?' if isinstance(self.key, int) else f":{self.key}"
+
+
+class Or(NamedTuple):
+    """A disjunction in a conditions dict: true if any branch holds.
+    
+    Every branch is a conditions dict of its own. Since the branches can
+    test several columns, an Or is stored under its SQL text instead of a
+    column name.
+    """
+    terms: Tuple[Dict[str, Any], ...]
+
+
+def _like_match(value: Any, regex: 're.Pattern') -> bool:
+    return regex.match(value) is not None
+
+
+def _not_like_match(value: Any, regex: 're.Pattern') -> bool:
+    return regex.match(value) is None
+
+
+def _outside(value: Any, bounds: Tuple[Any, Any]) -> bool:
+    return not bounds[0] <= value <= bounds[1]
+
+
+def _contains(value: Any, values: frozenset) -> bool:
+    return value in values
+
+
+def _not_contains(value: Any, values: frozenset) -> bool:
+    return value not in values
+
+
+def _never(value: Any, operand: Any) -> bool:
+    return False
+
+
+def like_regex(pattern: str) -> 're.Pattern':
+    """Compile a LIKE pattern ('%' any run, '_' any character)"""
+    parts = ['.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern]
+    return re.compile(''.join(parts) + r'\Z', re.DOTALL)
+
+
+def like_prefix(pattern: str) -> Optional[str]:
+    """The literal prefix of a LIKE pattern of the form 'abc%', if it is one"""
+    if pattern.endswith('%') and not any(c in '%_' for c in pattern[:-1]):
+        return pattern[:-1]
+    return None
+
+
+def condition_terms(value: Any) -> List[Predicate]:
+    """Normalize a conditions dict value (plain value, Predicate or list)"""
+    if isinstance(value, Predicate):
+        return [value]
+    if isinstance(value, list):
+        return [term for item in value for term in condition_terms(item)]
+    return [Predicate('=', value)]
+
+
+def is_equality(value: Any) -> bool:
+    """True for a plain equality condition value"""
+    return not isinstance(value, (Predicate, Or, list))
+
+
+def equality_values(value: Any) -> Optional[List[Any]]:
+    """The values a key lookup must find for a plain equality or an IN
+    list, or None for other conditions"""
+    if is_equality(value):
+        return [value]
+    if isinstance(value, Predicate) and value.op == '=':
+        # Equality written as a predicate, as with a placeholder or NOT !=
+        return [value.value]
+    if isinstance(value, Predicate) and value.op == 'in':
+        return [v for v in value.value if v is not None]
+    return None
+
+
+def has_parameter(value: Any) -> bool:
+    """True if a condition or other part of a statement holds a placeholder"""
+    if isinstance(value, Parameter):
+        return True
+    if isinstance(value, dict):
+        return any(has_parameter(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(has_parameter(item) for item in value)
+    return False
+
+
+def bind_parameters(value: Any, values: Any) -> Any:
+    """A copy of part of a statement with each placeholder replaced by
+    values[key]; equality with a NULL value becomes IS NULL"""
+    if isinstance(value, Parameter):
+        return values[value.key]
+    if isinstance(value, Predicate):
+        bound = bind_parameters(value.value, values)
+        if value.op in ('=', '!=') and isinstance(value.value, Parameter):
+            if bound is None:
+                return Predicate('is null' if value.op == '=' else 'is not null', None)
+            if value.op == '=':
+                return bound
+        return Predicate(value.op, bound)
+    if isinstance(value, Or):
+        return Or(tuple(bind_parameters(branch, values) for branch in value.terms))
+    if isinstance(value, dict):
+        return {key: bind_parameters(item, values) for key, item in value.items()}
+    if isinstance(value, list):
+        return [bind_parameters(item, values) for item in value]
+    if isinstance(value, tuple):
+        return tuple(bind_parameters(item, values) for item in value)
+    return value
+
+
+def condition_columns(conditions: Dict[str, Any]) -> List[str]:
+    """Every column a conditions dict tests, including inside OR branches"""
+    columns = []
+    for key, value in conditions.items():
+        if isinstance(value, Or):
+            columns.extend(column for branch in value.terms for column in condition_columns(branch))
+        else:
+            columns.append(key)
+    return columns
+
+
+def rename_columns(conditions: Dict[str, Any], rename: Callable[[str], str]) -> Dict[str, Any]:
+    """A copy of a conditions dict with every column name mapped by rename"""
+    renamed = {}
+    for key, value in conditions.items():
+        if isinstance(value, Or):
+            renamed[key] = Or(tuple(rename_columns(branch, rename) for branch in value.terms))
+        else:
+            renamed[rename(key)] = value
+    return renamed
+
+
+def compile_conditions(conditions: Optional[Dict[str, Any]],
+                       position: Callable[[Any], int]) -> Callable[[Tuple], bool]:
+    """Compile a conditions dict into one row test.
+    
+    The tests become the body of a generated function with their operands
+    bound as closure variables, so a row is checked by straight-line
+    comparisons instead of a loop over the conditions. OR branches are
+    compiled the same way and called from it. position maps a condition
+    key to the row position it tests.
+    """
+    if not conditions:
+        return _always
+    constants: List[Any] = []
+    test = _conditions_source(conditions, position, constants)
+    return _matcher_factory(len(constants), test)(*constants)
+
+
+def compile_filter(conditions: Optional[Dict[str, Any]],
+                   position: Callable[[Any], int]) -> Callable[[List[Optional[Tuple]]], List[Tuple]]:
+    """Compile a conditions dict into a function returning the rows of a
+    list that satisfy it.
+    
+    The test is inlined into one list comprehension rather than called
+    per row. Empty (None) slots are skipped, and rows appended while it
+    runs are not scanned.
+    """
+    constants: List[Any] = []
+    test = _conditions_source(conditions, position, constants) if conditions else 'True'
+    return _filter_factory(len(constants), test)(*constants)
+
+
+def compile_projection(names: Sequence[str], positions: Sequence[int]) -> Callable[[List[Tuple]], List[Dict]]:
+    """Compile a function building a dict of each row tuple in a list,
+    mapping names[i] to the value at positions[i].
+    
+    Every dict is one dict display, which builds it several times faster
+    than dict(zip(names, row)).
+    """
+    return _projection_factory(tuple(names), tuple(positions))
+
+
+def _conditions_source(conditions: Dict[str, Any], position: Callable[[Any], int],
+                       constants: List[Any]) -> str:
+    """Python expression testing row against a conditions dict"""
+    clauses = []
+    for key, value in conditions.items():
+        if isinstance(value, Or):
+            calls = [f"{_constant(constants, compile_conditions(branch, position))}(row)"
+                     for branch in value.terms]
+            clauses.append('(' + ' or '.join(calls) + ')')
+        else:
+            field = f"row[{position(key)}]"
+            clauses.extend(_term_source(field, term, constants) for term in condition_terms(value))
+    return ' and '.join(clauses)
+
+
+@lru_cache(maxsize=256)
+def _matcher_factory(constant_count: int, test: str) -> Callable[..., Callable[[Tuple], bool]]:
+    """Compile a row test once per shape; operands are passed to the factory.
+    
+    Queries differing only in their operands share the generated code.
+    """
+    names = ', '.join(f"c{i}" for i in range(constant_count))
+    source = (f"def make({names}):\n"
+              f"    def matches(row):\n"
+              f"        try:\n"
+              f"            return {test}\n"
+              f"        except TypeError:\n"
+              f"            # Incomparable values never match\n"
+              f"            return False\n"
+              f"    return matches\n")
+    namespace: Dict[str, Any] = {}
+    exec(source, namespace)
+    return namespace['make']
+
+
+@lru_cache(maxsize=256)
+def _filter_factory(constant_count: int, test: str) -> Callable[..., Callable[[List], List[Tuple]]]:
+    """Compile a list filter once per shape, as _matcher_factory does"""
+    names = ', '.join(f"c{i}" for i in range(constant_count))
+    source = (f"def make({names}):\n"
+              f"    def matches(row):\n"
+              f"        try:\n"
+              f"            return {test}\n"
+              f"        except TypeError:\n"
+              f"            return False\n"
+              f"    def select(rows):\n"
+              f"        count = len(rows)\n"
+              f"        try:\n"
+              f"            return [row for row in islice(rows, count) if row is not None and {test}]\n"
+              f"        except TypeError:\n"
+              f"            # Incomparable values never match; test the rows one by one\n"
+              f"            return [row for row in islice(rows, count) if row is not None and matches(row)]\n"
+              f"    return select\n")
+    namespace: Dict[str, Any] = {'islice': islice}
+    exec(source, namespace)
+    return namespace['make']
+
+
+@lru_cache(maxsize=256)
+def _projection_factory(names: Tuple[str, ...], positions: Tuple[int, ...]) -> Callable[[List[Tuple]], List[Dict]]:
+    items = ', '.join(f"{name!r}: row[{pos}]" for name, pos in zip(names, positions))
+    namespace: Dict[str, Any] = {}
+    exec(f"def project(rows):\n    return [{{{items}}} for row in rows]\n", namespace)
+    return namespace['project']
+
+
+def _always(row: Tuple) -> bool:
+    return True
+
+
+def _constant(constants: List[Any], value: Any) -> str:
+    constants.append(value)
+    return f"c{len(constants) - 1}"
+
+
+def _term_source(field: str, term: Predicate, constants: List[Any]) -> str:
+    """Python expression testing one term against field"""
+    op, value = term
+    if op == '=':
+        # Plain equality, which also lets "= NULL" find NULLs
+        return f"{field} == {_constant(constants, value)}"
+    if op == 'is null':
+        return f"{field} is None"
+    if op == 'is not null':
+        return f"{field} is not None"
+    if op == 'in':
+        return f"{field} in {_constant(constants, term.comparisons()[0][1])}"
+    if op in COMPARISONS:
+        test = f"{field} {op} {_constant(constants, value)}"
+    elif op in ('between', 'not between'):
+        low, high = _constant(constants, value[0]), _constant(constants, value[1])
+        test = f"{'not ' if op == 'not between' else ''}{low} <= {field} <= {high}"
+    elif op in ('like', 'not like'):
+        regex = _constant(constants, like_regex(value))
+        test = f"{regex}.match({field}) is {'not ' if op == 'like' else ''}None"
+    else:
+        compare, operand = term.comparisons()[0]
+        test = f"{_constant(constants, compare)}({field}, {_constant(constants, operand)})"
+    return f"({field} is not None and {test})"
+
+
+def format_condition(column: str, value: Any) -> str:
+    """SQL text of one conditions dict entry, for EXPLAIN output"""
+    if isinstance(value, Or):
+        return '(' + ' OR '.join(format_conditions(branch) for branch in value.terms) + ')'
+    parts = []
+    for term in condition_terms(value):
+        op = term.op.upper()
+        if term.op in ('between', 'not between'):
+            parts.append(f"{column} {op} {term.value[0]!r} AND {term.value[1]!r}")
+        elif term.op in ('in', 'not in'):
+            parts.append(f"{column} {op} ({', '.join(repr(v) for v in term.value)})")
+        elif term.op in ('is null', 'is not null'):
+            parts.append(f"{column} {op}")
+        else:
+            parts.append(f"{column} {op} {term.value!r}")
+    return ' AND '.join(parts)
+
+
+def format_conditions(conditions: Dict[str, Any]) -> str:
+    return ' AND '.join(format_condition(column, value) for column, value in conditions.items())
@@ -0,0 +1,216 @@
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Wire protocol of the database server (server.py) and its client
+# (client.py). Every message is a frame:
+#
+#   <uint32 payload length><uint8 message type><payload>
+#
+# The client sends one request at a time and reads the frames of the
+# reply up to its last one, which starts with the session's transaction
+# status. A SELECT reply is a ROW_DESCRIPTION (unless there are no rows),
+# DATA_ROWS frames of up to ROWS_PER_FRAME rows each, and COMPLETE; other
+# statements reply with STATUS, PREPARE with PREPARED, and failures with
+# ERROR. CLOSE has no reply.
+#
+# Values are a type tag byte followed by the value: nothing for NULL and
+# booleans, 8 bytes for ints and floats, and a length-prefixed UTF-8 string
+# for text (and for ints too big for 8 bytes, as decimal digits).
+
+DEFAULT_PORT = 5480
+
+# Client requests
+QUERY = ord('Q')        # sql
+PREPARE = ord('P')      # sql
+EXECUTE = ord('X')      # statement id, params
+BATCH = ord('B')        # statement id, count, params...
+CLOSE = ord('C')        # statement id
+
+# Server replies
+ROW_DESCRIPTION = ord('T')  # column names
+DATA_ROWS = ord('D')        # count, rows...
+COMPLETE = ord('K')         # status, row count
+STATUS = ord('S')           # status, message
+PREPARED = ord('p')         # status, statement id
+ERROR = ord('E')            # status, message
+
+# Transaction status of the session after a request
+IDLE = ord('I')
+IN_TRANSACTION = ord('T')
+
+# Rows per DATA_ROWS frame
+ROWS_PER_FRAME = 1000
+
+# Largest payload either side accepts
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+# Parameter kinds of EXECUTE and BATCH
+NO_PARAMS, POSITIONAL, NAMED = 0, 1, 2
+
+HEADER = struct.Struct('>IB')
+U8 = struct.Struct('>B')
+U16 = struct.Struct('>H')
+U32 = struct.Struct('>I')
+INT = struct.Struct('>q')
+FLOAT = struct.Struct('>d')
+
+NULL, TRUE, FALSE = b'N', b'T', b'F'
+INT_TAG, BIG_INT_TAG, FLOAT_TAG, TEXT_TAG = b'i', b'I', b'd', b's'
+
+
+class ProtocolError(Exception):
+    """A malformed frame; the connection cannot be used any further"""
+
+
+def frame(message_type: int, payload: bytes = b'') -> bytes:
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Message of {len(payload)} bytes is over the {MAX_PAYLOAD} byte limit")
+    return HEADER.pack(len(payload), message_type) + payload
+
+
+def read_header(header: bytes) -> Tuple[int, int]:
+    """(payload length, message type) of a frame header"""
+    length, message_type = HEADER.unpack(header)
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"Message of {length} bytes is over the {MAX_PAYLOAD} byte limit")
+    return length, message_type
+
+
+def pack_text(text: str) -> bytes:
+    data = text.encode('utf-8')
+    return U32.pack(len(data)) + data
+
+
+def pack_value(value: Any) -> bytes:
+    if value is None:
+        return NULL
+    if value is True:
+        return TRUE
+    if value is False:
+        return FALSE
+    if isinstance(value, int):
+        if -2 ** 63 <= value < 2 ** 63:
+            return INT_TAG + INT.pack(value)
+        return BIG_INT_TAG + pack_text(str(value))
+    if isinstance(value, float):
+        return FLOAT_TAG + FLOAT.pack(value)
+    if isinstance(value, str):
+        return TEXT_TAG + pack_text(value)
+    raise ValueError(f"Cannot send a value of type {type(value).__name__}")
+
+
+def pack_values(values: Sequence) -> bytes:
+    return U16.pack(len(values)) + b''.join([pack_value(value) for value in values])
+
+
+def pack_params(params: Any) -> bytes:
+    """A sequence of values for ? placeholders, a mapping for :name ones,
+    or None"""
+    if params is None:
+        return U8.pack(NO_PARAMS)
+    if isinstance(params, dict):
+        return (U8.pack(NAMED) + U16.pack(len(params))
+                + b''.join([pack_text(name) + pack_value(value) for name, value in params.items()]))
+    return U8.pack(POSITIONAL) + pack_values(params)
+
+
+def pack_rows(rows: List[Sequence]) -> bytes:
+    return U32.pack(len(rows)) + b''.join([pack_values(row) for row in rows])
+
+
+def pack_names(names: Sequence[str]) -> bytes:
+    return U16.pack(len(names)) + b''.join([pack_text(name) for name in names])
+
+
+def pack_status(in_transaction: bool) -> bytes:
+    return U8.pack(IN_TRANSACTION if in_transaction else IDLE)
+
+
+def error_frame(message: str, in_transaction: bool) -> bytes:
+    return frame(ERROR, pack_status(in_transaction) + pack_text(message))
+
+
+def status_frame(message: str, in_transaction: bool) -> bytes:
+    return frame(STATUS, pack_status(in_transaction) + pack_text(message))
+
+
+def result_frames(rows: List[Dict], names: Optional[List[str]]) -> bytes:
+    """ROW_DESCRIPTION (first batch only, given names) and DATA_ROWS frames
+    for a batch of result rows"""
+    chunks = [frame(ROW_DESCRIPTION, pack_names(names))] if names is not None else []
+    for start in range(0, len(rows), ROWS_PER_FRAME):
+        chunk = rows[start:start + ROWS_PER_FRAME]
+        chunks.append(frame(DATA_ROWS, pack_rows([tuple(row.values()) for row in chunk])))
+    return b''.join(chunks)
+
+
+class Reader:
+    """Unpacks the fields of a payload in order"""
+    
+    def __init__(self, payload: bytes):
+        self.data = memoryview(payload)
+        self.offset = 0
+    
+    def _take(self, size: int) -> memoryview:
+        end = self.offset + size
+        if end > len(self.data):
+            raise ProtocolError("Message ends in the middle of a field")
+        chunk = self.data[self.offset:end]
+        self.offset = end
+        return chunk
+    
+    def u8(self) -> int:
+        return self._take(1)[0]
+    
+    def u16(self) -> int:
+        return U16.unpack(self._take(2))[0]
+    
+    def u32(self) -> int:
+        return U32.unpack(self._take(4))[0]
+    
+    def text(self) -> str:
+        try:
+            return str(self._take(self.u32()), 'utf-8')
+        except UnicodeDecodeError:
+            raise ProtocolError("Text is not valid UTF-8")
+    
+    def value(self) -> Any:
+        tag = bytes(self._take(1))
+        if tag == NULL:
+            return None
+        if tag == TRUE:
+            return True
+        if tag == FALSE:
+            return False
+        if tag == INT_TAG:
+            return INT.unpack(self._take(8))[0]
+        if tag == FLOAT_TAG:
+            return FLOAT.unpack(self._take(8))[0]
+        if tag == TEXT_TAG:
+            return self.text()
+        if tag == BIG_INT_TAG:
+            return int(self.text())
+        raise ProtocolError(f"Unknown value tag {tag!r}")
+    
+    def values(self) -> Tuple:
+        return tuple([self.value() for _ in range(self.u16())])
+    
+    def params(self) -> Optional[Any]:
+        kind = self.u8()
+        if kind == NO_PARAMS:
+            return None
+        if kind == POSITIONAL:
+            return self.values()
+        if kind == NAMED:
+            return {self.text(): self.value() for _ in range(self.u16())}
+        raise ProtocolError(f"Unknown parameter kind {kind}")
+    
+    def rows(self) -> List[Tuple]:
+        return [self.values() for _ in range(self.u32())]
+    
+    def names(self) -> List[str]:
+        return [self.text() for _ in range(self.u16())]
+    
+    def end(self):
+        if self.offset != len(self.data):
+            raise ProtocolError("Message has trailing bytes")
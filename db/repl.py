@@ -29,6 +29,9 @@ class DatabaseREPL(cmd.Cmd):
         """Handle SQL queries"""
         try:
             parsed = self.parser.parse(line)
+            if parsed['type'] == 'select':
+                self._print_rows(self.executor.stream(parsed))
+                return
             result = self.executor.execute(parsed)
             
             if isinstance(result, list):
@@ -49,6 +52,23 @@ class DatabaseREPL(cmd.Cmd):
         except Exception as e:
             print(f"Error: {e}")
     
+    def _print_rows(self, rows):
+        """Print result rows as they arrive from the executor"""
+        headers = None
+        count = 0
+        for row in rows:
+            if headers is None:
+                headers = list(row.keys())
+                print("\t".join(headers))
+                print("-" * 50)
+            print("\t".join(str(row.get(h, '')) for h in headers))
+            count += 1
+        
+        if count:
+            print(f"\n{count} row(s) returned")
+        else:
+            print("No rows found")
+    
     def do_tables(self, arg):
         """List all tables"""
         tables = list(self.executor.storage.tables.keys())
@@ -68,16 +88,31 @@ class DatabaseREPL(cmd.Cmd):
         table_name = arg.strip()
         table = self.executor.storage.tables.get(table_name)
         
-        if not table:
+        if table is None:
             print(f"Table '{table_name}' not found")
             return
         
-        print(f"Table: {table.name}")
+        print(f"Table: {table.name} ({table.layout} storage)")
         print("Columns:")
         for col in table.columns:
             pk = " (PK)" if col['name'] == table.primary_key else ""
             unique = " (UNIQUE)" if col['name'] in table.unique_keys else ""
             print(f"  {col['name']}: {col['type']}{pk}{unique}")
+        if table.indexes:
+            print("Indexes:")
+            for index in table.indexes.values():
+                print(f"  {index.name} ({index.column_name}, {index.kind})")
+    
+    def do_stats(self, arg):
+        """Show buffer pool page statistics"""
+        stats = self.executor.storage.buffer_pool.stats()
+        print("Buffer pool:")
+        print(f"  pages resident: {stats['resident']}/{stats['capacity']} ({stats['dirty']} dirty)")
+        print(f"  hits:           {stats['hits']}")
+        print(f"  misses:         {stats['misses']}")
+        print(f"  hit ratio:      {stats['hit_ratio']:.1%}")
+        print(f"  evictions:      {stats['evictions']}")
+        print(f"  page writes:    {stats['page_writes']}")
     
     def do_exit(self, arg):
         """Exit the REPL"""
@@ -98,7 +133,10 @@ def main():
     
     # Start REPL
     repl = DatabaseREPL(parser, executor)
-    repl.cmdloop()
+    try:
+        repl.cmdloop()
+    finally:
+        storage.close()
 
 
 if __name__ == "__main__":
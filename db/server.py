@@ -0,0 +1,228 @@
+import argparse
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Add parent directory to path to import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import protocol
+from db.executor import Executor
+from db.parser import Parser, PreparedStatement
+from db.protocol import ProtocolError, Reader
+from db.storage import Storage
+
+# Rows of a SELECT result sent before waiting for the client to read them
+ROWS_PER_BATCH = 10 * protocol.ROWS_PER_FRAME
+
+
+class Session:
+    """One client connection: its executor, prepared statements and open
+    result, and the thread its statements run in.
+    
+    Locks and transactions belong to the thread that took them, so one
+    thread serves the connection for its whole life; the event loop only
+    moves frames. Every method but run() is called in that thread.
+    """
+    
+    def __init__(self, storage: Storage, parser: Parser, copy_dir: str):
+        self.parser = parser
+        self.executor = Executor(storage, parser=parser, copy_dir=copy_dir)
+        self.statements: Dict[int, PreparedStatement] = {}
+        self.next_id = 1
+        # Rows of the SELECT being sent, and how many were sent so far
+        self.rows: Optional[Iterator[Dict]] = None
+        self.sent = 0
+        self.thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-session')
+    
+    async def run(self, function: Callable, *args) -> Any:
+        """Call a function in the session's thread"""
+        return await asyncio.get_running_loop().run_in_executor(self.thread, partial(function, *args))
+    
+    def in_transaction(self) -> bool:
+        return self.executor.transaction is not None
+    
+    def request(self, message_type: int, payload: bytes) -> Tuple[bytes, bool]:
+        """Handle a request: the frames to send, and whether rows of a
+        SELECT follow (see next_rows())"""
+        reader = Reader(payload)
+        try:
+            if message_type == protocol.QUERY:
+                sql = reader.text()
+                reader.end()
+                return self._start(self.parser.parse(sql), None)
+            if message_type == protocol.PREPARE:
+                sql = reader.text()
+                reader.end()
+                return self._prepare(sql), False
+            if message_type == protocol.EXECUTE:
+                statement = self._statement(reader.u32())
+                params = reader.params()
+                reader.end()
+                return self._start(statement, params)
+            if message_type == protocol.BATCH:
+                statement = self._statement(reader.u32())
+                seq_of_params = [reader.params() for _ in range(reader.u32())]
+                reader.end()
+                results = self.executor.executemany(statement, seq_of_params)
+                return self._status(f"{len(results)} statement(s) executed"), False
+            raise ProtocolError(f"Unknown request type {message_type}")
+        except ProtocolError:
+            raise
+        except Exception as e:
+            return protocol.error_frame(str(e), self.in_transaction()), False
+    
+    def _prepare(self, sql: str) -> bytes:
+        statement = self.executor.prepare(sql)
+        statement_id = self.next_id
+        self.next_id += 1
+        self.statements[statement_id] = statement
+        return protocol.frame(protocol.PREPARED, protocol.pack_status(self.in_transaction())
+                              + protocol.U32.pack(statement_id))
+    
+    def _statement(self, statement_id: int) -> PreparedStatement:
+        statement = self.statements.get(statement_id)
+        if statement is None:
+            raise ValueError(f"No prepared statement with id {statement_id}")
+        return statement
+    
+    def close_statement(self, statement_id: int):
+        self.statements.pop(statement_id, None)
+    
+    def _start(self, query: Any, params: Any) -> Tuple[bytes, bool]:
+        parsed = query.parsed if isinstance(query, PreparedStatement) else query
+        if parsed['type'] == 'select':
+            # Planned here, so errors are replied before any row
+            self.rows = self.executor.stream(query, params)
+            self.sent = 0
+            return b'', True
+        result = self.executor.execute(query, params)
+        return self._status(str(result)), False
+    
+    def _status(self, message: str) -> bytes:
+        return protocol.status_frame(message, self.in_transaction())
+    
+    def next_rows(self) -> Tuple[bytes, bool]:
+        """The frames of the next batch of result rows, and whether that
+        was the end of the reply"""
+        try:
+            batch = list(islice(self.rows, ROWS_PER_BATCH))
+        except Exception as e:
+            self.close_rows()
+            return protocol.error_frame(str(e), self.in_transaction()), True
+        names = list(batch[0]) if batch and not self.sent else None
+        frames = protocol.result_frames(batch, names)
+        self.sent += len(batch)
+        if len(batch) == ROWS_PER_BATCH:
+            return frames, False
+        self.close_rows()
+        return frames + protocol.frame(protocol.COMPLETE, protocol.pack_status(self.in_transaction())
+                                       + protocol.U32.pack(self.sent)), True
+    
+    def close_rows(self):
+        """Close the result being sent, releasing its locks and snapshot"""
+        if self.rows is not None:
+            self.rows.close()
+            self.rows = None
+    
+    def close(self):
+        """End the session: a result being sent is closed, and a
+        transaction left open rolled back"""
+        self.close_rows()
+        if self.in_transaction():
+            self.executor.execute({'type': 'rollback'})
+
+
+class Server:
+    """asyncio TCP server speaking the protocol in protocol.py, with a
+    session per connection over one shared Storage"""
+    
+    def __init__(self, storage: Storage, host: str = '127.0.0.1', port: int = protocol.DEFAULT_PORT,
+                 copy_dir: Optional[str] = None):
+        self.storage = storage
+        self.host = host
+        self.port = port
+        # The only directory COPY may use: clients must not reach the
+        # database files, or anything else the server can read and write
+        self.copy_dir = copy_dir or os.path.join(storage.data_dir, 'files')
+        os.makedirs(self.copy_dir, exist_ok=True)
+        self.parser = Parser()
+        self.server: Optional[asyncio.AbstractServer] = None
+    
+    async def start(self) -> List[Tuple]:
+        """Start listening; return the addresses listened on"""
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        return [sock.getsockname() for sock in self.server.sockets]
+    
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+    
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one connection until the client closes it"""
+        session = Session(self.storage, self.parser, self.copy_dir)
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(protocol.HEADER.size)
+                except asyncio.IncompleteReadError:
+                    # Disconnected between requests
+                    break
+                length, message_type = protocol.read_header(header)
+                payload = await reader.readexactly(length)
+                if message_type == protocol.CLOSE:
+                    statement_reader = Reader(payload)
+                    await session.run(session.close_statement, statement_reader.u32())
+                    continue
+                
+                frames, rows = await session.run(session.request, message_type, payload)
+                writer.write(frames)
+                while rows:
+                    # Waiting for the client to read each batch keeps a
+                    # large result from piling up in memory
+                    await writer.drain()
+                    frames, done = await session.run(session.next_rows)
+                    writer.write(frames)
+                    rows = not done
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ProtocolError):
+            pass
+        finally:
+            await session.run(session.close)
+            session.thread.shutdown(wait=False)
+            writer.close()
+
+
+def main():
+    """Run the database server"""
+    arg_parser = argparse.ArgumentParser(description="PesaPal JuniorDB server")
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=protocol.DEFAULT_PORT)
+    arg_parser.add_argument('--data-dir', default='data')
+    arg_parser.add_argument('--copy-dir', help="directory for COPY files (default: <data-dir>/files)")
+    args = arg_parser.parse_args()
+    
+    storage = Storage(args.data_dir)
+    server = Server(storage, args.host, args.port, args.copy_dir)
+    
+    async def serve():
+        for address in await server.start():
+            print(f"PesaPal JuniorDB listening on {address[0]}:{address[1]}")
+        await server.serve_forever()
+    
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import heapq
+import pickle
+import sys
+import tempfile
+from typing import Any, Callable, IO, Iterable, Iterator, List, Optional, Tuple
+
+# Sorting result rows. ORDER BY ... LIMIT k keeps only the best k rows in a
+# bounded heap, and larger sorts are split into sorted runs that spill to
+# temp files once they exceed the memory budget and are merged back lazily.
+# All sorts are stable, so equal keys keep their input order.
+
+# Default memory for one sort before runs spill to disk
+DEFAULT_WORK_MEM = 64 * 1024 * 1024
+
+# Rows per pickle record in a spilled run
+RUN_BATCH = 1024
+
+
+def nulls_first(pos: int) -> Callable[[Any], tuple]:
+    """Sort key on one row position, ordering NULLs before every value"""
+    return lambda row: (row[pos] is not None, row[pos])
+
+
+class Descending:
+    """Sort key wrapper that orders the keys it wraps in reverse"""
+    __slots__ = ('key',)
+    
+    def __init__(self, key: Any):
+        self.key = key
+    
+    def __lt__(self, other: 'Descending') -> bool:
+        return other.key < self.key
+    
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Descending) and self.key == other.key
+
+
+def order_key(keys: List[Tuple[int, bool]]) -> Tuple[Callable[[Any], Any], bool]:
+    """Sort key and direction for ORDER BY on (position, descending) pairs.
+    
+    Each position sorts like nulls_first(), so NULLs come first going up
+    and last going down. Keys all in one direction sort on a plain tuple;
+    only mixed directions wrap the descending ones.
+    """
+    if len(keys) == 1:
+        pos, descending = keys[0]
+        return nulls_first(pos), descending
+    positions = [pos for pos, _ in keys]
+    directions = {descending for _, descending in keys}
+    if len(directions) == 1:
+        return lambda row: tuple([(row[pos] is not None, row[pos]) for pos in positions]), directions.pop()
+    
+    def key(row: Any) -> tuple:
+        return tuple([Descending((row[pos] is not None, row[pos])) if descending
+                      else (row[pos] is not None, row[pos]) for pos, descending in keys])
+    return key, False
+
+
+def sort_rows(rows: Iterable, key: Callable, descending: bool = False,
+              limit: Optional[int] = None, memory_budget: Optional[int] = None) -> Iterator:
+    """Sorted rows: top-k when limit is given, else external when over budget"""
+    if limit is not None:
+        return iter(top_k(rows, key, limit, descending))
+    if memory_budget is not None:
+        return external_sort(rows, key, descending, memory_budget)
+    return iter(sorted(rows, key=key, reverse=descending))
+
+
+def top_k(rows: Iterable, key: Callable, k: int, descending: bool = False) -> List:
+    """The first k rows of the sorted input, in O(n log k) with k rows held"""
+    if k <= 0:
+        return []
+    if descending:
+        return heapq.nlargest(k, rows, key=key)
+    return heapq.nsmallest(k, rows, key=key)
+
+
+def row_size(row: Any) -> int:
+    """Approximate memory held by a row tuple or dict"""
+    values = row.values() if isinstance(row, dict) else row
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+
+
+def external_sort(rows: Iterable, key: Callable, descending: bool = False,
+                  memory_budget: int = DEFAULT_WORK_MEM, sample: int = 64,
+                  temp_dir: Optional[str] = None) -> Iterator:
+    """Sort with bounded memory by spilling sorted runs to temp files.
+    
+    The run length is set from the size of the first sample rows. Input
+    that fits in one run is sorted in memory and nothing is written.
+    """
+    run: List = []
+    run_length = None
+    runs: List[IO[bytes]] = []
+    try:
+        for row in rows:
+            run.append(row)
+            if run_length is None and len(run) == sample:
+                average = sum(row_size(r) for r in run) / sample
+                run_length = max(sample, int(memory_budget // average))
+            if run_length is not None and len(run) >= run_length:
+                run.sort(key=key, reverse=descending)
+                runs.append(_spill(run, temp_dir))
+                run = []
+        
+        run.sort(key=key, reverse=descending)
+        if not runs:
+            yield from run
+            return
+        # Earlier runs hold earlier rows, and merge prefers them on ties
+        sources = [_read_run(f) for f in runs] + [iter(run)]
+        yield from heapq.merge(*sources, key=key, reverse=descending)
+    finally:
+        for f in runs:
+            f.close()
+
+
+def _spill(run: List, temp_dir: Optional[str]) -> IO[bytes]:
+    f = tempfile.TemporaryFile(prefix='sort-run-', dir=temp_dir)
+    for i in range(0, len(run), RUN_BATCH):
+        pickle.dump(run[i:i + RUN_BATCH], f, protocol=pickle.HIGHEST_PROTOCOL)
+    f.seek(0)
+    return f
+
+
+def _read_run(f: IO[bytes]) -> Iterator:
+    while True:
+        try:
+            batch = pickle.load(f)
+        except EOFError:
+            return
+        yield from batch
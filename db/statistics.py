@@ -0,0 +1,172 @@
+import random
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from .mvcc import is_current
+
+# Column statistics gathered by ANALYZE from a random sample of rows, so the
+# cost is bounded regardless of table size. The planner turns them into
+# selectivity estimates for conditions no index can count exactly.
+
+# Rows sampled per table
+SAMPLE_SIZE = 30000
+# Most common values kept per column, and histogram buckets
+MCV_LIMIT = 10
+HISTOGRAM_BUCKETS = 100
+
+# Tables are re-analyzed once this many rows plus this fraction of the
+# table changed since the statistics were gathered
+ANALYZE_THRESHOLD = 50
+ANALYZE_SCALE_FACTOR = 0.1
+
+class ColumnStats:
+    """Statistics of one column.
+    
+    Fractions are of all rows. mcvs holds (value, fraction) pairs for the
+    most common values, and histogram the bounds of equal-depth buckets over
+    the other non-NULL values.
+    """
+    
+    def __init__(self, null_frac: float = 0.0, n_distinct: float = 0.0,
+                 min_value: Any = None, max_value: Any = None,
+                 mcvs: Optional[List[List]] = None, histogram: Optional[List] = None):
+        self.null_frac = null_frac
+        self.n_distinct = n_distinct
+        self.min_value = min_value
+        self.max_value = max_value
+        self.mcvs = mcvs or []
+        self.histogram = histogram or []
+    
+    def to_dict(self) -> Dict:
+        return {
+            'null_frac': self.null_frac,
+            'n_distinct': self.n_distinct,
+            'min': self.min_value,
+            'max': self.max_value,
+            'mcvs': self.mcvs,
+            'histogram': self.histogram
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ColumnStats':
+        return cls(data['null_frac'], data['n_distinct'], data.get('min'), data.get('max'),
+                   data.get('mcvs'), data.get('histogram'))
+    
+    def _other_fraction(self) -> float:
+        """Fraction of rows that are neither NULL nor a most common value"""
+        return max(1.0 - self.null_frac - sum(frac for _, frac in self.mcvs), 0.0)
+    
+    def equal_fraction(self, value: Any) -> float:
+        """Estimated fraction of rows equal to value"""
+        if value is None:
+            return 0.0
+        for mcv, frac in self.mcvs:
+            if mcv == value:
+                return frac
+        others = self.n_distinct - len(self.mcvs)
+        if others < 1:
+            return 0.0
+        return self._other_fraction() / others
+    
+    def test_fraction(self, test: Callable[[Any], bool]) -> Optional[float]:
+        """Estimated fraction of rows whose value passes test, or None when
+        there is no histogram to estimate the values outside the MCVs with"""
+        result = sum(frac for value, frac in self.mcvs if test(value))
+        other = self._other_fraction()
+        if other > 0:
+            if not self.histogram:
+                return None
+            passing = sum(1 for bound in self.histogram if test(bound))
+            result += other * passing / len(self.histogram)
+        return min(result, 1.0)
+
+class TableStats:
+    """Statistics of a table as of its last ANALYZE"""
+    
+    def __init__(self, row_count: int, columns: Dict[str, ColumnStats],
+                 sample_size: int = 0, analyzed_at: Optional[float] = None):
+        self.row_count = row_count
+        self.columns = columns
+        self.sample_size = sample_size
+        self.analyzed_at = analyzed_at or time.time()
+    
+    def to_dict(self) -> Dict:
+        return {
+            'row_count': self.row_count,
+            'sample_size': self.sample_size,
+            'analyzed_at': self.analyzed_at,
+            'columns': {name: stats.to_dict() for name, stats in self.columns.items()}
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'TableStats':
+        columns = {name: ColumnStats.from_dict(stats) for name, stats in data['columns'].items()}
+        return cls(data['row_count'], columns, data.get('sample_size', 0), data.get('analyzed_at'))
+    
+    def is_stale(self, row_count: int, changes: int) -> bool:
+        """True once enough rows changed for the statistics to be refreshed"""
+        changed = max(changes, abs(row_count - self.row_count))
+        return changed > ANALYZE_THRESHOLD + ANALYZE_SCALE_FACTOR * self.row_count
+
+
+def sample_rows(table: Any, size: int = SAMPLE_SIZE) -> List:
+    """A uniform random sample of up to size live rows of a table"""
+    slots = table.slot_count()
+    if slots <= size and not table.free_slots and not table.versions:
+        return [row for _, row in table.scan()]
+    free = set(table.free_slots)
+    versions = table.versions
+    positions = random.sample(range(slots), min(slots, size))
+    return [table.row(i) for i in sorted(positions)
+            if i not in free and is_current(versions.get(i))]
+
+
+def analyze_table(table: Any, sample_size: int = SAMPLE_SIZE) -> TableStats:
+    """Gather statistics for every column of a table from a row sample"""
+    rows = sample_rows(table, sample_size)
+    total = len(table)
+    columns = {name: analyze_column([row[pos] for row in rows], total)
+               for pos, name in enumerate(table.column_names)}
+    return TableStats(total, columns, len(rows))
+
+
+def analyze_column(values: List, total: int) -> ColumnStats:
+    """Statistics of one column from its sampled values; total is the
+    number of rows in the table"""
+    n = len(values)
+    if not n:
+        return ColumnStats()
+    counts = Counter(value for value in values if value is not None)
+    nonnull = sum(counts.values())
+    null_frac = (n - nonnull) / n
+    if not nonnull:
+        return ColumnStats(null_frac=null_frac)
+    
+    distinct = len(counts)
+    if n >= total:
+        n_distinct = float(distinct)
+    else:
+        # Haas and Stokes' Duj1 estimator, scaled to the non-NULL rows
+        population = total * (1 - null_frac)
+        singles = sum(1 for count in counts.values() if count == 1)
+        n_distinct = nonnull * distinct / (nonnull - singles + singles * nonnull / population)
+        n_distinct = min(max(n_distinct, distinct), population)
+    
+    # Values clearly more common than average are kept with their frequency
+    average = nonnull / distinct
+    mcvs = [[value, count / n] for value, count in counts.most_common(MCV_LIMIT)
+            if count > 1 and (count > 1.25 * average or distinct <= MCV_LIMIT)]
+    common = {value for value, _ in mcvs}
+    
+    try:
+        ordered = sorted(counts)
+        others = sorted(value for value in values if value is not None and value not in common)
+    except TypeError:
+        # Values of mixed types have no order
+        return ColumnStats(null_frac, n_distinct, mcvs=mcvs)
+    histogram = []
+    if others:
+        buckets = max(min(HISTOGRAM_BUCKETS, len(others) - 1), 1)
+        histogram = [others[i * (len(others) - 1) // buckets] for i in range(buckets + 1)]
+    return ColumnStats(null_frac, n_distinct, ordered[0], ordered[-1], mcvs, histogram)
@@ -1,19 +1,609 @@
 import json
 import os
 import pickle
+import struct
+import threading
+import time
+import zlib
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Tuple
-import csv
+from typing import Callable, ContextManager, Dict, List, Any, Iterable, Optional, Sequence, Set, Tuple, Iterator
+import sys
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+
+from .index import Index, IndexManager, OrderedIndex
+from .locks import LockManager
+from .mvcc import COLLECT_INTERVAL, FROZEN, Snapshot, TransactionManager, Version, is_current
+from .predicates import (Or, compile_conditions, compile_filter, compile_projection, condition_terms,
+                         equality_values)
+from .join import JOIN_TYPES, hash_join, merge_join
+from .sort import order_key, sort_rows
+from .columnar import MASK_OPS, all_mask, and_masks, make_column, mask_positions, not_mask, or_masks
+from .pager import BufferPool, CheckpointJournal, HeapFile
+from .statistics import ANALYZE_THRESHOLD, TableStats, analyze_table
+
+# Commit durability modes, from safest to fastest:
+#   sync  - fsync the log before every commit returns
+#   group - commits wait for a shared fsync issued every group_commit_ms
+#   async - commits return immediately; a background thread flushes the log
+DURABILITY_MODES = ('sync', 'group', 'async')
+
+# Leaves a change in the log buffer for a later commit to make durable;
+# used inside batches, which commit once at the end
+DEFERRED = 'deferred'
+
+# Rows handled at a time by Table.insert_many()
+INSERT_BATCH_ROWS = 10000
+
+# Index entries read per hold of a table's latch by Table.ordered_scan()
+ORDERED_SCAN_PAGE = 1024
+
+# Seconds a transaction waits for the write lock of a table before giving
+# up, which also breaks deadlocks between transactions
+LOCK_TIMEOUT = 10.0
+
+# Seconds a background checkpoint waits for running statements to finish,
+# and between attempts when it could not finish
+CHECKPOINT_WAIT = 1.0
+CHECKPOINT_RETRY = 1.0
+
+# Conversions of non-NULL values to each column type, as in _validate_row
+VALUE_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    'int': int,
+    'float': float,
+    'varchar': str,
+    'boolean': bool,
+}
+
+class WriteAheadLog:
+    """Append-only log of row changes, replayed on startup"""
+    
+    # Each record is framed as <payload length><crc32 of payload><payload>
+    HEADER = struct.Struct('>II')
+    
+    def __init__(self, path: str, group_commit_ms: int = 10):
+        self.path = path
+        self.file = open(path, 'ab')
+        self.last_lsn = 0
+        self.synced_lsn = 0
+        self.group_commit_interval = group_commit_ms / 1000
+        self.lock = threading.Lock()
+        self.synced = threading.Condition(self.lock)
+        self.flusher: Optional[threading.Thread] = None
+        self.closed = False
+    
+    def append(self, record: Tuple) -> int:
+        """Append a record and return its log sequence number"""
+        with self.lock:
+            self.last_lsn += 1
+            payload = pickle.dumps((self.last_lsn,) + record, protocol=pickle.HIGHEST_PROTOCOL)
+            self.file.write(self.HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            return self.last_lsn
+    
+    def commit(self, lsn: int, durability: str = 'sync'):
+        """Make the log durable up to lsn according to the durability mode"""
+        if durability == 'sync':
+            self.sync()
+        elif durability == 'group':
+            self._start_flusher()
+            with self.lock:
+                while self.synced_lsn < lsn and not self.closed:
+                    self.synced.wait()
+        elif durability == 'async':
+            self._start_flusher()
+        elif durability != DEFERRED:
+            raise ValueError(f"Unknown durability mode '{durability}'")
+    
+    def sync(self):
+        """Flush buffered records and fsync the log file"""
+        with self.lock:
+            target = self.last_lsn
+            if self.synced_lsn >= target or self.closed:
+                return
+            self.file.flush()
+            fd = self.file.fileno()
+        
+        # fsync outside the lock so other writers can keep appending
+        os.fsync(fd)
+        with self.lock:
+            self.synced_lsn = max(self.synced_lsn, target)
+            self.synced.notify_all()
+    
+    def _start_flusher(self):
+        """Start the background thread used by group and async commits"""
+        with self.lock:
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self.flusher.start()
+    
+    def _flush_loop(self):
+        while not self.closed:
+            time.sleep(self.group_commit_interval)
+            self.sync()
+    
+    def replay(self) -> Iterator[Tuple]:
+        """Yield (lsn, *record) tuples, dropping a torn or corrupt tail"""
+        good_offset = 0
+        with open(self.path, 'rb') as f:
+            while True:
+                header = f.read(self.HEADER.size)
+                if len(header) < self.HEADER.size:
+                    break
+                length, crc = self.HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                good_offset = f.tell()
+                record = pickle.loads(payload)
+                self.last_lsn = max(self.last_lsn, record[0])
+                yield record
+        
+        # Anything after the last complete record was a partial write
+        if good_offset < os.path.getsize(self.path):
+            self.file.truncate(good_offset)
+        self.synced_lsn = self.last_lsn
+    
+    def truncate(self):
+        """Discard all records (after a checkpoint)"""
+        with self.lock:
+            self.file.flush()
+            self.file.truncate(0)
+            self.synced_lsn = self.last_lsn
+            self.synced.notify_all()
+    
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.synced.notify_all()
+        if self.flusher is not None:
+            self.flusher.join()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+class Transaction:
+    """An explicit transaction: changes made under one xid across several
+    statements (see Storage.begin()).
+    
+    The log records of the changes are kept here and written as a single
+    record at commit. The write locks of the tables changed are held until
+    the transaction ends, which must be in the thread that began it; DDL on
+    those tables fails meanwhile, and checkpoints pass them over.
+    """
+    
+    def __init__(self, storage: 'Storage'):
+        self.storage = storage
+        self.xid = storage.txns.begin()
+        self.records: List[Tuple] = []
+        # Tables changed, in the order they were first locked
+        self.tables: List[str] = []
+        self.locks = ExitStack()
+        self.finished = False
+    
+    def lock(self, table_name: str):
+        """Take the write lock of a table until the transaction ends"""
+        if self.finished:
+            raise ValueError("Transaction has already ended")
+        if table_name not in self.tables:
+            with ExitStack() as held:
+                held.enter_context(self.storage.locks.transaction_table(table_name, timeout=LOCK_TIMEOUT))
+                # Checked once locked, as DDL cannot drop it from then on
+                if table_name not in self.storage.tables:
+                    raise ValueError(f"Table '{table_name}' not found")
+                self.locks.enter_context(held.pop_all())
+            self.tables.append(table_name)
+
 
 class Storage:
     """Simple file-based storage engine"""
     
-    def __init__(self, data_dir: str = 'data'):
+    def __init__(self, data_dir: str = 'data', checkpoint_interval: int = 1000,
+                 durability: str = 'sync', group_commit_ms: int = 10,
+                 buffer_pool_pages: int = 1024,
+                 memory_budget: Optional[int] = 256 * 1024 * 1024):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode '{durability}'")
         self.data_dir = data_dir
         os.makedirs(data_dir, exist_ok=True)
         self.metadata_file = os.path.join(data_dir, 'metadata.json')
         self.tables: Dict[str, Table] = {}
+        self.checkpoint_interval = checkpoint_interval
+        self.durability = durability
+        self.buffer_pool = BufferPool(buffer_pool_pages)
+        self.journal = CheckpointJournal(os.path.join(data_dir, 'checkpoint.journal'))
+        # LSN of the last log record reflected in each table's heap file
+        self.table_lsns: Dict[str, int] = {}
+        self.dirty_tables = set()
+        self.records_since_checkpoint = 0
+        # Pickle snapshots from before the heap format, removed once migrated
+        self.legacy_files: Dict[str, str] = {}
+        # Tables are loaded on first access; cold ones are evicted in LRU
+        # order once the cached rows exceed memory_budget bytes
+        self.memory_budget = memory_budget
+        self.resident_tables: 'OrderedDict[str, None]' = OrderedDict()
+        self.row_counts: Dict[str, int] = {}
+        self.index_manager = IndexManager()
+        # Column statistics from ANALYZE, and rows changed since then
+        self.statistics_file = os.path.join(data_dir, 'statistics.json')
+        self.statistics: Dict[str, TableStats] = {}
+        self.changes_since_analyze: Dict[str, int] = {}
+        # Bumped by every schema, index or statistics change, so plans cached
+        # by prepared statements can tell they are out of date
+        self.catalog_version = 0
+        # Statements lock the tables they use and DDL the whole catalog.
+        # Checkpoints need every writer done, so those made due by a
+        # statement run in a background thread, which tries again later
+        # while writers hold it up, or an open transaction holds a dirty
+        # table it had to leave out.
+        self.locks = LockManager()
+        self.checkpoint_due = False
+        self.checkpoint_wanted = threading.Event()
+        self.checkpointer: Optional[threading.Thread] = None
+        # Guards the bookkeeping shared by statements on different tables
+        self.mutex = threading.Lock()
+        # Serializes table loads, evictions and flushes
+        self.load_lock = threading.RLock()
+        # Every change runs as a transaction whose row versions readers see
+        # through snapshots (see mvcc.py). Old versions are collected after
+        # changes when no snapshot is open, and by a background thread.
+        self.txns = TransactionManager()
+        self.collector: Optional[threading.Thread] = None
+        # Stops the collector and checkpointer threads
+        self.background_stop = threading.Event()
+        self.closed = False
+        
+        self.journal.recover()
         self.load_metadata()
+        self.load_statistics()
+        self.wal = WriteAheadLog(os.path.join(data_dir, 'wal.log'), group_commit_ms)
+        self.recover()
+    
+    def recover(self):
+        """Replay log records that are newer than the table heap files"""
+        self.wal.last_lsn = max(self.table_lsns.values(), default=0)
+        for lsn, *record in self.wal.replay():
+            # A transaction is logged as one record holding all its changes
+            records = record[2] if record[0] == 'transaction' else [record]
+            for op, table_name, *args in records:
+                if table_name not in self.tables or lsn <= self.table_lsns.get(table_name, 0):
+                    continue
+                table = self.get_table(table_name)
+                if op == 'insert':
+                    table.insert(table.to_dict(args[0]))
+                elif op == 'insert_many':
+                    table.insert_many(args[0])
+                elif op == 'update':
+                    table.update(args[0], args[1])
+                elif op == 'delete':
+                    table.delete(args[0])
+                self.dirty_tables.add(table_name)
+        
+        # Replayed changes are frozen, so their old versions can all go
+        self.collect_versions()
+        if self.dirty_tables:
+            self.checkpoint()
+    
+    @contextmanager
+    def locked(self, reads: Iterable[str] = (), writes: Iterable[str] = (),
+               exclusive: bool = False) -> Iterator[None]:
+        """Run a statement reading and writing the named tables, or holding
+        the whole catalog if exclusive, then start any checkpoint it made
+        due"""
+        with self.locks.statement(reads, writes, exclusive):
+            yield
+        if self.checkpoint_due:
+            self._request_checkpoint()
+    
+    def snapshot(self, txn: Optional[Transaction] = None) -> ContextManager[Snapshot]:
+        """A snapshot of the committed row versions for a reading statement,
+        plus the changes of txn if given.
+        
+        Taken inside the statement's locks, which keep the tables it reads
+        loaded with their old versions.
+        """
+        return self.txns.snapshot(txn.xid if txn is not None else None)
+    
+    @contextmanager
+    def _change(self, table_name: str, txn: Optional[Transaction]) -> Iterator[int]:
+        """Lock a table for a change and yield the xid to make it with.
+        
+        Without txn the change is a transaction of its own, which snapshots
+        taken after the block see.
+        """
+        if txn is not None:
+            txn.lock(table_name)
+            with self.locked(writes=[table_name]):
+                yield txn.xid
+            return
+        
+        with self.locked(writes=[table_name]):
+            xid = self.txns.begin()
+            try:
+                yield xid
+            finally:
+                self.txns.end(xid)
+            self._collect_after([table_name])
+    
+    def _collect_after(self, table_names: List[str]):
+        """Collect the versions nobody can see any more after a change to
+        the tables, or leave them to the background collector"""
+        for table_name in table_names:
+            table = self.tables[table_name]
+            if table.versions:
+                if not self.txns.has_snapshots():
+                    self._collect(table)
+                if table.versions:
+                    self._start_collector()
+    
+    def begin(self) -> Transaction:
+        """Start a transaction for changes to be committed or rolled back
+        together; pass it to insert(), insert_many(), update(), delete()
+        and snapshot()"""
+        return Transaction(self)
+    
+    def commit(self, txn: Transaction, durability: Optional[str] = None):
+        """Log the changes of a transaction in one record, then make them
+        visible and release its locks"""
+        try:
+            if txn.records:
+                # Inside the locks of a statement, so that no checkpoint
+                # truncates the log meanwhile
+                with self.locks.statement(writes=txn.tables):
+                    self._log(('transaction', None, txn.records), durability)
+        finally:
+            self._finish(txn)
+    
+    def rollback(self, txn: Transaction):
+        """Undo the changes of a transaction and release its locks"""
+        try:
+            for table_name in txn.tables:
+                table = self.tables[table_name]
+                with table.latch:
+                    table.rollback(txn.xid)
+        finally:
+            self._finish(txn)
+    
+    def _finish(self, txn: Transaction):
+        if txn.finished:
+            return
+        txn.finished = True
+        self.txns.end(txn.xid)
+        try:
+            self._collect_after(txn.tables)
+        finally:
+            txn.locks.close()
+        if self.checkpoint_due:
+            self._request_checkpoint()
+    
+    def _collect(self, table: 'Table') -> int:
+        # Nothing new can be collected until the horizon moves on
+        horizon = self.txns.horizon()
+        if horizon <= table.horizon:
+            return 0
+        with table.latch:
+            return table.collect(horizon)
+    
+    def collect_versions(self) -> int:
+        """Reclaim the row versions no snapshot can see any more in every
+        resident table; return the number of slots reclaimed"""
+        with self.mutex:
+            resident = list(self.resident_tables)
+        reclaimed = 0
+        for table_name in resident:
+            table = self.tables.get(table_name)
+            if table is None or not table.versions:
+                continue
+            try:
+                # A table a transaction is changing is left for later
+                # rather than waited for
+                with self.locks.statement(writes=[table_name], timeout=0):
+                    # Dropped or unloaded meanwhile
+                    if self.tables.get(table_name) is table and table.loaded:
+                        reclaimed += self._collect(table)
+            except ValueError:
+                continue
+        return reclaimed
+    
+    def _start_collector(self):
+        """Start the background thread collecting old row versions"""
+        with self.mutex:
+            if self.collector is None:
+                self.collector = threading.Thread(target=self._collect_loop, daemon=True)
+                self.collector.start()
+    
+    def _collect_loop(self):
+        while not self.background_stop.wait(COLLECT_INTERVAL):
+            self.collect_versions()
+    
+    def _log(self, record: Tuple, durability: Optional[str] = None,
+             txn: Optional[Transaction] = None):
+        """Append a change to the WAL, or to the transaction making it, and
+        have a checkpoint run every few records"""
+        if txn is not None:
+            txn.records.append(record)
+            return
+        lsn = self.wal.append(record)
+        self.wal.commit(lsn, durability or self.durability)
+        records = record[2] if record[0] == 'transaction' else [record]
+        with self.mutex:
+            self.dirty_tables.update(change[1] for change in records)
+            self.records_since_checkpoint += len(records)
+            if (self.records_since_checkpoint >= self.checkpoint_interval
+                    or self.buffer_pool.needs_flush()):
+                self.checkpoint_due = True
+    
+    def commit_log(self, durability: Optional[str] = None):
+        """Make every logged change durable, e.g. at the end of a batch"""
+        self.wal.commit(self.wal.last_lsn, durability or self.durability)
+    
+    def _request_checkpoint(self):
+        """Have the background checkpointer run the checkpoint that is due"""
+        with self.mutex:
+            if self.checkpointer is None:
+                self.checkpointer = threading.Thread(target=self._checkpoint_loop, daemon=True)
+                self.checkpointer.start()
+        self.checkpoint_wanted.set()
+    
+    def _checkpoint_loop(self):
+        while True:
+            self.checkpoint_wanted.wait()
+            self.checkpoint_wanted.clear()
+            if self.background_stop.is_set():
+                return
+            if self.checkpoint_due and not self.try_checkpoint():
+                if self.background_stop.wait(CHECKPOINT_RETRY):
+                    return
+                self.checkpoint_wanted.set()
+    
+    def try_checkpoint(self) -> bool:
+        """Checkpoint unless writers hold it up, and return whether it
+        finished.
+        
+        Running statements are waited for up to CHECKPOINT_WAIT seconds.
+        Open transactions are not waited for: the tables they hold are
+        left dirty and the rest written out, and the checkpoint finishes on
+        a later try once they have ended.
+        """
+        with self.locks.quiesce(CHECKPOINT_WAIT) as quiesced:
+            if quiesced:
+                return self._checkpoint()
+        return False
+    
+    def checkpoint(self):
+        """Write dirty pages and metadata to disk, then empty the WAL.
+        
+        Waits for running writers to finish and holds off new ones; readers
+        carry on. Tables held by open transactions are left for later, and
+        the WAL kept until they are written too.
+        """
+        with self.locks.quiesce():
+            self._checkpoint()
+    
+    def _checkpoint(self) -> bool:
+        self.checkpoint_due = False
+        # The pages of a table an open transaction holds may have rows it
+        # has not logged yet, so the table stays dirty, and its log records
+        # are kept, until a checkpoint after the transaction ends
+        dirty = list(self.dirty_tables)
+        with self.locks.free_tables(dirty) as free:
+            self._flush(free)
+        finished = len(free) == len(dirty)
+        if finished:
+            self.wal.truncate()
+            self.records_since_checkpoint = 0
+        else:
+            self.checkpoint_due = True
+        # Tables grow between loads, so re-check the budget here too
+        self._evict_cold_tables()
+        return finished
+    
+    def flush_table(self, table_name: str):
+        """Write one table's dirty pages without truncating the WAL"""
+        self._flush([table_name])
+    
+    def _flush(self, table_names: List[str]):
+        with self.load_lock:
+            lsn = self.wal.last_lsn
+            for table_name in table_names:
+                self.table_lsns[table_name] = lsn
+            
+            heaps = [self.tables[name].heap for name in table_names]
+            pages = self.buffer_pool.dirty_pages(heaps)
+            self.journal.commit(
+                [(heap.path, page_no, data) for heap, page_no, data in pages],
+                {self.metadata_file: self._metadata_json().encode()}
+            )
+            self.buffer_pool.mark_clean(pages)
+            
+            for table_name in table_names:
+                with self.mutex:
+                    self.dirty_tables.discard(table_name)
+                legacy_file = self.legacy_files.pop(table_name, None)
+                if legacy_file:
+                    os.remove(legacy_file)
+    
+    def get_table(self, table_name: str) -> 'Table':
+        """Return a table, loading it from disk on first access"""
+        table = self.tables.get(table_name)
+        if table is None:
+            raise ValueError(f"Table '{table_name}' not found")
+        
+        if not table.loaded:
+            with self.load_lock:
+                # Another statement may have loaded it in the meantime
+                if not table.loaded:
+                    self.load_table(table_name)
+                    with self.mutex:
+                        self.resident_tables[table_name] = None
+                    self._evict_cold_tables()
+                    return table
+        with self.mutex:
+            if table_name in self.resident_tables:
+                self.resident_tables.move_to_end(table_name)
+        return table
+    
+    def _evict_cold_tables(self):
+        """Unload least recently used tables until within the memory budget.
+        
+        Tables locked by a running statement are skipped.
+        """
+        if self.memory_budget is None:
+            return
+        
+        with self.load_lock:
+            with self.mutex:
+                resident = list(self.resident_tables)
+            usage = {name: self.tables[name].memory_usage() for name in resident}
+            total = sum(usage.values())
+            # The most recently used table always stays resident
+            for table_name in resident[:-1]:
+                if total <= self.memory_budget:
+                    break
+                lock = self.locks.table(table_name)
+                if not lock.acquire_write(blocking=False):
+                    continue
+                try:
+                    self.unload_table(table_name)
+                finally:
+                    lock.release_write()
+                total -= usage[table_name]
+    
+    def unload_table(self, table_name: str):
+        """Flush a table if dirty and drop its rows from memory"""
+        table = self.tables[table_name]
+        if not table.loaded:
+            return
+        if table_name in self.dirty_tables:
+            self.flush_table(table_name)
+        
+        self.row_counts[table_name] = len(table)
+        self.buffer_pool.discard(table.heap)
+        table.heap.close()
+        table.heap = None
+        table.clear()
+        table.loaded = False
+        with self.mutex:
+            self.resident_tables.pop(table_name, None)
+    
+    def close(self):
+        """Checkpoint and release the WAL and heap files; closing again
+        does nothing"""
+        if self.closed:
+            return
+        self.closed = True
+        self.background_stop.set()
+        self.checkpoint_wanted.set()
+        for thread in (self.collector, self.checkpointer):
+            if thread is not None:
+                thread.join()
+        self.checkpoint()
+        self.wal.close()
+        for table in self.tables.values():
+            if table.loaded:
+                table.heap.close()
     
     def load_metadata(self):
         """Load database metadata from disk"""
@@ -21,130 +611,348 @@ class Storage:
             with open(self.metadata_file, 'r') as f:
                 metadata = json.load(f)
                 for table_name, table_info in metadata.items():
-                    self.tables[table_name] = Table(
+                    self.tables[table_name] = make_table(
                         name=table_name,
                         columns=table_info['columns'],
                         primary_key=table_info.get('primary_key'),
-                        unique_keys=table_info.get('unique_keys', [])
+                        unique_keys=table_info.get('unique_keys', []),
+                        layout=table_info.get('layout', 'row')
                     )
+                    self.tables[table_name].next_id = table_info.get('next_id', 1)
+                    self.tables[table_name].loaded = False
+                    self.table_lsns[table_name] = table_info.get('lsn', 0)
+                    self.row_counts[table_name] = table_info.get('row_count', 0)
+                    # Index contents are rebuilt when the table is loaded
+                    for index_name, index_info in table_info.get('indexes', {}).items():
+                        if isinstance(index_info, str):
+                            index_info = {'column': index_info}
+                        self.index_manager.create_index(table_name, index_info['column'], index_name,
+                                                        index_info.get('using', 'hash'))
+                    self.tables[table_name].indexes = self.index_manager.table_indexes(table_name)
     
-    def save_metadata(self):
-        """Save database metadata to disk"""
+    def _metadata_json(self) -> str:
         metadata = {}
         for table_name, table in self.tables.items():
             metadata[table_name] = {
                 'columns': table.columns,
                 'primary_key': table.primary_key,
                 'unique_keys': table.unique_keys,
-                'row_count': len(table.rows)
+                'layout': table.layout,
+                'row_count': self.row_count(table_name),
+                'next_id': table.next_id,
+                'lsn': self.table_lsns.get(table_name, 0),
+                'indexes': {name: {'column': index.column_name, 'using': index.kind}
+                            for name, index in table.indexes.items()}
             }
+        return json.dumps(metadata, indent=2)
+    
+    def load_statistics(self):
+        """Load the column statistics saved by ANALYZE"""
+        if os.path.exists(self.statistics_file):
+            with open(self.statistics_file, 'r') as f:
+                for table_name, data in json.load(f).items():
+                    if table_name in self.tables:
+                        self.statistics[table_name] = TableStats.from_dict(data)
+    
+    def save_statistics(self):
+        """Save column statistics next to the metadata"""
+        tmp_file = self.statistics_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({name: stats.to_dict() for name, stats in self.statistics.items()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.statistics_file)
+    
+    def analyze(self, table_name: Optional[str] = None) -> List[str]:
+        """Gather column statistics for one table or all; return their names"""
+        names = [table_name] if table_name is not None else list(self.tables)
+        with self.locked(reads=names):
+            gathered = {}
+            for name in names:
+                table = self.get_table(name)
+                # Writers to the table wait while the sample is taken
+                with table.latch:
+                    gathered[name] = analyze_table(table)
+            with self.mutex:
+                self.statistics.update(gathered)
+                for name in names:
+                    self.changes_since_analyze[name] = 0
+                self.catalog_version += 1
+                self.save_statistics()
+        return names
+    
+    def table_statistics(self, table_name: str) -> Optional[TableStats]:
+        """Statistics of a table, re-analyzing it first if enough rows changed.
         
-        with open(self.metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        Tables that were never analyzed get statistics once they have more
+        rows than the analyze threshold.
+        """
+        stats = self.statistics.get(table_name)
+        changes = self.changes_since_analyze.get(table_name, 0)
+        if stats is None:
+            if self.row_count(table_name) <= ANALYZE_THRESHOLD:
+                return None
+        elif not stats.is_stale(self.row_count(table_name), changes):
+            return stats
+        self.analyze(table_name)
+        return self.statistics[table_name]
+    
+    def _count_changes(self, table_name: str, rows: int):
+        with self.mutex:
+            self.changes_since_analyze[table_name] = self.changes_since_analyze.get(table_name, 0) + rows
+    
+    def row_count(self, table_name: str) -> int:
+        """Number of rows in a table, without loading it"""
+        table = self.tables[table_name]
+        return len(table) if table.loaded else self.row_counts.get(table_name, 0)
+    
+    def save_metadata(self):
+        """Save database metadata to disk"""
+        tmp_file = self.metadata_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write(self._metadata_json())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.metadata_file)
     
     def create_table(self, name: str, columns: List[Dict], 
                      primary_key: Optional[str] = None,
-                     unique_keys: List[str] = None):
+                     unique_keys: List[str] = None,
+                     layout: str = 'row'):
         """Create a new table"""
-        if name in self.tables:
-            raise ValueError(f"Table '{name}' already exists")
-        
-        table = Table(name, columns, primary_key, unique_keys or [])
-        self.tables[name] = table
-        self.save_metadata()
-        self.save_table(name)
+        with self.locked(exclusive=True):
+            if name in self.tables:
+                raise ValueError(f"Table '{name}' already exists")
+            
+            table = make_table(name, columns, primary_key, unique_keys or [], layout)
+            table.heap = HeapFile(self._heap_file(name), self.buffer_pool)
+            table.indexes = self.index_manager.table_indexes(name)
+            self.tables[name] = table
+            self.resident_tables[name] = None
+            self.table_lsns[name] = self.wal.last_lsn
+            self.catalog_version += 1
+            self.checkpoint()
+        return True
+    
+    def create_index(self, index_name: Optional[str], table_name: str, column: str,
+                     kind: str = 'hash') -> str:
+        """Create a secondary index ('hash' or 'btree') and return its name"""
+        with self.locked(exclusive=True), self.locks.claim_tables([table_name]):
+            table = self.get_table(table_name)
+            table.position(column)
+            
+            index = self.index_manager.create_index(table_name, column, index_name, kind)
+            table.build_index(index)
+            self.catalog_version += 1
+            # Persist the definition; the contents are rebuilt on load
+            self.dirty_tables.add(table_name)
+            self.checkpoint()
+        return index.name
+    
+    def drop_index(self, index_name: str) -> bool:
+        """Drop a secondary index"""
+        with self.locked(exclusive=True):
+            table_name = self.index_manager.table_of(index_name)
+            if table_name is None:
+                return False
+            with self.locks.claim_tables([table_name]):
+                self.index_manager.drop_index(index_name)
+                self.catalog_version += 1
+                self.dirty_tables.add(table_name)
+                self.checkpoint()
         return True
     
-    def insert(self, table_name: str, data: Dict) -> int:
+    def insert(self, table_name: str, data: Dict,
+               durability: Optional[str] = None, txn: Optional[Transaction] = None) -> int:
         """Insert a row into table"""
-        table = self.tables.get(table_name)
-        if not table:
-            raise ValueError(f"Table '{table_name}' not found")
-        
-        # Validate unique constraints
-        for col in table.unique_keys:
-            if col in data:
-                for row in table.rows:
-                    if row.get(col) == data[col]:
-                        raise ValueError(f"Duplicate value for unique column '{col}'")
-        
-        row_id = table.insert(data)
-        self.save_table(table_name)
-        self.save_metadata()
+        with self._change(table_name, txn) as xid:
+            table = self.get_table(table_name)
+            
+            # Key constraints are checked by the table's hash maps
+            with table.latch:
+                row_id = table.insert(data, xid)
+            # insert() normalized data in place, so this is the stored row
+            self._log(('insert', table_name, table.to_row(data)), durability, txn)
+            self._count_changes(table_name, 1)
         return row_id
     
+    def insert_many(self, table_name: str, rows: Iterable[Sequence],
+                    columns: Optional[List[str]] = None,
+                    durability: Optional[str] = None, txn: Optional[Transaction] = None) -> int:
+        """Insert rows of values for columns, all or none of them, and log
+        them as one record"""
+        with self._change(table_name, txn) as xid:
+            table = self.get_table(table_name)
+            with table.latch:
+                positions = table.insert_many(rows, columns, xid=xid)
+            if positions:
+                self._log(('insert_many', table_name, [table.row(i) for i in positions]), durability, txn)
+                self._count_changes(table_name, len(positions))
+        return len(positions)
+    
+    def copy_from(self, table_name: str, rows: Iterable[Sequence],
+                  columns: Optional[List[str]] = None,
+                  converters: Optional[Dict[str, Callable[[Any], Any]]] = None) -> int:
+        """Bulk-load rows of values for columns, all or none of them.
+        
+        The rows bypass the WAL: the table is flushed at the end in a
+        single journal commit, so a crash loses the whole load rather than
+        leaving part of it.
+        """
+        with self._change(table_name, None) as xid:
+            table = self.get_table(table_name)
+            with table.latch:
+                positions = table.insert_many(rows, columns, converters, xid)
+            if positions:
+                self._count_changes(table_name, len(positions))
+                with self.mutex:
+                    self.dirty_tables.add(table_name)
+                # The write lock keeps other changes to the table out, so
+                # it can be flushed without waiting for other writers
+                self.flush_table(table_name)
+        return len(positions)
+    
     def select(self, table_name: str, 
                columns: Optional[List[str]] = None,
                conditions: Optional[Dict] = None,
-               order_by: Optional[Tuple[str, str]] = None,
+               order_by: Optional[List[Tuple[str, str]]] = None,
                limit: Optional[int] = None) -> List[Dict]:
-        """Select rows from table"""
-        table = self.tables.get(table_name)
-        if not table:
-            raise ValueError(f"Table '{table_name}' not found")
-        
-        return table.select(columns, conditions, order_by, limit)
+        """Select rows from table, ordered by a list of (column, direction)
+        pairs or a single pair"""
+        if order_by and isinstance(order_by[0], str):
+            order_by = [order_by]
+        with self.locked(reads=[table_name]), self.snapshot() as snapshot:
+            table = self.get_table(table_name)
+            
+            return table.select(columns, conditions, order_by, limit, snapshot)
     
     def update(self, table_name: str, updates: Dict, 
-               conditions: Optional[Dict] = None) -> int:
+               conditions: Optional[Dict] = None,
+               durability: Optional[str] = None, txn: Optional[Transaction] = None) -> int:
         """Update rows matching conditions"""
-        table = self.tables.get(table_name)
-        if not table:
-            raise ValueError(f"Table '{table_name}' not found")
-        
-        affected = table.update(updates, conditions)
-        if affected > 0:
-            self.save_table(table_name)
+        with self._change(table_name, txn) as xid:
+            table = self.get_table(table_name)
+            
+            with table.latch:
+                affected = table.update(updates, conditions, xid)
+            if affected > 0:
+                self._log(('update', table_name, updates, conditions), durability, txn)
+                self._count_changes(table_name, affected)
         return affected
     
-    def delete(self, table_name: str, conditions: Optional[Dict] = None) -> int:
+    def delete(self, table_name: str, conditions: Optional[Dict] = None,
+               durability: Optional[str] = None, txn: Optional[Transaction] = None) -> int:
         """Delete rows matching conditions"""
-        table = self.tables.get(table_name)
-        if not table:
-            raise ValueError(f"Table '{table_name}' not found")
-        
-        affected = table.delete(conditions)
-        if affected > 0:
-            self.save_table(table_name)
+        with self._change(table_name, txn) as xid:
+            table = self.get_table(table_name)
+            
+            with table.latch:
+                affected = table.delete(conditions, xid)
+            if affected > 0:
+                self._log(('delete', table_name, conditions), durability, txn)
+                self._count_changes(table_name, affected)
         return affected
     
+    def vacuum(self, table_name: Optional[str] = None) -> int:
+        """Compact deleted row slots of one table, or of every resident table.
+        
+        Tables that are not loaded are skipped: loading already packs them.
+        Runs alone, so every expired row version is reclaimed first.
+        """
+        with self.locked(exclusive=True):
+            if table_name is not None:
+                self.get_table(table_name)
+                claim = self.locks.claim_tables([table_name])
+            else:
+                # Tables an open transaction holds are left out
+                claim = self.locks.free_tables(list(self.resident_tables))
+            with claim as names:
+                tables = [self.tables[name] for name in names]
+                for table in tables:
+                    table.collect(self.txns.horizon())
+                return sum(table.vacuum() for table in tables)
+    
     def drop_table(self, table_name: str) -> bool:
         """Drop a table"""
-        if table_name not in self.tables:
-            return False
-        
-        del self.tables[table_name]
-        # Remove table file
-        table_file = os.path.join(self.data_dir, f"{table_name}.pkl")
-        if os.path.exists(table_file):
-            os.remove(table_file)
-        
-        self.save_metadata()
+        with self.locked(exclusive=True):
+            if table_name not in self.tables:
+                return False
+            
+            with self.locks.claim_tables([table_name]):
+                # Write the table out first; log records kept for it are
+                # passed over on recovery once it is gone
+                self.checkpoint()
+                table = self.tables.pop(table_name)
+                self.table_lsns.pop(table_name, None)
+                self.row_counts.pop(table_name, None)
+                self.resident_tables.pop(table_name, None)
+                self.index_manager.drop_table(table_name)
+                self.changes_since_analyze.pop(table_name, None)
+                self.catalog_version += 1
+                if self.statistics.pop(table_name, None) is not None:
+                    self.save_statistics()
+                if table.loaded:
+                    self.buffer_pool.discard(table.heap)
+                    table.heap.close()
+                # Remove table file
+                table_file = self._heap_file(table_name)
+                if os.path.exists(table_file):
+                    os.remove(table_file)
+                
+                self.save_metadata()
         return True
     
-    def save_table(self, table_name: str):
-        """Save table data to disk"""
-        table = self.tables.get(table_name)
-        if table:
-            table_file = os.path.join(self.data_dir, f"{table_name}.pkl")
-            with open(table_file, 'wb') as f:
-                pickle.dump({
-                    'rows': table.rows,
-                    'next_id': table.next_id
-                }, f)
+    def _heap_file(self, table_name: str) -> str:
+        return os.path.join(self.data_dir, f"{table_name}.heap")
     
     def load_table(self, table_name: str):
-        """Load table data from disk"""
-        table_file = os.path.join(self.data_dir, f"{table_name}.pkl")
-        if os.path.exists(table_file):
-            with open(table_file, 'rb') as f:
+        """Load table data from its heap file.
+        
+        Every row is decoded into the Table: queries run on the decoded
+        rows, not on pages, so the table has to fit in memory.
+        """
+        table = self.tables[table_name]
+        table.heap = HeapFile(self._heap_file(table_name), self.buffer_pool)
+        table.clear()
+        for rid, record in table.heap.scan():
+            position = table.append_row(table.decode(record))
+            table.locations[position] = rid
+        
+        # Migrate a pickle snapshot written before the heap format existed
+        legacy_file = os.path.join(self.data_dir, f"{table_name}.pkl")
+        if table.heap.page_count == 0 and os.path.exists(legacy_file):
+            with open(legacy_file, 'rb') as f:
                 data = pickle.load(f)
-                table = self.tables[table_name]
-                table.rows = data['rows']
-                table.next_id = data.get('next_id', len(data['rows']) + 1)
+            for row in data['rows']:
+                row = table.to_row(row)
+                position = table.append_row(row)
+                table.locations[position] = table.heap.insert(table.encode(row))
+            table.next_id = data.get('next_id', len(data['rows']) + 1)
+            self.dirty_tables.add(table_name)
+            self.legacy_files[table_name] = legacy_file
+        table.rebuild_indexes()
+        table.loaded = True
 
 class Table:
-    """Table representation with rows and schema"""
+    """Table representation with rows and schema.
+    
+    Rows are stored as tuples ordered like self.columns; dicts are only
+    built when rows leave the table (select/join results).
+    
+    Each row lives in a slot whose number (its position) stays the same
+    until VACUUM, so key maps and indexes can point at it. Deleting a row
+    leaves a tombstone and puts the slot on a free list for reuse.
+    
+    Changes keep the old row versions for readers working from a snapshot
+    (see mvcc.py): an update writes the new version to another slot, and
+    deleted or superseded versions stay in their slots, and the indexes,
+    until collect() finds no snapshot can see them. The key maps only
+    point at the latest versions. Readers never lock the rows; writers
+    hold the latch while they change the indexes, and readers while they
+    look positions up in them.
+    """
+    
+    layout = 'row'
     
     def __init__(self, name: str, columns: List[Dict], 
                  primary_key: Optional[str] = None,
@@ -153,21 +961,648 @@ class Table:
         self.columns = columns
         self.primary_key = primary_key
         self.unique_keys = unique_keys or []
-        self.rows: List[Dict] = []
+        self.column_names = [col['name'] for col in columns]
+        self.positions = {name: i for i, name in enumerate(self.column_names)}
+        # Hash maps from key value to row position for the primary key and
+        # each UNIQUE column, used for constraint checks and point lookups
+        self.key_maps: Dict[str, Dict[Any, int]] = {
+            col: {} for col in [primary_key] + self.unique_keys if col
+        }
+        # Secondary indexes by index name (shared with Storage.index_manager)
+        self.indexes: Dict[str, Index] = {}
+        # Row tuples by slot; None marks a deleted row (tombstone)
+        self.rows: List[Optional[Tuple]] = []
+        self.free_slots: List[int] = []
         self.next_id = 1
+        # Backing heap file and the record id of each slot (parallel to rows)
+        self.heap: Optional[HeapFile] = None
+        self.locations: List[Optional[Tuple[int, int]]] = []
+        # False while the rows are only on disk (see Storage.get_table)
+        self.loaded = True
+        # Versions that some snapshot may see differently from the latest
+        # state, by slot, and how many of them are expired
+        self.versions: Dict[int, Version] = {}
+        self.expired_slots = 0
+        # Horizon of the last collect()
+        self.horizon = FROZEN
+        # Slots of expired versions by key column and value
+        self.old_keys: Dict[str, Dict[Any, Set[int]]] = {col: {} for col in self.key_maps}
+        self.latch = threading.RLock()
+    
+    # Physical row storage. Subclasses with another layout override these.
+    
+    def __len__(self) -> int:
+        return len(self.rows) - len(self.free_slots) - self.expired_slots
+    
+    def slot_count(self) -> int:
+        """Number of slots, including tombstones"""
+        return len(self.rows)
+    
+    def row(self, position: int) -> Tuple:
+        return self.rows[position]
     
-    def insert(self, data: Dict) -> int:
-        """Insert a row and return its ID"""
+    def scan(self, snapshot: Optional[Snapshot] = None) -> Iterator[Tuple[int, Tuple]]:
+        """Yield (position, row) for every row the snapshot sees, or for
+        the latest version of every row"""
+        if not self.versions and not self.free_slots:
+            # Rows appended during the scan are not in the snapshot
+            return islice(enumerate(self.rows), len(self.rows))
+        if not self.versions and snapshot is None:
+            return ((i, row) for i, row in enumerate(self.rows) if row is not None)
+        return self._versioned_scan(snapshot)
+    
+    def _versioned_scan(self, snapshot: Optional[Snapshot]) -> Iterator[Tuple[int, Tuple]]:
+        visible = is_current if snapshot is None else snapshot.visible
+        versions, rows = self.versions, self.rows
+        for i in range(len(rows)):
+            # Read the version before the row, and again if it had none: a
+            # slot is emptied before its entry is dropped, and a reused slot
+            # gets its entry before the row
+            version = versions.get(i) if versions else None
+            row = rows[i]
+            if row is None:
+                continue
+            if version is None and versions:
+                version = versions.get(i)
+            if version is None or visible(version):
+                yield i, row
+    
+    def stored_rows(self) -> Iterator[Tuple[int, Tuple]]:
+        """Yield (position, row) for every slot holding a version, expired
+        ones included"""
+        return ((i, row) for i, row in enumerate(self.rows) if row is not None)
+    
+    def append_row(self, row: Tuple) -> int:
+        """Store a row in a free slot, or a new one, and return the slot"""
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.rows[slot] = row
+            return slot
+        self.rows.append(row)
+        self.locations.append(None)
+        return len(self.rows) - 1
+    
+    def append_rows(self, rows: List[Tuple]) -> List[int]:
+        """Store rows, in free slots first, and return their slots"""
+        reused = min(len(rows), len(self.free_slots))
+        positions = [self.append_row(row) for row in rows[:reused]]
+        start = len(self.rows)
+        self.rows.extend(rows[reused:])
+        self.locations.extend([None] * (len(rows) - reused))
+        return positions + list(range(start, len(self.rows)))
+    
+    def replace_row(self, position: int, row: Tuple):
+        self.rows[position] = row
+    
+    def remove_rows(self, positions: List[int]):
+        """Tombstone the rows and free their slots"""
+        for i in positions:
+            self.rows[i] = None
+            self.locations[i] = None
+        self.free_slots.extend(positions)
+    
+    def compact_slots(self, live: List[int]):
+        """Keep only the given slots, renumbered from 0 in order"""
+        self.rows = [self.rows[i] for i in live]
+    
+    def clear(self):
+        self.rows = []
+        self.locations = []
+        self.free_slots = []
+        self.versions = {}
+        self.expired_slots = 0
+        self.horizon = FROZEN
+        for keys in self.key_maps.values():
+            keys.clear()
+        for old in self.old_keys.values():
+            old.clear()
+        for index in self.indexes.values():
+            index.clear()
+    
+    def matching_positions(self, conditions: Optional[Dict],
+                           snapshot: Optional[Snapshot] = None) -> List[int]:
+        """Positions of the rows that satisfy the conditions"""
+        if not conditions:
+            return self.live_positions(snapshot)
+        
+        positions = self.lookup_positions(conditions, snapshot)
+        if positions is None:
+            positions = self.filter_positions(conditions, snapshot)
+        return positions
+    
+    def lookup_positions(self, conditions: Dict,
+                         snapshot: Optional[Snapshot] = None) -> Optional[List[int]]:
+        """Matching positions found through a key map or index.
+        
+        Returns None when no condition can be answered by one.
+        """
+        with self.latch:
+            # An equality on a key column matches at most one row (per value
+            # of an IN list), plus the expired versions a snapshot may see
+            for col, value in conditions.items():
+                keys = self.key_maps.get(col)
+                values = equality_values(value) if keys is not None else None
+                if values is not None:
+                    found = {keys.get(v) for v in values}
+                    found.discard(None)
+                    if snapshot is not None and self.versions:
+                        old = self.old_keys[col]
+                        for v in values:
+                            found.update(old.get(v, ()))
+                    found = self._visible(sorted(found), snapshot)
+                    if len(conditions) == 1:
+                        return found
+                    matcher = self._matcher(conditions)
+                    return [i for i in found if matcher(self.row(i))]
+            
+            # Otherwise narrow the candidates with a secondary index
+            for col, value in conditions.items():
+                for index in self.indexes.values():
+                    if index.column_name != col:
+                        continue
+                    candidates = index.search(value)
+                    if candidates is not None:
+                        matcher = self._matcher(conditions)
+                        return [i for i in self._visible(sorted(candidates), snapshot)
+                                if matcher(self.row(i))]
+        return None
+    
+    def probe(self, column: str, value: Any, snapshot: Optional[Snapshot] = None) -> List[Tuple]:
+        """Rows holding value in a key or indexed column, for joins"""
+        with self.latch:
+            keys = self.key_maps.get(column)
+            if keys is not None:
+                position = keys.get(value)
+                found = set() if position is None else {position}
+                if snapshot is not None and self.versions:
+                    found.update(self.old_keys[column].get(value, ()))
+            else:
+                found = self.index_on(column).find(value)
+            return [self.row(i) for i in self._visible(sorted(found), snapshot)]
+    
+    def _visible(self, positions: List[int], snapshot: Optional[Snapshot]) -> List[int]:
+        """The stored positions holding versions the snapshot sees, or
+        latest versions; called with the latch held"""
+        versions = self.versions
+        if not versions:
+            return positions
+        visible = is_current if snapshot is None else snapshot.visible
+        return [i for i in positions if visible(versions.get(i))]
+    
+    def can_lookup(self, conditions: Optional[Dict]) -> bool:
+        """True if lookup_positions() can answer the conditions"""
+        if not conditions:
+            return False
+        for col, value in conditions.items():
+            if col in self.key_maps and equality_values(value) is not None:
+                return True
+            if any(index.column_name == col and index.supports(value)
+                   for index in self.indexes.values()):
+                return True
+        return False
+    
+    def filter_scan(self, conditions: Optional[Dict],
+                    snapshot: Optional[Snapshot] = None) -> Iterator[Tuple[int, Tuple]]:
+        """Lazily yield (position, row) for the rows satisfying the conditions"""
+        if not conditions:
+            return self.scan(snapshot)
+        matcher = self._matcher(conditions)
+        return ((i, row) for i, row in self.scan(snapshot) if matcher(row))
+    
+    def ordered_scan(self, column: str, descending: bool = False,
+                     conditions: Optional[Dict] = None,
+                     snapshot: Optional[Snapshot] = None) -> Optional[Iterator[Tuple[int, Tuple]]]:
+        """Lazily yield matching (position, row) in column order from a btree
+        index, or return None if the column has no btree index"""
+        index = self.index_on(column, 'btree')
+        if index is None:
+            return None
+        return self._ordered_walk(index, descending, self._matcher(conditions), snapshot)
+    
+    def _ordered_walk(self, index: OrderedIndex, descending: bool, matcher: Callable[[Tuple], bool],
+                      snapshot: Optional[Snapshot]) -> Iterator[Tuple[int, Tuple]]:
+        # The index is read a page at a time under the latch, so writers
+        # can change it between pages
+        after = None
+        while True:
+            with self.latch:
+                page = list(islice(index.walk(descending, after), ORDERED_SCAN_PAGE))
+                positions = self._visible([i for _, i in page], snapshot)
+            if not page:
+                return
+            after = page[-1]
+            for i in positions:
+                row = self.row(i)
+                if matcher(row):
+                    yield i, row
+    
+    def live_positions(self, snapshot: Optional[Snapshot] = None) -> List[int]:
+        """Slots holding a row the snapshot sees (or a latest version), in
+        slot order"""
+        if not self.versions and not self.free_slots:
+            return list(range(self.slot_count()))
+        if self.versions:
+            return [i for i, _ in self.scan(snapshot)]
+        free = set(self.free_slots)
+        return [i for i in range(self.slot_count()) if i not in free]
+    
+    def vacuum(self) -> int:
+        """Compact away tombstones and remap indexes; return slots reclaimed"""
+        if not self.free_slots:
+            return 0
+        
+        live = self.live_positions()
+        mapping = {old: new for new, old in enumerate(live)}
+        self.compact_slots(live)
+        self.locations = [self.locations[i] for i in live]
+        reclaimed = len(self.free_slots)
+        self.free_slots = []
+        
+        for keys in self.key_maps.values():
+            for value, position in keys.items():
+                keys[value] = mapping[position]
+        for index in self.indexes.values():
+            index.remap(mapping)
+        return reclaimed
+    
+    def index_on(self, column: str, kind: Optional[str] = None) -> Optional[Index]:
+        """A secondary index on column (of the given kind), if there is one"""
+        for index in self.indexes.values():
+            if index.column_name == column and kind in (None, index.kind):
+                return index
+        return None
+    
+    def _index_order(self, conditions: Optional[Dict],
+                     order_by: Optional[List[Tuple[str, str]]],
+                     limit: Optional[int],
+                     snapshot: Optional[Snapshot] = None) -> Optional[List[int]]:
+        """Answer ORDER BY col LIMIT k by walking an ordered index.
+        
+        Returns None when there is no suitable index, when there are more
+        ORDER BY columns, or when the conditions can already be narrowed
+        with a key or index lookup.
+        """
+        if not order_by or len(order_by) > 1 or limit is None:
+            return None
+        if conditions and any(col in self.key_maps or self.index_on(col) for col in conditions):
+            return None
+        
+        column, direction = order_by[0]
+        walk = self.ordered_scan(column, direction.upper() == 'DESC', conditions, snapshot)
+        if walk is None:
+            return None
+        return [i for i, _ in islice(walk, limit)]
+    
+    def build_index(self, index: Index):
+        # Expired versions are indexed too, for the snapshots that see them
+        pos = self.position(index.column_name)
+        index.build((position, row[pos]) for position, row in self.stored_rows())
+    
+    def rebuild_indexes(self):
+        """Recompute the key maps and secondary indexes from the stored rows"""
+        key_positions = [(self.position(col), keys) for col, keys in self.key_maps.items()]
+        for _, keys in key_positions:
+            keys.clear()
+        for position, row in self.scan():
+            for pos, keys in key_positions:
+                if row[pos] is not None:
+                    keys[row[pos]] = position
+        for index in self.indexes.values():
+            self.build_index(index)
+    
+    def _check_unique(self, col: str, value: Any, allowed_position: Optional[int] = None):
+        """Raise if value is already used by another row in a key column"""
+        if value is None:
+            if col == self.primary_key:
+                raise ValueError(f"Primary key '{col}' cannot be NULL")
+            return
+        position = self.key_maps[col].get(value)
+        if position is not None and position != allowed_position:
+            raise self._duplicate_error(col, value)
+    
+    def _duplicate_error(self, col: str, value: Any) -> ValueError:
+        kind = 'primary key' if col == self.primary_key else 'unique column'
+        return ValueError(f"Duplicate value for {kind} '{col}': {value!r}")
+    
+    def filter_positions(self, conditions: Dict, snapshot: Optional[Snapshot] = None) -> List[int]:
+        """Positions of the rows that satisfy the conditions, by scanning"""
+        matcher = self._matcher(conditions)
+        return [i for i, row in self.scan(snapshot) if matcher(row)]
+    
+    def memory_usage(self) -> int:
+        """Rough estimate of the bytes held by the cached rows"""
+        sample = [row for row in self.rows[:100] if row is not None]
+        if not sample:
+            return sys.getsizeof(self.rows)
+        sample_size = sum(sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+                          for row in sample)
+        return sys.getsizeof(self.rows) + sample_size * len(self.rows) // len(sample)
+    
+    def position(self, column: str) -> int:
+        """Index of a column within a row tuple"""
+        if column not in self.positions:
+            raise ValueError(f"Unknown column '{column}' in table '{self.name}'")
+        return self.positions[column]
+    
+    def to_row(self, data: Dict) -> Tuple:
+        """Build a row tuple from a column -> value dict"""
+        for col in data:
+            self.position(col)
+        return tuple(data.get(name) for name in self.column_names)
+    
+    def to_dict(self, row: Tuple) -> Dict:
+        """Materialize a row tuple as a column -> value dict"""
+        return dict(zip(self.column_names, row))
+    
+    def encode(self, row: Tuple) -> bytes:
+        """Serialize a row for its heap file record"""
+        return pickle.dumps(row, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    def decode(self, record: bytes) -> Tuple:
+        """Deserialize a heap file record, upgrading dict-shaped rows"""
+        row = pickle.loads(record)
+        if isinstance(row, dict):
+            row = self.to_row(row)
+        return row
+    
+    def insert(self, data: Dict, xid: int = FROZEN) -> int:
+        """Insert a row as transaction xid and return its ID"""
         # Generate ID if not provided
-        if self.primary_key and self.primary_key not in data:
+        if self.primary_key and data.get(self.primary_key) is None:
             data[self.primary_key] = self.next_id
             self.next_id += 1
         
         # Validate data types
         self._validate_row(data)
         
-        self.rows.append(data.copy())
-        return data.get(self.primary_key, len(self.rows))
+        # Keep generated IDs ahead of explicitly supplied (or replayed) ones
+        if self.primary_key and isinstance(data.get(self.primary_key), int):
+            self.next_id = max(self.next_id, data[self.primary_key] + 1)
+        
+        row = self.to_row(data)
+        for col in self.key_maps:
+            self._check_unique(col, row[self.positions[col]])
+        
+        self._new_versions(1, xid)
+        position = self.append_row(row)
+        if self.heap:
+            try:
+                self.locations[position] = self.heap.insert(self.encode(row))
+            except ValueError:
+                self._discard_rows([position])
+                raise
+        for col, keys in self.key_maps.items():
+            if row[self.positions[col]] is not None:
+                keys[row[self.positions[col]]] = position
+        for index in self.indexes.values():
+            index.add(row[self.positions[index.column_name]], position)
+        return data.get(self.primary_key, position + 1)
+    
+    def insert_many(self, rows: Iterable[Sequence], columns: Optional[List[str]] = None,
+                    converters: Optional[Dict[str, Callable[[Any], Any]]] = None,
+                    xid: int = FROZEN) -> List[int]:
+        """Insert rows of values for columns (default: every column), all of
+        them or, if one is rejected, none; return their positions.
+        
+        Rows are taken a batch at a time: values are converted a column at a
+        time, keys are checked against a set of the batch and the key maps,
+        and secondary indexes are updated once at the end. converters maps
+        a column type to the conversion of its non-NULL values.
+        """
+        targets = [self.position(col) for col in columns] if columns else list(range(len(self.columns)))
+        converters = VALUE_CONVERTERS if converters is None else converters
+        rows = iter(rows)
+        positions: List[int] = []
+        next_id = self.next_id
+        try:
+            while True:
+                batch = list(islice(rows, INSERT_BATCH_ROWS))
+                if not batch:
+                    break
+                self._insert_batch(batch, len(positions) + 1, targets, converters, positions, xid)
+        except Exception:
+            self._discard_rows(positions)
+            self.next_id = next_id
+            raise
+        
+        # Adding many entries one at a time costs more than a rebuild
+        if positions and self.indexes:
+            if len(positions) * 2 >= len(self):
+                for index in self.indexes.values():
+                    self.build_index(index)
+            else:
+                for index in self.indexes.values():
+                    pos = self.positions[index.column_name]
+                    for i in positions:
+                        index.add(self.row(i)[pos], i)
+        return positions
+    
+    def _insert_batch(self, batch: List[Sequence], first: int, targets: List[int],
+                      converters: Dict[str, Callable[[Any], Any]], positions: List[int], xid: int):
+        """Convert, check and store one batch, appending the row positions"""
+        width = len(targets)
+        for i, values in enumerate(batch):
+            if len(values) != width:
+                raise ValueError(f"Row {first + i} has {len(values)} value(s), expected {width}")
+        
+        # Work on the batch a column at a time; unlisted columns are NULL
+        nulls = (None,) * len(batch)
+        values_by_column: List[Sequence] = [nulls] * len(self.columns)
+        for pos, values in zip(targets, zip(*batch)):
+            values_by_column[pos] = values
+        for pos, col_def in enumerate(self.columns):
+            convert = converters.get(col_def['type'])
+            if convert is not None and values_by_column[pos] is not nulls:
+                values_by_column[pos] = self._convert_column(values_by_column[pos], convert, col_def, first)
+        if self.primary_key:
+            pos = self.positions[self.primary_key]
+            values_by_column[pos] = self._generate_ids(values_by_column[pos])
+        for col in self.key_maps:
+            self._check_new_keys(col, values_by_column[self.positions[col]])
+        
+        rows = list(zip(*values_by_column))
+        records = [self.encode(row) for row in rows] if self.heap else None
+        self._new_versions(len(rows), xid)
+        added = self.append_rows(rows)
+        positions.extend(added)
+        if self.heap:
+            for position, rid in zip(added, self.heap.append(records)):
+                self.locations[position] = rid
+        for col, keys in self.key_maps.items():
+            keys.update((value, i) for value, i in zip(values_by_column[self.positions[col]], added)
+                        if value is not None)
+    
+    def _convert_column(self, values: Sequence, convert: Callable[[Any], Any],
+                        col_def: Dict, first: int) -> List:
+        try:
+            if None in values:
+                return [None if value is None else convert(value) for value in values]
+            return list(map(convert, values))
+        except (ValueError, TypeError):
+            # Find the row for the message
+            for i, value in enumerate(values):
+                try:
+                    if value is not None:
+                        convert(value)
+                except (ValueError, TypeError):
+                    raise ValueError(f"Invalid type for column '{col_def['name']}' in row {first + i}. "
+                                     f"Expected {col_def['type']}") from None
+            raise
+    
+    def _generate_ids(self, values: Sequence) -> List:
+        """Primary key values with the NULLs replaced by generated IDs"""
+        ids = list(values)
+        supplied = [value for value in ids if isinstance(value, int)]
+        if supplied:
+            self.next_id = max(self.next_id, max(supplied) + 1)
+        if None in ids:
+            for i, value in enumerate(ids):
+                if value is None:
+                    ids[i] = self.next_id
+                    self.next_id += 1
+        return ids
+    
+    def _check_new_keys(self, col: str, values: Sequence):
+        """Raise if a key column value repeats within values or is in use"""
+        keys = self.key_maps[col]
+        present = [value for value in values if value is not None]
+        if len(present) < len(values) and col == self.primary_key:
+            raise ValueError(f"Primary key '{col}' cannot be NULL")
+        if len(set(present)) == len(present) and not any(map(keys.__contains__, present)):
+            return
+        seen = set()
+        for value in present:
+            if value in seen or value in keys:
+                raise self._duplicate_error(col, value)
+            seen.add(value)
+    
+    def _discard_rows(self, positions: List[int]):
+        """Remove rows that were stored but are not in the indexes yet"""
+        key_positions = [(self.positions[col], keys) for col, keys in self.key_maps.items()]
+        for i in positions:
+            if self.heap and self.locations[i] is not None:
+                self.heap.delete(self.locations[i])
+            row = self.row(i)
+            for pos, keys in key_positions:
+                if keys.get(row[pos]) == i:
+                    del keys[row[pos]]
+        self.remove_rows(positions)
+        for i in positions:
+            self.versions.pop(i, None)
+    
+    def _claim_slots(self, count: int) -> List[int]:
+        """The slots append_rows() will store the next count rows in"""
+        reused = min(count, len(self.free_slots))
+        slots = self.free_slots[len(self.free_slots) - reused:][::-1]
+        start = self.slot_count()
+        return slots + list(range(start, start + count - reused))
+    
+    def _new_versions(self, count: int, xid: int):
+        """Record the versions the next count rows stored will be, created
+        by xid; done before the rows are stored, as scans expect"""
+        slots = self._claim_slots(count)
+        if xid != FROZEN:
+            self.versions.update(dict.fromkeys(slots, (xid, None)))
+        elif self.versions:
+            for slot in slots:
+                self.versions.pop(slot, None)
+    
+    def _expire(self, positions: List[int], xid: int):
+        """Mark versions as expired by xid, leaving them in their slots and
+        the indexes until collect() reclaims them"""
+        key_positions = [(self.positions[col], keys, self.old_keys[col])
+                         for col, keys in self.key_maps.items()]
+        versions = self.versions
+        for i in positions:
+            if self.heap and self.locations[i] is not None:
+                self.heap.delete(self.locations[i])
+                self.locations[i] = None
+            row = self.row(i)
+            for pos, keys, old in key_positions:
+                value = row[pos]
+                if value is not None:
+                    if keys.get(value) == i:
+                        del keys[value]
+                    old.setdefault(value, set()).add(i)
+            created = versions.get(i)
+            versions[i] = (FROZEN if created is None else created[0], xid)
+        self.expired_slots += len(positions)
+    
+    def collect(self, horizon: int) -> int:
+        """Freeze the versions created, and reclaim the slots of those
+        expired, by transactions below horizon, which every snapshot sees;
+        return the number of slots reclaimed"""
+        self.horizon = horizon
+        dead = []
+        for position, (created, expired) in list(self.versions.items()):
+            if expired is not None:
+                if expired < horizon:
+                    dead.append(position)
+            elif created < horizon:
+                del self.versions[position]
+        if not dead:
+            return 0
+        
+        self._forget_old_keys(dead)
+        for i in dead:
+            row = self.row(i)
+            for index in self.indexes.values():
+                index.remove(row[self.positions[index.column_name]], i)
+        # Scans expect a slot to be emptied before its entry goes
+        self.remove_rows(dead)
+        self.expired_slots -= len(dead)
+        for i in dead:
+            del self.versions[i]
+        return len(dead)
+    
+    def _forget_old_keys(self, positions: List[int]):
+        """Drop expired versions from old_keys"""
+        key_positions = [(self.positions[col], old) for col, old in self.old_keys.items()]
+        for i in positions:
+            row = self.row(i)
+            for pos, old in key_positions:
+                slots = old.get(row[pos])
+                if slots is not None:
+                    slots.discard(i)
+                    if not slots:
+                        del old[row[pos]]
+    
+    def rollback(self, xid: int):
+        """Undo the changes of transaction xid, which has not ended: the
+        version entries it stamped say what they were"""
+        created, expired = [], []
+        for position, (made, gone) in self.versions.items():
+            if made == xid:
+                created.append(position)
+            elif gone == xid:
+                expired.append(position)
+        
+        # Versions it wrote go, along with any it expired again itself
+        superseded = [i for i in created if self.versions[i][1] == xid]
+        self._forget_old_keys(superseded)
+        for i in created:
+            row = self.row(i)
+            for index in self.indexes.values():
+                index.remove(row[self.positions[index.column_name]], i)
+        self._discard_rows(created)
+        self.expired_slots -= len(superseded)
+        
+        # Versions it expired are the latest ones again
+        self._forget_old_keys(expired)
+        key_positions = [(self.positions[col], keys) for col, keys in self.key_maps.items()]
+        for i in expired:
+            row = self.row(i)
+            if self.heap:
+                self.locations[i] = self.heap.insert(self.encode(row))
+            for pos, keys in key_positions:
+                if row[pos] is not None:
+                    keys[row[pos]] = i
+            made = self.versions[i][0]
+            if made == FROZEN:
+                del self.versions[i]
+            else:
+                self.versions[i] = (made, None)
+        self.expired_slots -= len(expired)
     
     def _validate_row(self, data: Dict):
         """Validate row data against column definitions"""
@@ -175,7 +1610,7 @@ class Table:
             col_name = col_def['name']
             col_type = col_def['type']
             
-            if col_name in data:
+            if data.get(col_name) is not None:
                 value = data[col_name]
                 try:
                     if col_type == 'int':
@@ -195,104 +1630,382 @@ class Table:
     
     def select(self, columns: Optional[List[str]] = None,
                conditions: Optional[Dict] = None,
-               order_by: Optional[Tuple[str, str]] = None,
-               limit: Optional[int] = None) -> List[Dict]:
+               order_by: Optional[List[Tuple[str, str]]] = None,
+               limit: Optional[int] = None,
+               snapshot: Optional[Snapshot] = None) -> List[Dict]:
         """Select rows with filtering and ordering"""
-        results = []
+        ordered = self._index_order(conditions, order_by, limit, snapshot)
+        if ordered is not None:
+            results = [self.rows[i] for i in ordered]
+            order_by = limit = None
+        else:
+            results = self.matching_rows(conditions, snapshot)
         
-        for row in self.rows:
-            # Apply conditions
-            if conditions and not self._row_matches(row, conditions):
-                continue
-            
-            # Select specific columns
-            if columns:
-                selected_row = {}
-                for col in columns:
-                    if col in row:
-                        selected_row[col] = row[col]
-                    elif col == '*':
-                        selected_row = row.copy()
-                        break
-                results.append(selected_row)
-            else:
-                results.append(row.copy())
-        
-        # Apply ordering
+        # Apply ordering; with a limit only the top rows are kept
         if order_by:
-            column, direction = order_by
-            reverse = (direction.upper() == 'DESC')
-            results.sort(key=lambda x: x.get(column, 0), reverse=reverse)
+            key, descending = order_key(self._order_keys(order_by))
+            results = list(sort_rows(results, key, descending, limit))
         
         # Apply limit
         if limit is not None:
             results = results[:limit]
         
-        return results
+        # Rows stay tuples up to here; only the results become dicts
+        names = list(columns) if columns and '*' not in columns else self.column_names
+        return compile_projection(names, [self.position(col) for col in names])(results)
     
-    def _row_matches(self, row: Dict, conditions: Dict) -> bool:
-        """Check if row matches all conditions"""
-        for key, value in conditions.items():
-            if key not in row or row[key] != value:
-                return False
-        return True
+    def matching_rows(self, conditions: Optional[Dict],
+                      snapshot: Optional[Snapshot] = None) -> List[Tuple]:
+        """The rows that satisfy the conditions"""
+        if conditions:
+            positions = self.lookup_positions(conditions, snapshot)
+            if positions is not None:
+                return [self.rows[i] for i in positions]
+        if self.versions or (self.free_slots and snapshot is not None):
+            matcher = self._matcher(conditions)
+            return [row for _, row in self.scan(snapshot) if matcher(row)]
+        # Every stored row is visible (see scan): filter the list directly
+        return compile_filter(conditions, self.position)(self.rows)
     
-    def update(self, updates: Dict, conditions: Optional[Dict] = None) -> int:
-        """Update rows matching conditions"""
-        affected = 0
-        
-        for row in self.rows:
-            if not conditions or self._row_matches(row, conditions):
-                for key, value in updates.items():
-                    row[key] = value
-                affected += 1
-        
-        return affected
+    def _order_keys(self, order_by: List[Tuple[str, str]]) -> List[Tuple[int, bool]]:
+        """(position, descending) of each ORDER BY (column, direction)"""
+        return [(self.position(column), direction.upper() == 'DESC') for column, direction in order_by]
     
-    def delete(self, conditions: Optional[Dict] = None) -> int:
-        """Delete rows matching conditions"""
-        if not conditions:
-            count = len(self.rows)
-            self.rows.clear()
-            return count
+    def _matcher(self, conditions: Optional[Dict]):
+        """Build a row predicate for the conditions"""
+        return compile_conditions(conditions, self.position)
+    
+    def _row_matches(self, row: Tuple, conditions: Dict) -> bool:
+        """Check if row matches all conditions"""
+        return self._matcher(conditions)(row)
+    
+    def update(self, updates: Dict, conditions: Optional[Dict] = None, xid: int = FROZEN) -> int:
+        """Update rows matching conditions, writing new versions created by
+        xid and expiring the old ones"""
+        updates = dict(updates)
+        self._validate_row(updates)
+        changes = [(self.position(key), value) for key, value in updates.items()]
+        positions = self.matching_positions(conditions)
         
-        # Filter rows to keep
-        rows_to_keep = []
-        deleted = 0
+        # Check key constraints before changing anything
+        key_changes = [(col, updates[col]) for col in self.key_maps if col in updates]
+        for col, value in key_changes:
+            if value is not None and len(positions) > 1:
+                raise self._duplicate_error(col, value)
+            for i in positions:
+                self._check_unique(col, value, allowed_position=i)
         
-        for row in self.rows:
-            if self._row_matches(row, conditions):
-                deleted += 1
-            else:
-                rows_to_keep.append(row)
+        key_positions = [(self.positions[col], keys) for col, keys in self.key_maps.items()]
+        for i in positions:
+            new_row = list(self.row(i))
+            for pos, value in changes:
+                new_row[pos] = value
+            new_row = tuple(new_row)
+            self._new_versions(1, xid)
+            position = self.append_row(new_row)
+            if self.heap:
+                # The record moves to the new version's slot
+                self.locations[position] = self.heap.update(self.locations[i], self.encode(new_row))
+                self.locations[i] = None
+            self._expire([i], xid)
+            for pos, keys in key_positions:
+                if new_row[pos] is not None:
+                    keys[new_row[pos]] = position
+            for index in self.indexes.values():
+                index.add(new_row[self.positions[index.column_name]], position)
         
-        self.rows = rows_to_keep
-        return deleted
+        return len(positions)
+    
+    def delete(self, conditions: Optional[Dict] = None, xid: int = FROZEN) -> int:
+        """Delete rows matching conditions, expiring them as of xid"""
+        positions = self.matching_positions(conditions)
+        self._expire(positions, xid)
+        return len(positions)
     
     def join(self, other_table: 'Table', 
              join_type: str, 
              on_condition: Tuple[str, str]) -> List[Dict]:
-        """Perform join with another table"""
+        """Perform join with another table.
+        
+        Uses a sort-merge join when both key columns have a btree index and
+        a hash join otherwise. On a column name clash the right-hand value
+        wins unless it is NULL.
+        """
+        join_type = join_type.upper()
+        if join_type not in JOIN_TYPES:
+            raise ValueError(f"Unsupported join type '{join_type}'")
+        left_pos = self.position(on_condition[0])
+        right_pos = other_table.position(on_condition[1])
+        right_width = len(other_table.column_names)
+        
+        left_index = self.index_on(on_condition[0], 'btree')
+        right_index = other_table.index_on(on_condition[1], 'btree')
+        if left_index is not None and right_index is not None:
+            rows = merge_join(self.ordered_rows(left_index), other_table.ordered_rows(right_index),
+                              left_pos, right_pos, right_width, join_type)
+        else:
+            rows = hash_join([row for _, row in self.scan()], [row for _, row in other_table.scan()],
+                             left_pos, right_pos, right_width, join_type)
+        
         result = []
-        left_col, right_col = on_condition
-        
-        if join_type.upper() == 'INNER':
-            for left_row in self.rows:
-                for right_row in other_table.rows:
-                    if left_row.get(left_col) == right_row.get(right_col):
-                        merged = {**left_row, **right_row}
-                        result.append(merged)
-        
-        elif join_type.upper() == 'LEFT':
-            for left_row in self.rows:
-                matched = False
-                for right_row in other_table.rows:
-                    if left_row.get(left_col) == right_row.get(right_col):
-                        merged = {**left_row, **right_row}
-                        result.append(merged)
-                        matched = True
-                
-                if not matched:
-                    result.append(left_row.copy())
+        width = len(self.column_names)
+        for row in rows:
+            merged = self.to_dict(row[:width])
+            for name, value in other_table.to_dict(row[width:]).items():
+                if value is not None or name not in merged:
+                    merged[name] = value
+            result.append(merged)
+        return result
+    
+    def ordered_rows(self, index: 'OrderedIndex', positions: Optional[set] = None) -> Iterator[Tuple]:
+        """Rows in the order of an ordered index, optionally only the given positions"""
+        for position in index.ordered():
+            if (positions is None or position in positions) and is_current(self.versions.get(position)):
+                yield self.row(position)
+
+class ColumnarTable(Table):
+    """Table that keeps each column in its own vector.
+    
+    int, float and boolean columns are packed into typed arrays and the
+    other columns are dictionary-encoded. Conditions are evaluated as masks
+    over whole columns instead of row by row.
+    """
+    
+    layout = 'column'
+    
+    def __init__(self, name: str, columns: List[Dict], 
+                 primary_key: Optional[str] = None,
+                 unique_keys: List[str] = None):
+        super().__init__(name, columns, primary_key, unique_keys)
+        self.vectors = [make_column(col['type']) for col in columns]
+        # Number of slots, and a byte per slot set to 1 for tombstones
+        self.count = 0
+        self.deleted = bytearray()
+    
+    def __len__(self) -> int:
+        return self.count - len(self.free_slots) - self.expired_slots
+    
+    def slot_count(self) -> int:
+        return self.count
+    
+    def row(self, position: int) -> Tuple:
+        return tuple(vector.get(position) for vector in self.vectors)
+    
+    def scan(self, snapshot: Optional[Snapshot] = None) -> Iterator[Tuple[int, Tuple]]:
+        # Materialize rows a chunk at a time rather than one value at a time.
+        # As in Table._versioned_scan(), versions are read before the values
+        # and again for the slots that had none.
+        visible = is_current if snapshot is None else snapshot.visible
+        versions = self.versions
+        count = self.count
+        for start in range(0, count, 1024):
+            chunk = range(start, min(start + 1024, count))
+            # Without free slots no slot in the chunk can be reused
+            plain = not versions and not self.free_slots
+            before = None if plain else [versions.get(i) for i in chunk]
+            values = [vector.take(chunk) for vector in self.vectors]
+            rows = zip(chunk, zip(*values))
+            if plain:
+                yield from rows
+                continue
+            deleted = self.deleted
+            for (i, row), version in zip(rows, before):
+                if deleted[i]:
+                    continue
+                if version is None:
+                    version = versions.get(i)
+                if visible(version):
+                    yield i, row
+    
+    def stored_rows(self) -> Iterator[Tuple[int, Tuple]]:
+        deleted = self.deleted
+        for start in range(0, self.count, 1024):
+            chunk = range(start, min(start + 1024, self.count))
+            values = [vector.take(chunk) for vector in self.vectors]
+            yield from ((i, row) for i, row in zip(chunk, zip(*values)) if not deleted[i])
+    
+    def append_row(self, row: Tuple) -> int:
+        if self.free_slots:
+            slot = self.free_slots[-1]
+            for vector, value in zip(self.vectors, row):
+                vector.set(slot, value)
+            self.free_slots.pop()
+            self.deleted[slot] = 0
+            return slot
         
-        return result
\ No newline at end of file
+        try:
+            for vector, value in zip(self.vectors, row):
+                vector.append(value)
+        except ValueError:
+            # Keep the vectors the same length if one value was rejected
+            for vector in self.vectors:
+                vector.truncate(self.count)
+            raise
+        self.deleted.append(0)
+        self.locations.append(None)
+        self.count += 1
+        return self.count - 1
+    
+    def append_rows(self, rows: List[Tuple]) -> List[int]:
+        reused = min(len(rows), len(self.free_slots))
+        positions = []
+        fresh = rows[reused:]
+        try:
+            for row in rows[:reused]:
+                positions.append(self.append_row(row))
+            # The rest are added to each vector in one go
+            for vector, values in zip(self.vectors, zip(*fresh)):
+                vector.extend(values)
+        except ValueError:
+            for vector in self.vectors:
+                vector.truncate(self.count)
+            self.remove_rows(positions)
+            raise
+        # Grow the flags before the count, which scans read first
+        self.deleted.extend(bytes(len(fresh)))
+        self.locations.extend([None] * len(fresh))
+        start = self.count
+        self.count += len(fresh)
+        return positions + list(range(start, self.count))
+    
+    def replace_row(self, position: int, row: Tuple):
+        old_row = self.row(position)
+        try:
+            for vector, value in zip(self.vectors, row):
+                vector.set(position, value)
+        except ValueError:
+            for vector, value in zip(self.vectors, old_row):
+                vector.set(position, value)
+            raise
+    
+    def remove_rows(self, positions: List[int]):
+        for i in positions:
+            self.deleted[i] = 1
+            self.locations[i] = None
+        self.free_slots.extend(positions)
+    
+    def compact_slots(self, live: List[int]):
+        keep = not_mask(self.deleted)
+        for vector in self.vectors:
+            vector.keep(keep)
+        self.count = len(live)
+        self.deleted = bytearray(self.count)
+    
+    def clear(self):
+        super().clear()
+        for vector in self.vectors:
+            vector.clear()
+        self.count = 0
+        self.deleted = bytearray()
+    
+    def live_positions(self, snapshot: Optional[Snapshot] = None) -> List[int]:
+        count = self.count
+        if not self.versions and not self.free_slots:
+            return list(range(count))
+        return mask_positions(self._visible_mask(count, snapshot))
+    
+    def filter_positions(self, conditions: Dict, snapshot: Optional[Snapshot] = None) -> List[int]:
+        # Decided first: slots are only reused while there are free slots,
+        # and only changed under a version entry
+        versioned = bool(self.versions or self.free_slots)
+        count = self.count
+        mask = self._conditions_mask(conditions, count)
+        if versioned:
+            # Tombstoned slots still hold their old values
+            mask = and_masks(mask, self._visible_mask(count, snapshot))
+        return mask_positions(mask)
+    
+    def _visible_mask(self, count: int, snapshot: Optional[Snapshot]) -> bytes:
+        """Mask of the first count slots holding versions the snapshot sees,
+        or latest versions"""
+        visible = is_current if snapshot is None else snapshot.visible
+        # Versions are read before and after the flags, as in scan()
+        before = dict(self.versions)
+        mask = not_mask(self.deleted[:count])
+        after = dict(self.versions)
+        hidden = [i for i, version in before.items() if i < count and not visible(version)]
+        hidden += [i for i, version in after.items()
+                   if i < count and i not in before and not visible(version)]
+        if not hidden:
+            return mask
+        mask = bytearray(mask)
+        for i in hidden:
+            mask[i] = 0
+        return bytes(mask)
+    
+    def _conditions_mask(self, conditions: Dict, count: int) -> bytes:
+        """Mask of the first count slots satisfying the conditions, OR
+        branches included"""
+        mask = None
+        for key, value in conditions.items():
+            if isinstance(value, Or):
+                column_mask = self._conditions_mask(value.terms[0], count)
+                for branch in value.terms[1:]:
+                    column_mask = or_masks(column_mask, self._conditions_mask(branch, count))
+                mask = column_mask if mask is None else and_masks(mask, column_mask)
+                continue
+            vector = self.vectors[self.position(key)]
+            for term in condition_terms(value):
+                if term.op in MASK_OPS:
+                    masks = [vector.mask(compare, operand) for compare, operand in term.comparisons()]
+                else:
+                    masks = [vector.test_mask(term.test())]
+                for column_mask in masks:
+                    # Vectors grow ahead of the count while rows are added
+                    column_mask = column_mask[:count]
+                    mask = column_mask if mask is None else and_masks(mask, column_mask)
+        return mask if mask is not None else all_mask(count)
+    
+    def filter_scan(self, conditions: Optional[Dict],
+                    snapshot: Optional[Snapshot] = None) -> Iterator[Tuple[int, Tuple]]:
+        if not conditions:
+            return self.scan(snapshot)
+        # Evaluate the whole mask at once, then materialize rows in chunks
+        return self._rows_at(self.filter_positions(conditions, snapshot))
+    
+    def _rows_at(self, positions: List[int]) -> Iterator[Tuple[int, Tuple]]:
+        for start in range(0, len(positions), 1024):
+            chunk = positions[start:start + 1024]
+            values = [vector.take(chunk) for vector in self.vectors]
+            yield from zip(chunk, zip(*values))
+    
+    def memory_usage(self) -> int:
+        return sum(vector.memory_usage() for vector in self.vectors)
+    
+    def select(self, columns: Optional[List[str]] = None,
+               conditions: Optional[Dict] = None,
+               order_by: Optional[List[Tuple[str, str]]] = None,
+               limit: Optional[int] = None,
+               snapshot: Optional[Snapshot] = None) -> List[Dict]:
+        """Select rows, touching only the columns the query needs"""
+        positions = self._index_order(conditions, order_by, limit, snapshot)
+        if positions is not None:
+            order_by = limit = None
+        else:
+            positions = self.matching_positions(conditions, snapshot)
+        
+        if order_by:
+            keys = self._order_keys(order_by)
+            # Sort rows of just the ORDER BY values, keyed by list index
+            values = list(zip(*[self.vectors[pos].take(positions) for pos, _ in keys]))
+            key, descending = order_key([(i, desc) for i, (_, desc) in enumerate(keys)])
+            order = sort_rows(range(len(positions)), lambda i: key(values[i]), descending, limit)
+            positions = [positions[i] for i in order]
+        
+        if limit is not None:
+            positions = positions[:limit]
+        
+        names = list(columns) if columns and '*' not in columns else self.column_names
+        values = [self.vectors[self.position(name)].take(positions) for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+def make_table(name: str, columns: List[Dict],
+               primary_key: Optional[str] = None,
+               unique_keys: List[str] = None,
+               layout: str = 'row') -> Table:
+    """Create a table with the given storage layout ('row' or 'column')"""
+    if layout == 'row':
+        return Table(name, columns, primary_key, unique_keys)
+    if layout == 'column':
+        return ColumnarTable(name, columns, primary_key, unique_keys)
+    raise ValueError(f"Unknown storage layout '{layout}'. Expected 'row' or 'column'")
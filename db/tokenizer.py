@@ -0,0 +1,54 @@
+import re
+from typing import Any, List, NamedTuple
+
+# SQL text is split into tokens in a single regex pass. Words (keywords and
+# identifiers alike) carry their lowercased text as the value, so keyword
+# tests are plain string comparisons; the parser decides which words are
+# keywords from their position.
+
+class Token(NamedTuple):
+    """One token: kind is 'word', 'string', 'number', 'symbol' or 'end'"""
+    kind: str
+    # Lowercased text of a word, unquoted text of a string, the symbol
+    value: Any
+    # Source text and where it starts and ends in the statement
+    text: str
+    start: int
+    end: int
+
+# One token with the whitespace before it; anything else is an error
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+  | (?P<word>[A-Za-z_]\w*)
+  | (?P<symbol><=|>=|!=|<>|\|\||[-+=<>(),.*;?:/%])
+  | (?P<error>\S)
+)""", re.VERBOSE)
+
+# Tokens are built without the keyword handling of Token(...)
+_new_token = tuple.__new__
+
+
+def tokenize(sql: str) -> List[Token]:
+    """Split a statement into tokens, ending with an 'end' token"""
+    tokens = []
+    append = tokens.append
+    for m in _TOKEN.finditer(sql):
+        kind = m.lastgroup
+        text = m.group(kind)
+        if kind == 'word':
+            value = text.lower()
+        elif kind == 'string':
+            # A doubled quote inside a string is a literal quote
+            value = text[1:-1].replace(text[0] * 2, text[0])
+        elif kind == 'error':
+            pos = m.start(kind)
+            if text in '\'"':
+                raise ValueError(f"Unterminated string starting at position {pos}")
+            raise ValueError(f"Unexpected character {text!r} at position {pos}")
+        else:
+            value = text
+        append(_new_token(Token, (kind, value, text, m.start(kind), m.end())))
+    length = len(sql)
+    append(Token('end', None, '', length, length))
+    return tokens
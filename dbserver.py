@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+PesaPal JuniorDB - Database server
+Serves one database to many clients over TCP (see db/client.py)
+"""
+
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db.server import main
+
+if __name__ == "__main__":
+    main()
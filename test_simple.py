@@ -1,6 +1,7 @@
 # Simple test script
 import sys
 import os
+import tempfile
 
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -13,8 +14,9 @@ try:
     
     print("✓ All imports successful!")
     
-    # Initialize components
-    storage = Storage()
+    # Initialize components, in a scratch directory so the tracked data/
+    # files are left alone
+    storage = Storage(tempfile.mkdtemp(prefix='juniordb-'))
     parser = Parser()
     executor = Executor(storage)
     
@@ -0,0 +1,36 @@
+import threading
+
+import pytest
+
+from db.executor import Executor
+from db.parser import Parser
+from db.storage import Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = Storage(str(tmp_path / 'data'))
+    yield storage
+    storage.close()
+
+
+def run(executor: Executor, sql: str):
+    return executor.execute(Parser().parse(sql))
+
+
+def in_thread(function, timeout: float = 5.0):
+    """Call a function in another thread; its result, or an AssertionError
+    if it did not return within timeout seconds"""
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"{function} still waiting after {timeout} seconds"
+    return results[0]
+
+
+def crash(storage: Storage):
+    """Stop a storage as a crash would, leaving only what reached disk"""
+    storage.wal.sync()
+    storage.background_stop.set()
+    storage.checkpoint_wanted.set()
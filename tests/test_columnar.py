@@ -0,0 +1,46 @@
+import pytest
+
+from conftest import run
+from db.columnar import NumericColumn
+from db.executor import Executor
+from db.storage import Storage
+
+BIG = 2 ** 70
+
+
+def test_int_column_widens_past_64_bits():
+    column = NumericColumn('q', int)
+    column.extend([1, None, 2])
+    column.append(BIG)
+    column.set(0, -BIG)
+    assert column.take([0, 1, 2, 3]) == [-BIG, None, 2, BIG]
+    column.keep(b'\x01\x00\x01\x01')
+    assert column.take([0, 1, 2]) == [-BIG, 2, BIG]
+    column.extend([3, BIG + 1])
+    assert column.take([3, 4]) == [3, BIG + 1]
+
+
+def test_float_column_rejects_overflow():
+    column = NumericColumn('d', float)
+    with pytest.raises(ValueError, match="cannot be stored in a columnar column"):
+        column.append(10 ** 400)
+
+
+@pytest.mark.parametrize('layout', ['row', 'column'])
+def test_big_ints_in_both_layouts(tmp_path, layout):
+    data_dir = str(tmp_path / 'data')
+    storage = Storage(data_dir)
+    executor = Executor(storage)
+    run(executor, f"CREATE TABLE t (id INT PRIMARY KEY, n INT) WITH (storage = {layout})")
+    run(executor, f"INSERT INTO t VALUES (1, 5), (2, NULL), (3, {BIG})")
+    run(executor, f"UPDATE t SET n = -{BIG} WHERE id = 1")
+    expected = [{'id': 1, 'n': -BIG}, {'id': 2, 'n': None}, {'id': 3, 'n': BIG}]
+    assert run(executor, "SELECT * FROM t ORDER BY id") == expected
+    assert run(executor, "SELECT id FROM t WHERE n > 0") == [{'id': 3}]
+    storage.close()
+    
+    storage = Storage(data_dir)
+    try:
+        assert run(Executor(storage), "SELECT * FROM t ORDER BY id") == expected
+    finally:
+        storage.close()
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from conftest import run
+from db.executor import Executor
+
+
+@pytest.fixture
+def copy_dir(tmp_path):
+    path = tmp_path / 'files'
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def executor(storage, copy_dir):
+    executor = Executor(storage, copy_dir=str(copy_dir))
+    run(executor, "CREATE TABLE t (id INT PRIMARY KEY, name VARCHAR(10), score FLOAT)")
+    return executor
+
+
+def test_copy_from_csv_and_jsonl(executor, copy_dir):
+    (copy_dir / 'rows.csv').write_text("id;score;name\n1;1.5;a\n\n2;;b\n")
+    (copy_dir / 'rows.jsonl').write_text('{"id": 3, "name": "c", "score": 3}\n{"id": 4}\n')
+    
+    assert run(executor, "COPY t FROM 'rows.csv' WITH (HEADER, DELIMITER ';')") == "2 row(s) copied into 't'"
+    run(executor, "COPY t (id, name, score) FROM 'rows.jsonl'")
+    assert run(executor, "SELECT * FROM t ORDER BY id") == [
+        {'id': 1, 'name': 'a', 'score': 1.5}, {'id': 2, 'name': 'b', 'score': None},
+        {'id': 3, 'name': 'c', 'score': 3.0}, {'id': 4, 'name': None, 'score': None},
+    ]
+
+
+
+def test_copy_to_csv_and_jsonl(executor, copy_dir):
+    run(executor, "INSERT INTO t VALUES (1, 'a', 1.5), (2, NULL, 2.0), (3, 'c', NULL)")
+    
+    assert run(executor, "COPY t TO 'out.csv' WITH (HEADER)") == "3 row(s) copied to 'out.csv'"
+    assert (copy_dir / 'out.csv').read_text().splitlines() == ['id,name,score', '1,a,1.5', '2,,2.0', '3,c,']
+    run(executor, "COPY (SELECT id, name FROM t WHERE id > 1 ORDER BY id DESC) TO 'out.jsonl'")
+    assert (copy_dir / 'out.jsonl').read_text().splitlines() == [
+        '{"id": 3, "name": "c"}', '{"id": 2, "name": null}'
+    ]
+    
+    # What COPY TO writes, COPY FROM reads back
+    run(executor, "DELETE FROM t")
+    run(executor, "COPY t FROM 'out.csv' WITH (HEADER)")
+    assert run(executor, "SELECT * FROM t ORDER BY id") == [
+        {'id': 1, 'name': 'a', 'score': 1.5}, {'id': 2, 'name': None, 'score': 2.0},
+        {'id': 3, 'name': 'c', 'score': None},
+    ]
+
+
+@pytest.mark.parametrize('statement', [
+    "COPY t FROM '{path}'",
+    "COPY t TO '{path}'",
+])
+def test_copy_path_cannot_leave_copy_dir(executor, copy_dir, tmp_path, statement):
+    (tmp_path / 'outside.csv').write_text("1,a,1.0\n")
+    os.symlink(tmp_path / 'outside.csv', copy_dir / 'link.csv')
+    for path in ('../outside.csv', str(tmp_path / 'outside.csv'), 'link.csv'):
+        with pytest.raises(ValueError, match="is outside the file directory"):
+            run(executor, statement.format(path=path))
+    assert run(executor, "SELECT COUNT(*) AS n FROM t") == [{'n': 0}]
+    assert (tmp_path / 'outside.csv').read_text() == "1,a,1.0\n"
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from conftest import run
+from db.executor import Executor
+from db.storage import DEFERRED, Storage, WriteAheadLog
+
+
+def test_commit_modes(tmp_path):
+    wal = WriteAheadLog(str(tmp_path / 'wal.log'), group_commit_ms=5)
+    try:
+        # Deferred leaves syncing to a later commit
+        lsn = wal.append(('insert', 't', (1,)))
+        wal.commit(lsn, DEFERRED)
+        assert wal.synced_lsn < lsn
+        
+        wal.commit(lsn, 'sync')
+        assert wal.synced_lsn == lsn
+        
+        # Group commit returns once the background flusher synced the record
+        lsn = wal.append(('insert', 't', (2,)))
+        wal.commit(lsn, 'group')
+        assert wal.synced_lsn >= lsn
+        
+        # Async commit returns at once; the record is synced soon after
+        lsn = wal.append(('insert', 't', (3,)))
+        wal.commit(lsn, 'async')
+        deadline = time.monotonic() + 5
+        while wal.synced_lsn < lsn and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert wal.synced_lsn >= lsn
+        
+        with pytest.raises(ValueError, match="Unknown durability mode 'eventually'"):
+            wal.commit(lsn, 'eventually')
+    finally:
+        wal.close()
+
+
+def test_storage_durability_mode(tmp_path):
+    with pytest.raises(ValueError, match="Unknown durability mode 'never'"):
+        Storage(str(tmp_path / 'data'), durability='never')
+
+
+def test_set_durability(storage, monkeypatch):
+    modes = []
+    commit = storage.wal.commit
+    
+    def recording_commit(lsn, durability='sync'):
+        modes.append(durability)
+        commit(lsn, durability)
+    monkeypatch.setattr(storage.wal, 'commit', recording_commit)
+    executor = Executor(storage)
+    run(executor, "CREATE TABLE t (id INT PRIMARY KEY)")
+    
+    run(executor, "INSERT INTO t VALUES (1)")
+    assert run(executor, "SET durability = async") == "durability set to async"
+    run(executor, "INSERT INTO t VALUES (2)")
+    assert run(executor, "SET durability TO group") == "durability set to group"
+    run(executor, "INSERT INTO t VALUES (3)")
+    # The setting belongs to the session
+    run(Executor(storage), "INSERT INTO t VALUES (4)")
+    assert run(executor, "SET durability = default") == "durability reset to sync"
+    run(executor, "INSERT INTO t VALUES (5)")
+    assert modes == ['sync', 'async', 'group', 'sync', 'sync']
+    
+    with pytest.raises(ValueError, match="Unknown durability mode 'fast'"):
+        run(executor, "SET durability = fast")
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from conftest import in_thread, run
+from db.executor import Executor
+from db.locks import LockManager, ReadWriteLock
+
+
+def test_readers_share_and_writer_waits():
+    lock = ReadWriteLock()
+    assert lock.acquire_read()
+    assert in_thread(lambda: lock.acquire_read(blocking=False))
+    lock.release_read()
+    # The other thread still reads
+    assert not in_thread(lambda: lock.acquire_write(timeout=0.05))
+    assert not in_thread(lambda: lock.acquire_write(blocking=False))
+
+
+def test_writer_lock_times_out():
+    locks = LockManager()
+    holding, done = threading.Event(), threading.Event()
+    
+    def hold():
+        with locks.statement(writes=['t']):
+            holding.set()
+            done.wait()
+    
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holding.wait()
+    try:
+        with pytest.raises(ValueError, match="Timed out waiting to write table 't'"):
+            with locks.statement(writes=['t'], timeout=0.05):
+                pass
+        # Other tables and readers are not held up
+        with locks.statement(writes=['u'], timeout=0):
+            pass
+        with locks.statement(reads=['t'], timeout=0):
+            pass
+    finally:
+        done.set()
+        holder.join()
+    with locks.statement(writes=['t'], timeout=0):
+        pass
+
+
+def test_quiesce_gives_up_on_running_writer():
+    locks = LockManager()
+    with locks.statement(writes=['t']):
+        result = []
+        
+        def quiesce():
+            with locks.quiesce(0) as quiesced:
+                result.append(quiesced)
+        
+        thread = threading.Thread(target=quiesce)
+        thread.start()
+        thread.join()
+        assert result == [False]
+    with locks.quiesce(0) as quiesced:
+        assert quiesced
+
+
+def test_concurrent_inserts(storage):
+    executor = Executor(storage)
+    for name in ('a', 'b'):
+        run(executor, f"CREATE TABLE {name} (id INT PRIMARY KEY, n INT)")
+    
+    def insert(name, start):
+        for i in range(start, start + 200):
+            storage.insert(name, {'id': i, 'n': i})
+    
+    threads = [threading.Thread(target=insert, args=(name, start))
+               for name in ('a', 'b') for start in (0, 1000)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for name in ('a', 'b'):
+        assert len(storage.select(name)) == 400
@@ -0,0 +1,63 @@
+import pytest
+
+from conftest import in_thread, run
+from db.executor import Executor
+from db.parser import Parser
+from db.storage import Storage
+
+
+@pytest.fixture(params=['row', 'column'])
+def executor(request, tmp_path):
+    storage = Storage(str(tmp_path / 'data'))
+    executor = Executor(storage)
+    run(executor, f"CREATE TABLE t (id INT PRIMARY KEY, v INT) WITH (storage = {request.param})")
+    for i in range(1, 6):
+        run(executor, f"INSERT INTO t VALUES ({i}, {i * 10})")
+    yield executor
+    storage.close()
+
+
+def test_reader_does_not_see_concurrent_commit(executor):
+    before = run(executor, "SELECT * FROM t ORDER BY id")
+    rows = executor.stream(Parser().parse("SELECT * FROM t ORDER BY id"))
+    first = next(rows)
+    
+    # Writers do not wait for the open scan
+    writer = Executor(executor.storage)
+    in_thread(lambda: run(writer, "UPDATE t SET v = 0 WHERE id = 2"))
+    in_thread(lambda: run(writer, "DELETE FROM t WHERE id = 3"))
+    in_thread(lambda: run(writer, "INSERT INTO t VALUES (6, 60)"))
+    
+    assert [first] + list(rows) == before
+    assert run(executor, "SELECT * FROM t ORDER BY id") == [
+        {'id': 1, 'v': 10}, {'id': 2, 'v': 0}, {'id': 4, 'v': 40}, {'id': 5, 'v': 50}, {'id': 6, 'v': 60}
+    ]
+
+
+def test_snapshot_sees_old_versions_through_index(executor):
+    run(executor, "CREATE INDEX t_v ON t (v) USING btree")
+    rows = executor.stream(Parser().parse("SELECT id, v FROM t WHERE v >= 20 ORDER BY v"))
+    first = next(rows)
+    
+    writer = Executor(executor.storage)
+    in_thread(lambda: run(writer, "UPDATE t SET v = 5 WHERE id = 3"))
+    in_thread(lambda: run(writer, "UPDATE t SET v = 45 WHERE id = 1"))
+    
+    assert [first] + list(rows) == [{'id': 2, 'v': 20}, {'id': 3, 'v': 30}, {'id': 4, 'v': 40},
+                                    {'id': 5, 'v': 50}]
+    assert run(executor, "SELECT id, v FROM t WHERE v >= 20 ORDER BY v") == [
+        {'id': 2, 'v': 20}, {'id': 4, 'v': 40}, {'id': 1, 'v': 45}, {'id': 5, 'v': 50}
+    ]
+
+
+def test_old_versions_collected_once_unseen(executor):
+    storage = executor.storage
+    rows = executor.stream(Parser().parse("SELECT * FROM t"))
+    next(rows)
+    in_thread(lambda: run(Executor(storage), "DELETE FROM t WHERE id > 2"))
+    assert storage.tables['t'].versions
+    rows.close()
+    
+    storage.collect_versions()
+    assert not storage.tables['t'].versions
+    assert run(executor, "SELECT COUNT(*) AS n FROM t") == [{'n': 2}]
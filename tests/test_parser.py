@@ -0,0 +1,109 @@
+import pytest
+
+from db.parser import Parser
+from db.predicates import Or, Predicate
+
+
+@pytest.fixture
+def parser():
+    return Parser()
+
+
+def test_conditions(parser):
+    parsed = parser.parse("SELECT * FROM t WHERE a = 1 AND b > 2.5 AND c = 'x' AND d IS NOT NULL")
+    assert parsed['conditions'] == {'a': 1, 'b': Predicate('>', 2.5), 'c': 'x',
+                                    'd': Predicate('is not null', None)}
+    parsed = parser.parse("SELECT * FROM t WHERE a = 1 OR a = 2 OR a IN (3)")
+    assert parsed['conditions'] == {'a': Predicate('in', (1, 2, 3))}
+    parsed = parser.parse("SELECT * FROM t WHERE NOT (a = 1 OR b BETWEEN 2 AND 3)")
+    assert parsed['conditions'] == {'a': Predicate('!=', 1), 'b': Predicate('not between', (2, 3))}
+    assert isinstance(parser.parse("SELECT * FROM t WHERE a = 1 OR b = 2")['conditions']
+                      ['(a = 1 OR b = 2)'], Or)
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT * FROM t WHERE a = b",
+    "SELECT * FROM t WHERE a IN (1, b)",
+    "DELETE FROM t WHERE a BETWEEN b AND 3",
+    "UPDATE t SET a = b",
+])
+def test_bare_name_is_not_a_value(parser, sql):
+    with pytest.raises(ValueError, match="expected a value, not the bare name b"):
+        parser.parse(sql)
+
+
+def test_select(parser):
+    parsed = parser.parse("SELECT DISTINCT a, b AS x FROM t WHERE a > 1 ORDER BY a, b DESC, c ASC LIMIT 5;")
+    assert parsed['distinct'] is True
+    assert parsed['columns'] == ['a', 'b AS x']
+    assert parsed['select_items'] == [(('column', 'a'), 'a'), (('column', 'b'), 'x')]
+    assert parsed['order_by'] == [('a', 'ASC'), ('b', 'DESC'), ('c', 'ASC')]
+    assert parsed['limit'] == 5
+    assert 'distinct' not in parser.parse("SELECT a FROM t")
+
+
+def test_join_and_group(parser):
+    parsed = parser.parse("SELECT o.id, COUNT(DISTINCT c.id) AS n FROM orders o LEFT JOIN customers c "
+                          "ON o.customer_id = c.id GROUP BY o.id HAVING COUNT(*) > 1 ORDER BY n DESC")
+    assert parsed['alias'] == 'o'
+    assert parsed['joins'][0]['join_type'] == 'LEFT'
+    assert parsed['group_by'] == ['o.id']
+    assert parsed['having'] == {('aggregate', 'COUNT', None, False): Predicate('>', 1)}
+    assert parsed['order_by'] == [('n', 'DESC')]
+
+
+def test_numbers(parser):
+    parsed = parser.parse("INSERT INTO t VALUES (1, -2, 2.5, 1e5, 2.5E-3, 1e400, '1e5', 2024-01-15)")
+    assert parsed['rows'] == [[1, -2, 2.5, 1e5, 2.5e-3, float('inf'), '1e5', '2024-01-15']]
+    assert parser.parse("SELECT * FROM t WHERE a > 1e5")['conditions'] == {'a': Predicate('>', 100000.0)}
+    assert parser.parse("UPDATE t SET a = -1.5e2")['updates'] == {'a': -150.0}
+
+
+def test_insert_and_ddl(parser):
+    parsed = parser.parse("INSERT INTO t (a, b) VALUES (1, 'it''s'), (2, NULL)")
+    assert parsed['columns'] == ['a', 'b']
+    assert parsed['rows'] == [[1, "it's"], [2, None]]
+    parsed = parser.parse("CREATE TABLE t (id INT PRIMARY KEY, name VARCHAR(20) UNIQUE) WITH (storage = column)")
+    assert parsed['primary_key'] == 'id'
+    assert parsed['unique_keys'] == ['name']
+    assert parser.parse("CREATE INDEX i ON t (a) USING btree")['using'] == 'btree'
+
+
+@pytest.mark.parametrize('sql, message', [
+    ("SELECT a FROM t ORDER BY", "Invalid SELECT syntax: expected a column name at the end"),
+    ("SELECT a FROM t ORDER BY a b", "Invalid SELECT syntax: expected the end of the statement near 'b'"),
+    ("SELECT a FROM t LIMIT 1.5", "Invalid SELECT syntax: expected a row count near '1.5'"),
+    ("SELECT from FROM t", "Invalid SELECT syntax: expected a column name or value near 'from FROM t'"),
+    ("SELECT a distinct FROM t", "Invalid SELECT syntax: expected FROM near 'distinct FROM t'"),
+    ("SELECT a FROM t WHERE a = 'x", "Unterminated string starting at position 26"),
+    ("SELECT a FROM t WHERE a # 1", "Unexpected character '#' at position 24"),
+    ("FROB t", "Unsupported query: FROB t"),
+    ("   ", "Empty query"),
+])
+def test_errors(parser, sql, message):
+    with pytest.raises(ValueError) as error:
+        parser.parse(sql)
+    assert str(error.value) == message
+
+
+def test_cache_is_keyed_by_stripped_text(parser):
+    parsed = parser.parse("SELECT a FROM t")
+    assert parser.parse("  SELECT a FROM t\n") is parsed
+    assert (parser.hits, parser.misses) == (1, 1)
+    # Case and inner whitespace are part of the key
+    assert parser.parse("select a from t") is not parsed
+    assert parser.misses == 2
+
+
+def test_cache_evicts_least_recently_used():
+    parser = Parser(cache_size=2)
+    first = parser.parse("SELECT a FROM t")
+    parser.parse("SELECT b FROM t")
+    parser.parse("SELECT a FROM t")
+    parser.parse("SELECT c FROM t")
+    assert list(parser.cache) == ["SELECT a FROM t", "SELECT c FROM t"]
+    assert parser.parse("SELECT a FROM t") is first
+    
+    uncached = Parser(cache_size=0)
+    uncached.parse("SELECT a FROM t")
+    assert not uncached.cache
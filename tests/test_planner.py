@@ -0,0 +1,71 @@
+import re
+
+import pytest
+
+from conftest import run
+from db.executor import Executor
+
+
+@pytest.fixture
+def executor(storage):
+    executor = Executor(storage)
+    run(executor, "CREATE TABLE c (id INT PRIMARY KEY, region VARCHAR(10))")
+    run(executor, "CREATE TABLE o (id INT PRIMARY KEY, cid INT, total FLOAT)")
+    run(executor, "CREATE INDEX o_cid ON o (cid)")
+    run(executor, "CREATE INDEX o_total ON o (total) USING btree")
+    executor.executemany(executor.prepare("INSERT INTO c VALUES (?, ?)"),
+                         [(i, f"r{i % 5}") for i in range(200)])
+    executor.executemany(executor.prepare("INSERT INTO o VALUES (?, ?, ?)"),
+                         [(i, i % 200, float(i)) for i in range(3000)])
+    run(executor, "ANALYZE")
+    return executor
+
+
+def plan(executor, sql):
+    """The operators of a statement's plan, outermost first, without costs"""
+    return [re.sub(r'\s+\(cost=.*', '', line).lstrip(' ->') 
+            for line in run(executor, f"EXPLAIN {sql}").splitlines()]
+
+
+@pytest.mark.parametrize('where, access, ids', [
+    ("id = 5", "IndexLookup on o using primary key id cond: id = 5", [5]),
+    ("cid = 5", "IndexLookup on o using o_cid cond: cid = 5", list(range(5, 3000, 200))),
+    ("total > 2990", "IndexLookup on o using o_total cond: total > 2990", list(range(2991, 3000))),
+    # Most rows match, so scanning beats the index
+    ("total > 10", "SeqScan on o filter: total > 10", list(range(11, 3000))),
+])
+def test_access_path(executor, where, access, ids):
+    assert plan(executor, f"SELECT * FROM o WHERE {where}")[1] == access
+    assert run(executor, f"SELECT id FROM o WHERE {where} ORDER BY id") == [{'id': i} for i in ids]
+
+
+def test_order_by_limit_walks_index(executor):
+    assert plan(executor, "SELECT id FROM o ORDER BY total DESC LIMIT 3")[1:] == [
+        "Limit 3", "IndexOrderScan on o using o_total DESC"
+    ]
+    assert run(executor, "SELECT id FROM o ORDER BY total DESC LIMIT 3") == [{'id': 2999}, {'id': 2998}, {'id': 2997}]
+
+
+def test_join_and_group(executor):
+    sql = "SELECT c.region, COUNT(*) AS n FROM o JOIN c ON o.cid = c.id GROUP BY c.region ORDER BY c.region"
+    operators = plan(executor, sql)
+    assert operators[0] == "Project region, n"
+    assert any(line.startswith("HashJoin INNER on o.cid = c.id") for line in operators)
+    assert run(executor, sql) == [{'region': f"r{i}", 'n': 600} for i in range(5)]
+    # A selective filter on the outer table turns the join into index lookups
+    operators = plan(executor, "SELECT o.id FROM c JOIN o ON c.id = o.cid WHERE c.id = 7")
+    assert operators[1:] == ["IndexJoin INNER on c.id = o.cid probing o",
+                             "IndexLookup on c using primary key id cond: id = 7"]
+    assert run(executor, "SELECT o.id FROM c JOIN o ON c.id = o.cid WHERE c.id = 7 ORDER BY o.id") == [
+        {'id': i} for i in range(7, 3000, 200)
+    ]
+
+
+def test_explain_analyze(executor):
+    lines = run(executor, "EXPLAIN ANALYZE SELECT * FROM o WHERE cid = 5").splitlines()
+    assert re.fullmatch(r"Project id, cid, total  \(cost=[\d.]+ rows=15\)  "
+                        r"\(actual rows=15 time=[\d.]+ ms\)", lines[0])
+    assert re.fullmatch(r"  -> IndexLookup on o using o_cid cond: cid = 5  \(cost=[\d.]+ rows=15\)  "
+                        r"\(actual rows=15 time=[\d.]+ ms\)", lines[1])
+    assert re.fullmatch(r"Planning time: [\d.]+ ms", lines[2])
+    assert re.fullmatch(r"Execution time: [\d.]+ ms", lines[3])
@@ -0,0 +1,65 @@
+import pytest
+
+from db import protocol
+from db.protocol import ProtocolError, Reader
+
+VALUES = [None, True, False, 0, -1, 2 ** 63 - 1, -2 ** 63, 2 ** 63, -2 ** 63 - 1, 10 ** 40,
+          1.5, -0.0, float('inf'), '', 'héllo', 'x' * 70000]
+
+
+def test_values_round_trip():
+    reader = Reader(protocol.pack_values(VALUES))
+    values = reader.values()
+    reader.end()
+    assert values == tuple(VALUES)
+    # Booleans stay booleans and ints past 64 bits stay exact
+    assert [type(value) for value in values] == [type(value) for value in VALUES]
+    assert protocol.pack_value(2 ** 63)[:1] == protocol.BIG_INT_TAG
+
+
+def test_params_rows_and_names_round_trip():
+    for params in (None, (1, 'a', None), {'id': 2 ** 64, 'name': 'b'}):
+        reader = Reader(protocol.pack_params(params))
+        assert reader.params() == params
+        reader.end()
+    rows = [(1, 'a', 1.5), (2, None, True)]
+    reader = Reader(protocol.pack_names(['id', 'name', 'score']) + protocol.pack_rows(rows))
+    assert reader.names() == ['id', 'name', 'score']
+    assert reader.rows() == rows
+    reader.end()
+
+
+def test_unsupported_value_type():
+    with pytest.raises(ValueError, match="Cannot send a value of type bytes"):
+        protocol.pack_value(b'raw')
+
+
+def test_truncated_payload():
+    payload = protocol.pack_params({'id': 2 ** 70, 'name': 'é', 'score': 0.5, 'ok': None})
+    for end in range(len(payload)):
+        with pytest.raises(ProtocolError, match="Message ends in the middle of a field"):
+            Reader(payload[:end]).params()
+
+
+@pytest.mark.parametrize('payload, read, message', [
+    (protocol.U16.pack(1) + b'?', 'values', "Unknown value tag b'\\?'"),
+    (protocol.U16.pack(1) + protocol.TEXT_TAG + protocol.U32.pack(1) + b'\xff', 'values',
+     "Text is not valid UTF-8"),
+    (protocol.U8.pack(7), 'params', "Unknown parameter kind 7"),
+])
+def test_malformed_payload(payload, read, message):
+    with pytest.raises(ProtocolError, match=message):
+        getattr(Reader(payload), read)()
+
+
+def test_frames():
+    data = protocol.frame(protocol.QUERY, protocol.pack_text('SELECT 1'))
+    length, message_type = protocol.read_header(data[:protocol.HEADER.size])
+    assert (length, message_type) == (len(data) - protocol.HEADER.size, protocol.QUERY)
+    
+    reader = Reader(data[protocol.HEADER.size:] + b'!')
+    assert reader.text() == 'SELECT 1'
+    with pytest.raises(ProtocolError, match="trailing bytes"):
+        reader.end()
+    with pytest.raises(ProtocolError, match="over the"):
+        protocol.read_header(protocol.HEADER.pack(protocol.MAX_PAYLOAD + 1, protocol.QUERY))
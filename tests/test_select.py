@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import run
+from db.executor import Executor
+from db.predicates import Predicate
+
+
+@pytest.fixture(params=['row', 'column'])
+def executor(request, storage):
+    executor = Executor(storage)
+    run(executor, f"CREATE TABLE t (id INT PRIMARY KEY, a INT, b VARCHAR(5)) WITH (storage = {request.param})")
+    run(executor, "INSERT INTO t VALUES (1, 1, 'x'), (2, 2, 'y'), (3, 1, 'z'), (4, NULL, 'x'), (5, 2, 'x')")
+    return executor
+
+
+def ids(rows):
+    return [row['id'] for row in rows]
+
+
+@pytest.mark.parametrize('index', [False, True])
+def test_order_by_several_columns(executor, index):
+    if index:
+        run(executor, "CREATE INDEX t_a ON t (a) USING btree")
+    assert ids(run(executor, "SELECT id FROM t ORDER BY a DESC, b")) == [5, 2, 1, 3, 4]
+    assert ids(run(executor, "SELECT id FROM t ORDER BY a, b DESC LIMIT 3")) == [4, 3, 1]
+    assert ids(run(executor, "SELECT id FROM t ORDER BY b, a DESC, id")) == [5, 1, 4, 2, 3]
+    assert ids(executor.storage.select('t', ['id'], order_by=[('b', 'DESC'), ('id', 'ASC')])) == [3, 2, 1, 4, 5]
+
+
+def test_order_by_several_columns_after_group_by(executor):
+    rows = run(executor, "SELECT a, COUNT(*) AS n FROM t GROUP BY a ORDER BY n DESC, a DESC")
+    assert rows == [{'a': 2, 'n': 2}, {'a': 1, 'n': 2}, {'a': None, 'n': 1}]
+
+
+def test_distinct(executor):
+    assert run(executor, "SELECT DISTINCT a FROM t ORDER BY a") == [{'a': None}, {'a': 1}, {'a': 2}]
+    assert run(executor, "SELECT DISTINCT b FROM t ORDER BY b DESC LIMIT 2") == [{'b': 'z'}, {'b': 'y'}]
+    assert run(executor, "SELECT DISTINCT a, b FROM t WHERE b = 'x' ORDER BY a") == [
+        {'a': None, 'b': 'x'}, {'a': 1, 'b': 'x'}, {'a': 2, 'b': 'x'}
+    ]
+    # The LIMIT counts distinct rows
+    statement = executor.prepare("SELECT DISTINCT b FROM t ORDER BY b LIMIT ?")
+    assert executor.execute(statement, [2]) == [{'b': 'x'}, {'b': 'y'}]
+
+
+def test_table_select_scan(storage):
+    executor = Executor(storage)
+    run(executor, "CREATE TABLE t (id INT PRIMARY KEY, a INT, b VARCHAR(5))")
+    run(executor, "INSERT INTO t VALUES (1, 1, 'x'), (2, 2, 'y'), (3, 1, 'z'), (4, NULL, 'x')")
+    run(executor, "DELETE FROM t WHERE id = 2")
+    table = storage.tables['t']
+    assert table.select(conditions={'b': 'x'}) == [{'id': 1, 'a': 1, 'b': 'x'}, {'id': 4, 'a': None, 'b': 'x'}]
+    assert table.select(['b', 'id'], {'a': 1}) == [{'b': 'x', 'id': 1}, {'b': 'z', 'id': 3}]
+    assert ids(table.select(['id'])) == [1, 3, 4]
+    assert ids(table.select(['id'], {'b': Predicate('<', 'y'), 'a': Predicate('>', 0)})) == [1]
+    # Incomparable values do not match
+    assert table.select(['id'], {'a': Predicate('>', 'q')}) == []
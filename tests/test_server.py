@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+import pytest
+
+from db.client import Connection, ConnectionPool
+from db.server import Server
+
+
+@pytest.fixture
+def port(storage):
+    """Port of a server over the storage, run by an event loop in another
+    thread"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = Server(storage, port=0)
+    addresses = asyncio.run_coroutine_threadsafe(server.start(), loop).result(5)
+    yield addresses[0][1]
+    
+    async def stop():
+        server.server.close()
+        await server.server.wait_closed()
+        # Let the sessions of closed connections finish
+        await asyncio.gather(*(asyncio.all_tasks() - {asyncio.current_task()}))
+    asyncio.run_coroutine_threadsafe(stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def test_statements_and_results(port):
+    with Connection(port=port, timeout=5) as connection:
+        assert connection.execute("CREATE TABLE t (id INT PRIMARY KEY, name VARCHAR(10), "
+                                  "score FLOAT, ok BOOLEAN)") == "Table 't' created successfully"
+        connection.execute("INSERT INTO t VALUES (?, ?, ?, ?)", (2 ** 70, 'big', 0.5, True))
+        connection.executemany("INSERT INTO t VALUES (:id, :name, NULL, FALSE)",
+                               [{'id': i, 'name': f"n{i}"} for i in range(2500)])
+        assert connection.execute("SELECT * FROM t WHERE id = ?", (2 ** 70,)) == [
+            {'id': 2 ** 70, 'name': 'big', 'score': 0.5, 'ok': True}
+        ]
+        # Results spanning several frames
+        rows = list(connection.stream("SELECT id, name FROM t WHERE ok = FALSE ORDER BY id"))
+        assert rows == [{'id': i, 'name': f"n{i}"} for i in range(2500)]
+        
+        with pytest.raises(ValueError, match="not found"):
+            connection.execute("SELECT * FROM missing")
+        # An error leaves the connection usable
+        assert connection.execute("SELECT COUNT(*) AS n FROM t") == [{'n': 2501}]
+
+
+def test_abandoned_results_close_the_connection(port):
+    with Connection(port=port, timeout=5) as connection:
+        connection.execute("CREATE TABLE t (id INT PRIMARY KEY)")
+        connection.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(2500)])
+        rows = connection.stream("SELECT * FROM t")
+        next(rows)
+        rows.close()
+        assert not connection.usable
+        with pytest.raises(ValueError, match="Connection is closed"):
+            connection.execute("SELECT 1")
+
+
+def test_pool_returns_connection_idle(port):
+    pool = ConnectionPool(port=port, size=1, timeout=5)
+    try:
+        pool.execute("CREATE TABLE t (id INT PRIMARY KEY)")
+        with pool.connection() as connection:
+            connection.execute("BEGIN")
+            connection.execute("INSERT INTO t VALUES (1)")
+            assert connection.in_transaction
+        
+        # The same connection comes back with the transaction rolled back
+        with pool.connection() as again:
+            assert again is connection
+            assert not again.in_transaction
+            assert again.execute("SELECT COUNT(*) AS n FROM t") == [{'n': 0}]
+    finally:
+        pool.close()
+
+
+def test_disconnect_rolls_back_open_transaction(port):
+    with Connection(port=port, timeout=5) as setup:
+        setup.execute("CREATE TABLE t (id INT PRIMARY KEY)")
+    connection = Connection(port=port, timeout=5)
+    connection.execute("BEGIN")
+    connection.execute("INSERT INTO t VALUES (1)")
+    connection.close()
+    
+    with Connection(port=port, timeout=5) as other:
+        # Waits for the write lock until the server has rolled back
+        other.execute("INSERT INTO t VALUES (2)")
+        assert other.execute("SELECT id FROM t") == [{'id': 2}]
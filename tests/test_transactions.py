@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+from conftest import crash, in_thread, run
+from db.executor import Executor
+from db.storage import Storage
+
+
+def test_idle_transaction_does_not_block_other_tables(storage):
+    executor = Executor(storage)
+    run(executor, "CREATE TABLE a (id INT PRIMARY KEY)")
+    run(executor, "CREATE TABLE b (id INT PRIMARY KEY)")
+    run(executor, "INSERT INTO a VALUES (1)")
+    
+    run(executor, "BEGIN")
+    run(executor, "INSERT INTO a VALUES (2)")
+    # Every statement makes a checkpoint due now
+    storage.checkpoint_due = True
+    
+    other = Executor(storage)
+    for i in range(2, 5):
+        in_thread(lambda: run(other, f"INSERT INTO b VALUES ({i})"))
+        assert in_thread(lambda: run(other, "SELECT COUNT(*) AS n FROM b")) == [{'n': i - 1}]
+    in_thread(storage.collect_versions)
+    # The checkpoint writes out every table but the one the transaction
+    # holds, and finishes once it has ended
+    assert not in_thread(storage.try_checkpoint)
+    assert storage.dirty_tables == {'a'}
+    assert storage.checkpoint_due
+    
+    run(executor, "COMMIT")
+    assert in_thread(storage.try_checkpoint)
+    assert not storage.dirty_tables
+
+
+@pytest.mark.parametrize('layout', ['row', 'column'])
+def test_recovery_keeps_committed_transaction_only(tmp_path, layout):
+    data_dir = str(tmp_path / 'data')
+    storage = Storage(data_dir)
+    executor = Executor(storage)
+    run(executor, f"CREATE TABLE t (id INT PRIMARY KEY, v VARCHAR(10)) WITH (storage = {layout})")
+    run(executor, "INSERT INTO t VALUES (1, 'a'), (2, 'b')")
+    
+    run(executor, "BEGIN")
+    run(executor, "UPDATE t SET v = 'c' WHERE id = 1")
+    run(executor, "DELETE FROM t WHERE id = 2")
+    run(executor, "INSERT INTO t VALUES (3, 'd')")
+    run(executor, "COMMIT")
+    committed = run(executor, "SELECT * FROM t ORDER BY id")
+    
+    run(executor, "BEGIN")
+    run(executor, "UPDATE t SET v = 'x' WHERE id = 1")
+    run(executor, "INSERT INTO t VALUES (4, 'y')")
+    # Checkpoints leave the table alone while the transaction is open
+    assert not in_thread(storage.try_checkpoint)
+    crash(storage)
+    
+    recovered = Storage(data_dir)
+    try:
+        assert run(Executor(recovered), "SELECT * FROM t ORDER BY id") == committed
+        assert committed == [{'id': 1, 'v': 'c'}, {'id': 3, 'v': 'd'}]
+    finally:
+        recovered.close()
+
+
+def test_rollback_restores_rows_indexes_and_unique_keys(storage):
+    executor = Executor(storage)
+    run(executor, "CREATE TABLE t (id INT PRIMARY KEY, v VARCHAR(10), n INT UNIQUE)")
+    run(executor, "CREATE INDEX t_v ON t (v) USING btree")
+    run(executor, "INSERT INTO t VALUES (1, 'a', 10), (2, 'b', 20)")
+    before = run(executor, "SELECT * FROM t ORDER BY id")
+    
+    run(executor, "BEGIN")
+    run(executor, "UPDATE t SET v = 'z', n = 11 WHERE id = 1")
+    run(executor, "DELETE FROM t WHERE id = 2")
+    run(executor, "INSERT INTO t VALUES (3, 'b', 20)")
+    assert [row['id'] for row in run(executor, "SELECT * FROM t ORDER BY id")] == [1, 3]
+    run(executor, "ROLLBACK")
+    
+    assert run(executor, "SELECT * FROM t ORDER BY id") == before
+    assert run(executor, "SELECT id FROM t WHERE v = 'a'") == [{'id': 1}]
+    assert run(executor, "SELECT id FROM t WHERE v = 'b'") == [{'id': 2}]
+    assert run(executor, "SELECT id FROM t WHERE v = 'z'") == []
+    # Keys taken by the transaction are free again, and those it freed
+    # are taken again
+    run(executor, "INSERT INTO t VALUES (3, 'c', 11)")
+    with pytest.raises(ValueError, match="Duplicate"):
+        run(executor, "INSERT INTO t VALUES (4, 'd', 20)")
+    with pytest.raises(ValueError, match="Duplicate"):
+        run(executor, "INSERT INTO t VALUES (2, 'd', 40)")
+
+
+def test_write_to_table_of_open_transaction_times_out(storage, monkeypatch):
+    monkeypatch.setattr('db.storage.LOCK_TIMEOUT', 0.1)
+    executor = Executor(storage)
+    run(executor, "CREATE TABLE t (id INT PRIMARY KEY, n INT)")
+    run(executor, "INSERT INTO t VALUES (1, 0)")
+    
+    run(executor, "BEGIN")
+    run(executor, "UPDATE t SET n = 1 WHERE id = 1")
+    
+    other = Executor(storage)
+    
+    def update():
+        run(other, "BEGIN")
+        try:
+            run(other, "UPDATE t SET n = 2 WHERE id = 1")
+        except ValueError as e:
+            run(other, "ROLLBACK")
+            return str(e)
+    
+    assert in_thread(update) == "Timed out waiting to write table 't'"
+    run(executor, "COMMIT")
+    assert run(executor, "SELECT n FROM t") == [{'n': 1}]
+
+
+def test_ddl_waiting_while_transaction_is_open(storage):
+    executor = Executor(storage)
+    run(executor, "CREATE TABLE a (id INT PRIMARY KEY)")
+    run(executor, "CREATE TABLE b (id INT PRIMARY KEY)")
+    run(executor, "BEGIN")
+    run(executor, "INSERT INTO a VALUES (1)")
+    
+    # A running statement keeps the DDL waiting, the idle transaction not
+    other = Executor(storage)
+    with storage.locked(reads=['b']):
+        ddl = threading.Thread(target=run, args=(other, "CREATE TABLE c (id INT PRIMARY KEY)"), daemon=True)
+        ddl.start()
+        time.sleep(0.05)
+        assert 'c' not in storage.tables
+    ddl.join(5)
+    assert 'c' in storage.tables
+    # Other sessions and the transaction go on
+    in_thread(lambda: run(other, "INSERT INTO b VALUES (1)"))
+    run(executor, "INSERT INTO a VALUES (2)")
+    
+    # DDL on a table the transaction changed fails rather than wait
+    def ddl_error(sql):
+        try:
+            run(other, sql)
+        except ValueError as e:
+            return str(e)
+    
+    for sql in ("DROP TABLE a", "CREATE INDEX a_id ON a (id)", "VACUUM a"):
+        assert in_thread(lambda: ddl_error(sql)) == "Table 'a' is in use by an open transaction"
+    run(executor, "COMMIT")
+    in_thread(lambda: run(other, "CREATE INDEX a_id ON a (id)"))
+    assert run(executor, "SELECT id FROM a ORDER BY id") == [{'id': 1}, {'id': 2}]
+
+
+def test_rollback_after_change_to_missing_table(storage):
+    executor = Executor(storage)
+    run(executor, "BEGIN")
+    with pytest.raises(ValueError, match="Table 'missing' not found"):
+        run(executor, "DELETE FROM missing")
+    run(executor, "ROLLBACK")
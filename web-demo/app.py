@@ -4,13 +4,16 @@ PesaPal JuniorDB - Web Demo
 A complete CRUD web application demonstrating the RDBMS
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, stream_with_context
+import atexit
+import json
 import sys
 import os
 
 # Add parent directory to path to import db modules
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
+from db.bulk import ndjson_chunks
 from db.parser import Parser
 from db.executor import Executor
 from db.storage import Storage
@@ -20,7 +23,34 @@ app = Flask(__name__)
 # Initialize database
 storage = Storage()
 parser = Parser()
-executor = Executor(storage)
+executor = Executor(storage, parser=parser)
+atexit.register(storage.close)
+
+# Statements the SQL console refuses, with the reason. Every request runs on
+# the one shared executor, by itself.
+CONSOLE_REFUSED = {
+    'begin': 'Transactions are not supported in the SQL console',
+    'commit': 'Transactions are not supported in the SQL console',
+    'rollback': 'Transactions are not supported in the SQL console',
+    # Session options would change for every user of the demo
+    'set': 'SET is not supported in the SQL console',
+    # Files on the server are not the console user's to read or write
+    'copy': 'COPY FROM is not supported in the SQL console',
+    'copy_to': 'COPY TO is not supported in the SQL console',
+}
+
+# Statements run with form input are prepared once and bound per request,
+# so values never need quoting
+INSERT_PRODUCT = executor.prepare(
+    "INSERT INTO products (name, description, price, category, stock_quantity) VALUES (?, ?, ?, ?, ?)")
+UPDATE_PRODUCT = executor.prepare(
+    """UPDATE products SET name = :name, description = :description, price = :price,
+       category = :category, stock_quantity = :stock_quantity WHERE id = :id""")
+SELECT_PRODUCT = executor.prepare("SELECT * FROM products WHERE id = ?")
+DELETE_PRODUCT = executor.prepare("DELETE FROM products WHERE id = ?")
+INSERT_CUSTOMER = executor.prepare(
+    "INSERT INTO customers (first_name, last_name, email, phone, address, city, country) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)")
 
 def init_sample_data():
     """Initialize sample data for the demo"""
@@ -66,6 +96,12 @@ def init_sample_data():
             notes TEXT
         )""",
         
+        # Per-customer and per-product order lookups use these indexes
+        "CREATE INDEX orders_customer_idx ON orders (customer_id)",
+        "CREATE INDEX orders_product_idx ON orders (product_id)",
+        # Ordered index so the latest orders come from an index walk
+        "CREATE INDEX orders_date_idx ON orders (order_date) USING btree",
+        
         # Insert sample products
         "INSERT INTO products (name, description, price, category, stock_quantity) VALUES ('Laptop Pro', 'High-performance laptop for professionals', 1299.99, 'Electronics', 50)",
         "INSERT INTO products (name, description, price, category, stock_quantity) VALUES ('Wireless Mouse', 'Ergonomic wireless mouse with long battery life', 29.99, 'Electronics', 200)",
@@ -126,10 +162,7 @@ def create_product():
             category = request.form['category']
             stock = int(request.form['stock_quantity'])
             
-            query = f"""INSERT INTO products (name, description, price, category, stock_quantity) 
-                       VALUES ('{name}', '{description}', {price}, '{category}', {stock})"""
-            
-            result = executor.execute(parser.parse(query))
+            result = executor.execute(INSERT_PRODUCT, (name, description, price, category, stock))
             return redirect(url_for('products_list'))
         except Exception as e:
             return render_template('product_form.html', error=str(e), title="Create Product")
@@ -147,23 +180,21 @@ def edit_product(product_id):
             category = request.form['category']
             stock = int(request.form['stock_quantity'])
             
-            query = f"""UPDATE products SET 
-                       name = '{name}', 
-                       description = '{description}', 
-                       price = {price}, 
-                       category = '{category}', 
-                       stock_quantity = {stock} 
-                       WHERE id = {product_id}"""
-            
-            executor.execute(parser.parse(query))
+            executor.execute(UPDATE_PRODUCT, {
+                'name': name,
+                'description': description,
+                'price': price,
+                'category': category,
+                'stock_quantity': stock,
+                'id': product_id
+            })
             return redirect(url_for('products_list'))
         except Exception as e:
             return render_template('product_form.html', error=str(e), title="Edit Product")
     
     # GET: Load existing product
     try:
-        query = f"SELECT * FROM products WHERE id = {product_id}"
-        result = executor.execute(parser.parse(query))
+        result = executor.execute(SELECT_PRODUCT, (product_id,))
         if result and isinstance(result, list):
             product = result[0]
             return render_template('product_form.html', product=product, title="Edit Product")
@@ -176,8 +207,7 @@ def edit_product(product_id):
 def delete_product(product_id):
     """Delete product"""
     try:
-        query = f"DELETE FROM products WHERE id = {product_id}"
-        executor.execute(parser.parse(query))
+        executor.execute(DELETE_PRODUCT, (product_id,))
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -205,10 +235,7 @@ def create_customer():
             city = request.form.get('city', '')
             country = request.form.get('country', '')
             
-            query = f"""INSERT INTO customers (first_name, last_name, email, phone, address, city, country) 
-                       VALUES ('{first_name}', '{last_name}', '{email}', '{phone}', '{address}', '{city}', '{country}')"""
-            
-            executor.execute(parser.parse(query))
+            executor.execute(INSERT_CUSTOMER, (first_name, last_name, email, phone, address, city, country))
             return redirect(url_for('customers_list'))
         except Exception as e:
             return render_template('customer_form.html', error=str(e), title="Create Customer")
@@ -226,7 +253,8 @@ def orders_list():
                    FROM orders o
                    JOIN customers c ON o.customer_id = c.id
                    JOIN products p ON o.product_id = p.id
-                   ORDER BY o.order_date DESC"""
+                   ORDER BY o.order_date DESC
+                   LIMIT 50"""
         
         result = executor.execute(parser.parse(query))
         return render_template('orders.html', orders=result if isinstance(result, list) else [])
@@ -236,13 +264,22 @@ def orders_list():
 # ========== API ENDPOINTS ==========
 @app.route('/api/execute', methods=['POST'])
 def execute_query():
-    """Execute raw SQL query"""
+    """Execute raw SQL query.
+    
+    With "stream": true (or Accept: application/x-ndjson) a SELECT result is
+    sent as newline-delimited JSON while it is produced, in constant memory.
+    """
     try:
         query = request.json.get('query', '').strip()
         if not query:
             return jsonify({'success': False, 'error': 'Empty query'})
         
         parsed = parser.parse(query)
+        if parsed['type'] in CONSOLE_REFUSED:
+            return jsonify({'success': False, 'error': CONSOLE_REFUSED[parsed['type']]})
+        streaming = request.json.get('stream') or 'application/x-ndjson' in request.headers.get('Accept', '')
+        if streaming and parsed['type'] == 'select':
+            return stream_rows(executor.stream(parsed))
         result = executor.execute(parsed)
         
         return jsonify({
@@ -253,6 +290,16 @@ def execute_query():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+def stream_rows(rows):
+    """NDJSON response sending rows in chunks; an error after the first
+    chunk ends the stream with an {"error": ...} line"""
+    def generate():
+        try:
+            yield from ndjson_chunks(rows)
+        except Exception as e:
+            yield json.dumps({'error': str(e)}) + '\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/stats')
 def get_stats():
     """Get database statistics"""